@@ -4,7 +4,8 @@ from pymongo import MongoClient, ASCENDING
 from dotenv import load_dotenv
 from .routes import patient, doctor, opd_record, ipd_record, er_record, appointment, diagnosis_model
 from .internal_api import internal_api
-from .utils import schedule_appointment_checks
+from .scheduler import run_appointment_sweeper
+from .delay_queue import run_delay_queue_worker
 import threading
 import redis
 import logging
@@ -20,29 +21,61 @@ logging.basicConfig(filename="api.log", level=logging.ERROR,
 
 load_dotenv()
 
-mongo_client = MongoClient(f'mongodb://{os.getenv("DB_HOST")}:{os.getenv("DB_PORT")}/', maxPoolSize=10)
-db = mongo_client[os.getenv("DB_NAME")]
-users = db.users
-patients = db.patients
-doctors = db.doctors
-users.create_index("email", unique=True)
-patients.create_index([('uid', ASCENDING), ('contact_no', ASCENDING)], unique=True)
-doctors.create_index([('uid', ASCENDING), ('contact_no', ASCENDING)], unique=True)
-
-cache_pool = redis.ConnectionPool(
-            host=os.getenv("REDIS_HOST"),
-            port=os.getenv("REDIS_PORT"),
-            db=1,
-            max_connections=5
-        )
-
-if db == None:
-    logging.critical("Couldn't Connect to Database!")
-    abort(500, "The server encountered an Internal Error and was unable to complete your request")
-
-if not cache_pool:
-    logging.critical("Couldn't Connect to Redis!")
-    abort(500, "The server encountered an Internal Error and was unable to complete your request")
+# Clients are created by init_clients() once per process (after fork when running
+# under a prefork server) since neither MongoClient nor redis pools are fork-safe.
+mongo_client = None
+db = None
+cache_pool = None
+
+
+def init_clients():
+    global mongo_client, db, cache_pool
+
+    mongo_client = MongoClient(f'mongodb://{os.getenv("DB_HOST")}:{os.getenv("DB_PORT")}/',
+                               maxPoolSize=int(os.getenv("DB_POOL_SIZE", 10)))
+    db = mongo_client[os.getenv("DB_NAME")]
+    db.users.create_index("email", unique=True)
+    db.patients.create_index([('uid', ASCENDING), ('contact_no', ASCENDING)], unique=True)
+    db.doctors.create_index([('uid', ASCENDING), ('contact_no', ASCENDING)], unique=True)
+
+    cache_pool = redis.ConnectionPool(
+                host=os.getenv("REDIS_HOST"),
+                port=os.getenv("REDIS_PORT"),
+                db=1,
+                max_connections=int(os.getenv("REDIS_POOL_SIZE", 5))
+            )
+
+    if db == None:
+        logging.critical("Couldn't Connect to Database!")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+
+    if not cache_pool:
+        logging.critical("Couldn't Connect to Redis!")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+
+
+def close_clients():
+    if mongo_client is not None:
+        mongo_client.close()
+
+    if cache_pool is not None:
+        cache_pool.disconnect()
+
+
+def start_appointment_checks(stop_event=None):
+    stop_event = stop_event or threading.Event()
+    threads = []
+    
+    # The delay queue applies each appointment's transitions when they fall due;
+    # the sweep stays as a catch-all for appointments that were never enqueued.
+    for target in (run_delay_queue_worker, run_appointment_sweeper):
+        thread = threading.Thread(target=target, daemon=True,
+                                  kwargs={'db': db, 'cache_pool': cache_pool, 'stop_event': stop_event})
+        thread.start()
+        threads.append(thread)
+    
+    return threads
+
 
 server.register_blueprint(patient.patient)
 server.register_blueprint(doctor.doctor)
@@ -52,6 +85,3 @@ server.register_blueprint(er_record.er_record)
 server.register_blueprint(appointment.appointment)
 server.register_blueprint(diagnosis_model.model)
 server.register_blueprint(internal_api)
-
-appointment_check_thread = threading.Thread(target=schedule_appointment_checks, kwargs={'db': db})
-appointment_check_thread.start()
@@ -0,0 +1,67 @@
+from quart import Quart
+from quart_cors import cors
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING
+from dotenv import load_dotenv
+from .routes import patient, doctor, opd_record, ipd_record, er_record, appointment, diagnosis_model
+from .internal_api import internal_api
+import redis.asyncio as aioredis
+import httpx
+import logging
+import os
+
+server = Quart(__name__)
+server.secret_key = os.getenv("SECRET_KEY")
+
+logging.basicConfig(filename="api.log", level=logging.ERROR,
+                    filemode="a", format="%(asctime)s : %(levelname)s : %(message)s")
+
+load_dotenv()
+
+# Same shape as the Flask app in api/__init__.py; the clients are created on the
+# serving event loop since Motor and redis.asyncio bind to the loop they start on.
+mongo_client = None
+db = None
+cache_pool = None
+log_client = None
+
+
+@server.before_serving
+async def init_clients():
+    global mongo_client, db, cache_pool, log_client
+
+    mongo_client = AsyncIOMotorClient(f'mongodb://{os.getenv("DB_HOST")}:{os.getenv("DB_PORT")}/',
+                                      maxPoolSize=int(os.getenv("DB_POOL_SIZE", 100)))
+    db = mongo_client[os.getenv("DB_NAME")]
+    await db.users.create_index("email", unique=True)
+    await db.patients.create_index([('uid', ASCENDING), ('contact_no', ASCENDING)], unique=True)
+    await db.doctors.create_index([('uid', ASCENDING), ('contact_no', ASCENDING)], unique=True)
+
+    cache_pool = aioredis.ConnectionPool(
+                host=os.getenv("REDIS_HOST"),
+                port=os.getenv("REDIS_PORT"),
+                db=1,
+                max_connections=int(os.getenv("REDIS_POOL_SIZE", 100))
+            )
+
+    log_client = httpx.AsyncClient(timeout=5)
+
+
+@server.after_serving
+async def close_clients():
+    if log_client is not None:
+        await log_client.aclose()
+
+    if cache_pool is not None:
+        await cache_pool.disconnect()
+
+    if mongo_client is not None:
+        mongo_client.close()
+
+
+# CORS on the /api blueprints only, matching the Flask app's "/api/*" resource.
+for blueprint in (patient.patient, doctor.doctor, opd_record.opd_record, ipd_record.ipd_record,
+                  er_record.er_record, appointment.appointment, diagnosis_model.model):
+    server.register_blueprint(cors(blueprint, allow_origin="*"))
+
+server.register_blueprint(internal_api)
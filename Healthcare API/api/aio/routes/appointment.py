@@ -0,0 +1,162 @@
+from quart import Blueprint, request, abort, jsonify, g
+from pydantic import ValidationError
+from bson.objectid import ObjectId
+from pymongo.errors import PyMongoError
+from redis.exceptions import RedisError
+from datetime import date
+from api import schemas, delay_queue, records
+from api.aio import utils
+import redis.asyncio as aioredis
+import logging
+import time
+
+appointment = Blueprint("appointment", __name__, url_prefix="/api/appointments")
+
+@appointment.before_request
+async def before_request():
+    from api.aio import db, cache_pool
+    g.db = db
+    g.cache_conn = aioredis.Redis(connection_pool=cache_pool)
+    g.request_time = time.time()
+    g.request_date = date.today()
+    
+
+@appointment.after_request
+async def after_request(response):
+    g.status_code = response.status_code
+    g.response_time = time.time() - g.request_time
+    
+    return response
+
+
+@appointment.teardown_request
+async def teardown_request(exception=None):
+    if hasattr(g, "cache_conn"):
+        await g.cache_conn.aclose()
+        
+    utils.ship_request_log(exception=exception)
+    
+    
+@appointment.route("/<app_id>", methods=["GET"], strict_slashes=False)
+@utils.api_key_required
+async def get_appointment_by_id(app_id):
+    user_id = getattr(request, "user_id", None)
+    
+    query = {"_id": records.object_id(app_id, "Appointment"), "uid": ObjectId(user_id)}
+    
+    try:
+        record = await g.db.appointments.find_one(query)
+        if not record:
+            return jsonify({"message": "Record Not Found!"}), 404
+        
+    except PyMongoError as e:
+        logging.error(f"Couldn't query appointment(id: {app_id}). Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+        
+    return jsonify({"Appointment": records.appointment_details(record)}), 200
+
+
+@appointment.route("/", methods=["GET"], strict_slashes=False)
+@utils.api_key_required
+async def get_appointments_by_pid_or_did():
+    user_id = getattr(request, "user_id", None)
+    offset = records.page_offset(request.args, 20)
+    query = records.appointment_query(user_id, request.args)
+        
+    try:
+        found = await g.db.appointments.find(query).skip(offset).limit(20).to_list(length=20)
+    except PyMongoError as e:
+        logging.error(f"Couldn't query appointment records({query}). Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+        
+    appointments = [records.appointment_summary(record) for record in found]
+        
+    return jsonify({"Appointments": appointments}), 200
+
+
+@appointment.route("/", methods=["POST"], strict_slashes=False)
+@utils.api_key_required
+async def book_appointment():
+    user_id = getattr(request, "user_id", None)
+    
+    try:
+        appointment = schemas.Appointment.model_validate_json(await request.get_data())
+    except ValidationError as e:
+        abort(400, f"Invalid Request. Error: {e}")
+        
+    data = appointment.model_dump()
+    data['uid'] = ObjectId(user_id)
+        
+    try:
+        result = await g.db.appointments.insert_one(data)
+    except PyMongoError as e:
+        logging.error(f"Couldn't add appointment record(uid: {user_id}). Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+    
+    if data['status'] == "pending":
+        try:
+            await g.cache_conn.zadd(delay_queue.QUEUE_KEY, delay_queue.appointment_events(result.inserted_id, data['date']))
+        except RedisError as e:
+            logging.error(f"Couldn't schedule appointment events(app_id: {result.inserted_id}). Error: {e}")
+        
+    return jsonify({"message": "Appointment added Successfully!"}), 200
+
+
+@appointment.route("/<app_id>", methods=["PUT"], strict_slashes=False)
+@utils.api_key_required
+async def update_appointment_status(app_id):
+    user_id = getattr(request, "user_id", None)
+    status = request.args.get("status")
+    
+    app_oid = records.object_id(app_id, "Appointment")
+        
+    if status not in ("pending", "done", "cancelled"):
+        abort(400, "Invalid status for appointment")
+        
+    query = {"_id": app_oid, "uid": ObjectId(user_id)}
+    update = {'$set': {'status': status}}
+    
+    try:
+        exists = await g.db.appointments.find_one(query)
+        if not exists:
+            abort(404, "Record Not Found!")
+    except PyMongoError as e:
+        logging.error(f"Couldn't query appointment record(app_id: {app_id}). Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+        
+    try:
+        await g.db.appointments.update_one(query, update)
+    except PyMongoError as e:
+        logging.error(f"Couldn't update appointment status(app_id: {app_id}). Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+    
+    try:
+        if status == "pending":
+            await g.cache_conn.zadd(delay_queue.QUEUE_KEY, delay_queue.appointment_events(app_id, exists['date']))
+        else:
+            await g.cache_conn.zrem(delay_queue.QUEUE_KEY, *delay_queue.appointment_event_members(app_id))
+    except RedisError as e:
+        logging.error(f"Couldn't reschedule appointment events(app_id: {app_id}). Error: {e}")
+        
+    return jsonify({"message": "Successfully updated appointment status"}), 200
+    
+
+@appointment.route("/<app_id>", methods=["DELETE"], strict_slashes=False)
+@utils.api_key_required
+async def delete_appointment(app_id):
+    user_id = getattr(request, "user_id", None)
+    
+    query = {"_id": records.object_id(app_id, "Appointment"), "uid": ObjectId(user_id)}
+    
+    try:
+        await g.db.appointments.delete_one(query)
+    except PyMongoError as e:
+        logging.error(f"Couldn't delete appointment({app_id}) data. Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+    
+    try:
+        await g.cache_conn.zrem(delay_queue.QUEUE_KEY, *delay_queue.appointment_event_members(app_id))
+    except RedisError as e:
+        logging.error(f"Couldn't unschedule appointment events(app_id: {app_id}). Error: {e}")
+        
+    return jsonify({"message": "Record Deleted Successfully!"})
@@ -0,0 +1,19 @@
+from quart import Blueprint, request, abort
+from api.routes.diagnosis_model import run_models
+import asyncio
+
+model = Blueprint("model", __name__, url_prefix="/api/model")
+
+
+@model.route('/predict', methods=["POST"])
+async def predict():
+    data = await request.get_json()
+    symptoms = data.get('symptoms')
+    
+    if not symptoms:
+        abort(400, "Symptoms not provided!")
+        
+    # The models are CPU bound, keep them off the event loop.
+    predictions = await asyncio.to_thread(run_models, symptoms.split(","))
+    
+    return predictions, 200
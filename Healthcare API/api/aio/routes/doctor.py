@@ -0,0 +1,153 @@
+from quart import Blueprint, request, g, abort, jsonify
+from bson.objectid import ObjectId
+from datetime import date
+from api import schemas, records
+from api.aio import utils
+from pydantic import ValidationError
+import redis.asyncio as aioredis
+import pymongo.errors
+import logging
+import time
+
+doctor = Blueprint("doctor", __name__, url_prefix="/api/doctors")
+
+
+@doctor.before_request
+async def before_request():
+    from api.aio import db, cache_pool
+    g.db = db
+    g.cache_conn = aioredis.Redis(connection_pool=cache_pool)
+    g.request_time = time.time()
+    g.request_date = date.today()
+    
+
+@doctor.after_request
+async def after_request(response):
+    g.status_code = response.status_code
+    g.response_time = time.time() - g.request_time
+    
+    return response
+
+
+@doctor.teardown_request
+async def teardown_request(exception=None):
+    if hasattr(g, "cache_conn"):
+        await g.cache_conn.aclose()
+        
+    utils.ship_request_log(exception=exception)
+        
+
+@doctor.route("/<doctor_id>", methods=["GET"], strict_slashes=False)
+@utils.api_key_required
+async def get_doctor(doctor_id):
+    user_id = getattr(request, 'user_id', None)
+    
+    query = {"_id": records.object_id(doctor_id, "Doctor"), "uid": ObjectId(user_id)}
+    
+    try:
+        record = await g.db.doctors.find_one(query)
+        if not record:
+            return jsonify({"message": "Record Not Found!"}), 404
+    
+    except pymongo.errors.PyMongoError as e:
+        logging.error(f"Couldn't query record(uid: {user_id}, doc_id: {doctor_id}). Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+    
+    return records.with_age(record), 200
+    
+    
+@doctor.route("/", methods=["GET"], strict_slashes=False)
+@utils.api_key_required
+async def get_all_doctors():
+    user_id = getattr(request, 'user_id', None)
+    offset = records.page_offset(request.args, 20)
+    
+    query = {"uid": ObjectId(user_id)}
+    
+    try:
+        found = await g.db.doctors.find(query).skip(offset).limit(20).to_list(length=20)
+        
+    except pymongo.errors.PyMongoError as e:
+        logging.error(f"Couldn't query user data. Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+
+    return [records.doctor_summary(record) for record in found], 200
+
+
+@doctor.route("/", methods=["POST"], strict_slashes=False)
+@utils.api_key_required
+async def add_doctor():
+    user_id = getattr(request, 'user_id', None)
+    
+    try:
+        doctor = schemas.Doctor.model_validate_json(await request.get_data())
+    except ValidationError as e:
+        abort(400, f"Invalid Request. Error: {e}")
+        
+    data = doctor.model_dump()
+    data['uid'] = ObjectId(user_id)
+    
+    try:
+        await g.db.doctors.insert_one(data)
+    except pymongo.errors.DuplicateKeyError:
+        abort(400, "A doctor record with this contact_no already exists!")
+    except pymongo.errors.PyMongoError as e:
+        logging.error(f"Couldn't insert doctor data into the Database. Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+        
+    return jsonify({"message": "Doctor has been Added Successfully!",
+                    "doctor_name": doctor.name}), 201
+    
+    
+@doctor.route("/<doctor_id>", methods=["PUT"], strict_slashes=False)
+@utils.api_key_required
+async def update_doctor(doctor_id):
+    user_id = getattr(request, 'user_id', None)
+    
+    query = {"_id": records.object_id(doctor_id, "Doctor"), "uid": ObjectId(user_id)}
+    
+    try:
+        exists = await g.db.doctors.find_one(query)
+        if not exists:
+            abort(401, "Invalid user_id or doctor_id")
+            
+    except pymongo.errors.PyMongoError as e:
+        logging.error(f"Couldn't query doctor({doctor_id}) data. Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+    
+    try:
+        fields = schemas.DoctorUpdate.model_validate_json(await request.get_data()).model_dump(exclude_unset=True)
+    except ValidationError as e:
+        abort(400, f"Invalid Request. Error: {e}")
+    
+    if not fields:
+        abort(400, "No fields to update")
+    
+    update = {
+        '$set': fields
+    }
+    
+    try:
+        await g.db.doctors.update_one({"_id": ObjectId(doctor_id)}, update)
+    except pymongo.errors.PyMongoError as e:
+        logging.error(f"Failed to update doctor({doctor_id}). Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+    
+    return jsonify({"message": "Record Updated Successfully!",
+                    "doctor_id": doctor_id})
+    
+    
+@doctor.route("/<doctor_id>", methods=["DELETE"], strict_slashes=False)
+@utils.api_key_required
+async def delete_doctor(doctor_id):
+    user_id = getattr(request, 'user_id', None)
+    
+    query = {"_id": records.object_id(doctor_id, "Doctor"), "uid": ObjectId(user_id)}
+    
+    try:
+        await g.db.doctors.delete_one(query)
+    except pymongo.errors.PyMongoError as e:
+        logging.error(f"Couldn't delete doctor({doctor_id}) data. Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+    
+    return jsonify({"message": "Record Deleted Successfully!"})
@@ -0,0 +1,219 @@
+from quart import Blueprint, request, abort, jsonify, g
+from bson.objectid import ObjectId
+from pydantic import ValidationError
+from datetime import date
+from api import schemas, records
+from api.aio import utils
+import redis.asyncio as aioredis
+import pymongo.errors
+import logging
+import time
+import uuid
+
+ipd_record = Blueprint("ipd_record", __name__, url_prefix="/api/ipd")
+
+
+@ipd_record.before_request
+async def before_request():
+    from api.aio import db, cache_pool
+    g.db = db
+    g.cache_conn = aioredis.Redis(connection_pool=cache_pool)
+    g.request_time = time.time()
+    g.request_date = date.today()
+    
+
+@ipd_record.after_request
+async def after_request(response):
+    g.status_code = response.status_code
+    g.response_time = time.time() - g.request_time
+    
+    return response
+
+
+@ipd_record.teardown_request
+async def teardown_request(exception=None):
+    if hasattr(g, "cache_conn"):
+        await g.cache_conn.aclose()
+        
+    utils.ship_request_log(exception=exception)
+
+
+@ipd_record.route("/", methods=["GET"], strict_slashes=False)
+@utils.api_key_required
+async def get_all_ipds():
+    user_id = getattr(request, "user_id", None)
+    offset = records.page_offset(request.args, 10)
+    
+    query = {"uid": ObjectId(user_id)}
+    
+    try:
+        found = await g.db.patients.find(query).skip(offset).limit(10).to_list(length=10)
+    
+    except pymongo.errors.PyMongoError as e:
+        logging.error(f"Couldn't query user data. Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+        
+    return records.patient_visits(found, "ipd_records"), 200
+
+
+@ipd_record.route("/byDate", methods=["GET"], strict_slashes=False)
+@utils.api_key_required
+async def get_ipd_by_date():
+    user_id = getattr(request, "user_id", None)
+    offset = records.page_offset(request.args, 10)
+    date = request.args.get("date")
+    
+    if not date:
+        abort(400, "Date is not Provided")
+         
+    query = {"uid": ObjectId(user_id), "ipd_records": {"$elemMatch": {"admission_date": date}}}
+        
+    try:
+        found = await g.db.patients.find(query).skip(offset).limit(10).to_list(length=10)
+    
+    except pymongo.errors.PyMongoError as e:
+        logging.error(f"Couldn't query record(uid: {user_id}. Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+    
+    return jsonify({"IPD records": records.patient_visits(found, "ipd_records", on=date)}), 200  
+    
+
+@ipd_record.route("/<patient_id>", methods=["GET"], strict_slashes=False)
+@utils.api_key_required
+async def get_all_ipd_of_patient(patient_id):
+    user_id = getattr(request, 'user_id', None)
+    
+    query = {"_id": records.object_id(patient_id, "Patient"), "uid": ObjectId(user_id)}
+    
+    try:
+        record = await g.db.patients.find_one(query)
+        if not record:
+            return jsonify({"message": "Invalid Pateint ID"}), 400
+    
+    except pymongo.errors.PyMongoError as e:
+        logging.error(f"Couldn't query record(uid: {user_id}, pid: {patient_id}). Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+        
+    if 'ipd_records' not in record.keys():
+        return jsonify({"message": "No IPD records found!"}), 404
+    
+    ipd_records = [records.visit_summary("ipd_records", visit) for visit in record['ipd_records']]
+    
+    return jsonify({"IPD records": ipd_records}), 200
+
+
+@ipd_record.route("/<patient_id>/<ipd_id>", methods=["GET"], strict_slashes=False)
+@utils.api_key_required
+async def get_ipd_by_id(patient_id, ipd_id):
+    user_id = getattr(request, "user_id", None)
+    
+    query = {"_id": records.object_id(patient_id, "Patient"), "uid": ObjectId(user_id)}
+    
+    try:
+        patient = await g.db.patients.find_one(query)
+        if not patient:
+            return jsonify({"message": "Invalid Patient ID"}), 400
+        
+    except pymongo.errors.PyMongoError as e:
+        logging.error(f"Couldn't query record(uid: {user_id}, pid: {patient_id}). Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+        
+    ipd_records = patient['ipd_records']
+    
+    for record in ipd_records:
+        if record['id'] == ipd_id:
+            return jsonify({"IPD Record": record})
+        
+    return jsonify({"message": "No Record Found!"}), 404
+
+
+@ipd_record.route("/byDate/<patient_id>", methods=["GET"], strict_slashes=False)
+@utils.api_key_required
+async def get_ipd_of_patient_by_date(patient_id):
+    user_id = getattr(request, 'user_id', None)
+    date = request.args.get('date')
+    
+    if not date:
+        abort(400, "Date is not provided")
+    
+    query = {"_id": ObjectId(patient_id), "uid": ObjectId(user_id)}
+    
+    try:
+        patient = await g.db.patients.find_one(query)
+        if not patient:
+            return jsonify({"message": "Invalid Patient ID"}), 400
+    
+    except pymongo.errors.PyMongoError as e:
+        logging.error(f"Couldn't query record(uid: {user_id}, pid: {patient_id}). Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+    
+    filtered_records = records.visits_on(patient['ipd_records'], "ipd_records", date)
+        
+    if not filtered_records:
+        return jsonify({"message": "No IPD records found!"}), 404
+        
+    return jsonify({"IPD records": filtered_records}), 200
+        
+        
+@ipd_record.route("/<patient_id>", methods=["POST"], strict_slashes=False)
+@utils.api_key_required
+async def add_ipd_record(patient_id):
+    user_id = getattr(request, 'user_id', None)
+    
+    patient_oid = records.object_id(patient_id, "Patient")
+    
+    try:
+        record = schemas.IpdRecord.model_validate_json(await request.get_data())
+    except ValidationError as e:
+        abort(400, f"Invalid Request. Error: {e}")
+        
+    query = {"_id": patient_oid, "uid": ObjectId(user_id)}
+    
+    try:
+        exists = await g.db.patients.find_one(query)
+        if not exists:
+            abort(401, "Invalid user_id or patient_id")
+            
+    except pymongo.errors.PyMongoError as e:
+        logging.error(f"Couldn't query patient({patient_id}) data. Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+    
+    data = record.model_dump(mode="json")
+    data['id'] = str(uuid.uuid4())
+    
+    try:
+        await g.db.patients.update_one(query, {
+            '$push': {'ipd_records': data}
+        })
+    except pymongo.errors.PyMongoError as e:
+        logging.error(f"Couldn't insert ipd record into the Database. Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+    
+    return jsonify({"message": "Record added Successfully!"}), 200
+
+
+@ipd_record.route("/<patient_id>/<ipd_id>", methods=["DELETE"], strict_slashes=False)
+@utils.api_key_required
+async def delete_ipd_record(patient_id, ipd_id):
+    user_id = getattr(request, "user_id", None)
+    
+    query = {"_id": records.object_id(patient_id, "Patient"), "uid": ObjectId(user_id)}
+    
+    try:
+        exists = await g.db.patients.find_one(query)
+        if not exists:
+            abort(401, "Invalid user_id or patient_id")
+            
+    except pymongo.errors.PyMongoError as e:
+        logging.error(f"Couldn't query patient({patient_id}) data. Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+        
+    try:
+        await g.db.patients.update_one(query, {
+            '$pull': {'ipd_records': {"id": ipd_id}}
+        })
+    except pymongo.errors.PyMongoError as e:
+        logging.error(f"Couldn't delete ipd record from the Database. Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+    
+    return jsonify({"message": "Record deleted Successfully!"}), 200
@@ -0,0 +1,151 @@
+from quart import Blueprint, request, g, abort, jsonify
+from pydantic import ValidationError
+from bson.objectid import ObjectId
+from api import schemas, records
+from api.aio import utils
+from datetime import date
+import pymongo.errors
+import redis.asyncio as aioredis
+import logging
+import time
+
+patient = Blueprint("patient", __name__, url_prefix="/api/patients")
+
+
+@patient.before_request
+async def before_request():
+    from api.aio import db, cache_pool
+    g.db = db
+    g.cache_conn = aioredis.Redis(connection_pool=cache_pool)
+    g.request_time = time.time()
+    g.request_date = date.today()
+
+@patient.after_request
+async def after_request(response):
+    g.status_code = response.status_code
+    g.response_time = time.time() - g.request_time
+    
+    return response
+
+
+@patient.teardown_request
+async def teardown_request(exception=None):
+    if hasattr(g, "cache_conn"):
+        await g.cache_conn.aclose()
+        
+    utils.ship_request_log(exception=exception)
+
+
+@patient.route("/<patient_id>", methods=["GET"])
+@utils.api_key_required
+async def get_patient(patient_id):
+    user_id = getattr(request, 'user_id', None)
+    
+    query = {"_id": records.object_id(patient_id, "Patient"), "uid": ObjectId(user_id)}
+    
+    try:
+        record = await g.db.patients.find_one(query)
+        if not record:
+            return jsonify({"message": "Record Not Found!"}), 404
+        
+    except pymongo.errors.PyMongoError as e:
+        logging.error(f"Couldn't query record(uid: {user_id}, pid: {patient_id}). Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+    
+    return records.patient_details(record), 200
+
+
+@patient.route("/", methods=["GET"], strict_slashes=False)
+@utils.api_key_required
+async def get_all_patients():
+    user_id = getattr(request, 'user_id', None)
+    offset = records.page_offset(request.args, 20)
+    
+    query = {"uid": ObjectId(user_id)}
+    
+    try:
+        found = await g.db.patients.find(query).skip(offset).limit(20).to_list(length=20)
+    
+    except pymongo.errors.PyMongoError as e:
+        logging.error(f"Couldn't query user data. Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+
+    return [records.patient_summary(record) for record in found], 200
+
+
+@patient.route("/", methods=["POST"], strict_slashes=False)
+@utils.api_key_required
+async def add_patient():
+    user_id = getattr(request, 'user_id', None)
+    try:
+        patient = schemas.Patient.model_validate_json(await request.get_data())
+    except ValidationError as e:
+        abort(400, f"Invalid Request. Error: {e}")
+        
+    data = patient.model_dump()
+    data['uid'] = ObjectId(user_id)
+    
+    try:
+        await g.db.patients.insert_one(data)
+    except pymongo.errors.DuplicateKeyError:
+        abort(400, "A patient record with this contact_no already exists!")
+    except pymongo.errors.PyMongoError as e:
+        logging.error(f"Couldn't insert patient data into the Database. Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+        
+    return jsonify({"message": "Patient has been Added Successfully!",
+                    "patient_name": f"{patient.firstname} {patient.lastname}"}), 201
+
+
+@patient.route("/<patient_id>", methods=["PUT"], strict_slashes=False)
+@utils.api_key_required
+async def update_patient(patient_id):
+    user_id = getattr(request, 'user_id', None)
+    
+    query = {"_id": records.object_id(patient_id, "Patient"), "uid": ObjectId(user_id)}
+    
+    try:
+        exists = await g.db.patients.find_one(query)
+        if not exists:
+            abort(401, "Invalid user_id or patient_id")
+            
+    except pymongo.errors.PyMongoError as e:
+        logging.error(f"Couldn't query patient({patient_id}) data. Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+    
+    try:
+        fields = schemas.PatientUpdate.model_validate_json(await request.get_data()).model_dump(exclude_unset=True)
+    except ValidationError as e:
+        abort(400, f"Invalid Request. Error: {e}")
+    
+    if not fields:
+        abort(400, "No fields to update")
+    
+    update = {
+        '$set': fields
+    }
+    
+    try:
+        await g.db.patients.update_one({"_id": ObjectId(patient_id)}, update)
+    except pymongo.errors.PyMongoError as e:
+        logging.error(f"Failed to update patient({patient_id}). Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+    
+    return jsonify({"message": "Record Updated Successfully!",
+                    "patient_id": patient_id})
+    
+    
+@patient.route("/<patient_id>", methods=["DELETE"], strict_slashes=False)
+@utils.api_key_required
+async def delete_patient(patient_id):
+    user_id = getattr(request, 'user_id', None)
+    
+    query = {"_id": records.object_id(patient_id, "Patient"), "uid": ObjectId(user_id)}
+    
+    try:
+        await g.db.patients.delete_one(query)
+    except pymongo.errors.PyMongoError as e:
+        logging.error(f"Couldn't delete patient({patient_id}) data. Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+    
+    return jsonify({"message": "Record Deleted Successfully!"})
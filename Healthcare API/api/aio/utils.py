@@ -0,0 +1,151 @@
+from quart import request, abort, g
+from werkzeug.exceptions import HTTPException
+from functools import wraps
+from api.utils import (hash_with_pepper, stream_log_fields, LOG_TRANSPORT, LOG_STREAM_KEY, LOG_STREAM_MAXLEN,
+                       MONITORING_SERVICE_URL)
+import redis.asyncio as aioredis
+import pymongo.errors
+import asyncio
+import logging
+import json
+
+# Strong references to in-flight log deliveries; the loop only keeps weak ones.
+_log_tasks = set()
+
+
+def api_key_required(func):
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        api_key = request.headers.get("Authorization")
+
+        if not api_key:
+            abort(401, "API Key is Missing!")
+
+        hashed_key = hash_with_pepper(api_key)
+
+        user_id = await g.cache_conn.get(hashed_key)
+
+        if user_id:
+            setattr(request, 'user_id', user_id.decode('utf-8'))
+
+        else:
+            query = {"api_key": hashed_key}
+            
+            try:
+                record = await g.db.users.find_one(query)
+            except pymongo.errors.PyMongoError as e:
+                logging.error(f"Couldn't query user data. Error: {e}")
+                abort(500, "The server encountered an Internal Error and was unable to complete your request")
+
+            if not record:
+                abort(401, "Invalid API Key!")
+                
+            user_id = str(record.get('_id'))
+            
+            setattr(request, 'user_id', user_id)
+            
+            await g.cache_conn.set(hashed_key, user_id, ex=3600)
+
+        return await func(*args, **kwargs)
+
+    return wrapper
+
+
+def get_request_data(exception):
+    user_id = getattr(request, 'user_id', None)
+    
+    if not user_id:
+        return
+    
+    request_data = {
+        "endpoint": request.endpoint,
+        "method": request.method,
+        "path": request.path,
+        "client_ip": request.remote_addr,
+        "date": g.request_date,
+        "time": g.request_time
+    }
+    
+    if not exception:
+        data = {
+            "user_id": user_id,
+            "request": request_data,
+            "response": {
+                "response_time": str(g.response_time),
+                "status_code": g.status_code
+            }
+        }    
+        
+    else:
+        status_code = 500
+        if isinstance(exception, HTTPException):
+            status_code = exception.code
+            
+        data = {
+            "user_id": user_id,
+            "request": request_data,
+            "response": {
+                "status_code": status_code
+            }
+        }
+        
+    return data
+
+
+def ship_request_log(exception):
+    from . import log_client, cache_pool
+
+    data = get_request_data(exception=exception)
+
+    if not data:
+        return
+    
+    if LOG_TRANSPORT == "stream":
+        log_stream = aioredis.Redis(connection_pool=cache_pool)
+        delivery = log_stream.xadd(LOG_STREAM_KEY, stream_log_fields(data), maxlen=LOG_STREAM_MAXLEN, approximate=True)
+    else:
+        url = f"{MONITORING_SERVICE_URL}/api/logs"
+        
+        headers = {
+            'Content-Type': 'application/json'
+        }
+        
+        delivery = log_client.post(url, content=json.dumps(data, default=str), headers=headers)
+
+    task = asyncio.create_task(delivery)
+    _log_tasks.add(task)
+    task.add_done_callback(_log_delivered)
+
+
+def _log_delivered(task):
+    _log_tasks.discard(task)
+
+    if not task.cancelled() and task.exception():
+        logging.error(f"Couldn't deliver request log. Error: {task.exception()}")
+
+
+async def invalidate_key_cache(email):
+    query = {"email": email}
+    
+    record = await g.db.users.find_one(query)
+    
+    if not record:
+        return
+    
+    key = record.get('api_key')
+
+    if key:
+        await g.cache_conn.delete(key)
+
+
+async def delete_related_records(user_id: str):
+    try:
+        async with await g.db.client.start_session() as session:
+            async with session.start_transaction():
+                await g.db.patients.delete_many({"uid": user_id}, session=session)
+                await g.db.doctors.delete_many({"uid": user_id}, session=session)
+                await g.db.appointments.delete_many({"uid": user_id}, session=session)
+                
+    except pymongo.errors.PyMongoError as e:
+        logging.error(f"Couldn't delete records related to user({user_id}). Error: {e}")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+import pymongo.errors
+import redis
+import logging
+import json
+import time
+import os
+
+QUEUE_KEY = "appointments:delay_queue"
+INFLIGHT_KEY = "appointments:delay_queue:inflight"
+REMINDER_CHANNEL = "appointments:reminders"
+
+REMINDER_LEAD = int(os.getenv("APPOINTMENT_REMINDER_LEAD", 86400))
+POP_BATCH_SIZE = int(os.getenv("DELAY_QUEUE_BATCH_SIZE", 100))
+POLL_INTERVAL = float(os.getenv("DELAY_QUEUE_POLL_INTERVAL", 1))
+VISIBILITY_TIMEOUT = int(os.getenv("DELAY_QUEUE_VISIBILITY_TIMEOUT", 60))
+
+# Moves up to ARGV[2] due members into the in-flight set, first putting back any
+# in-flight members whose worker died before acknowledging them.
+POP_SCRIPT = """
+local stale = redis.call('zrangebyscore', KEYS[2], '-inf', ARGV[1])
+for _, member in ipairs(stale) do
+    redis.call('zadd', KEYS[1], ARGV[1], member)
+    redis.call('zrem', KEYS[2], member)
+end
+
+local due = redis.call('zrangebyscore', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, member in ipairs(due) do
+    redis.call('zadd', KEYS[2], ARGV[1] + ARGV[3], member)
+    redis.call('zrem', KEYS[1], member)
+end
+return due
+"""
+
+
+def appointment_events(app_id, appointment_date):
+    # Members are deterministic so re-scheduling an appointment just moves its
+    # existing events instead of adding duplicates.
+    expire_at = appointment_date + timedelta(days=1)
+    remind_at = appointment_date - timedelta(seconds=REMINDER_LEAD)
+
+    return {f"expire:{app_id}": expire_at.timestamp(),
+            f"remind:{app_id}": remind_at.timestamp()}
+
+
+def appointment_event_members(app_id):
+    return f"expire:{app_id}", f"remind:{app_id}"
+
+
+def expire_appointments(db, app_ids):
+    result = db.appointments.update_many({"_id": {"$in": app_ids}, "status": "pending"},
+                                         {"$set": {"status": "cancelled"}})
+    return result.modified_count
+
+
+def send_reminders(db, cache_conn, app_ids):
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    query = {"_id": {"$in": app_ids}, "status": "pending", "date": {"$gte": today}}
+    
+    sent = 0
+    
+    for record in db.appointments.find(query):
+        reminder = {"appointment_id": str(record["_id"]),
+                    "uid": str(record["uid"]),
+                    "patient_id": str(record["patient_id"]),
+                    "doctor_id": str(record["doctor_id"]),
+                    "date": record["date"].date().isoformat()}
+        
+        cache_conn.publish(REMINDER_CHANNEL, json.dumps(reminder))
+        sent += 1
+        
+    return sent
+
+
+def acknowledge(cache_conn, members):
+    # A failed ack only means the members are redelivered after the visibility
+    # timeout, and expiring or reminding twice is harmless, so it's logged, not raised.
+    try:
+        cache_conn.zrem(INFLIGHT_KEY, *members)
+    except redis.RedisError as e:
+        logging.error(f"Couldn't acknowledge appointment events. Error: {e}")
+
+
+def run_delay_queue_worker(db, cache_pool, stop_event):
+    cache_conn = redis.Redis(connection_pool=cache_pool)
+    pop_due = cache_conn.register_script(POP_SCRIPT)
+    
+    while not stop_event.is_set():
+        try:
+            due = pop_due(keys=[QUEUE_KEY, INFLIGHT_KEY], args=[time.time(), POP_BATCH_SIZE, VISIBILITY_TIMEOUT])
+        except redis.RedisError as e:
+            logging.error(f"Couldn't pop due appointment events. Error: {e}")
+            stop_event.wait(POLL_INTERVAL)
+            continue
+        
+        if not due:
+            stop_event.wait(POLL_INTERVAL)
+            continue
+        
+        expiring, reminding, malformed = [], [], []
+        
+        for member in due:
+            try:
+                event, app_id = member.decode().split(":", 1)
+                (expiring if event == "expire" else reminding).append(ObjectId(app_id))
+            except (ValueError, InvalidId):
+                logging.error(f"Dropping malformed appointment event {member!r}")
+                malformed.append(member)
+        
+        # Dropped now rather than with the batch, so a failing batch can't keep them around.
+        if malformed:
+            acknowledge(cache_conn, malformed)
+            
+        try:
+            if expiring:
+                expire_appointments(db=db, app_ids=expiring)
+            if reminding:
+                send_reminders(db=db, cache_conn=cache_conn, app_ids=reminding)
+        except (pymongo.errors.PyMongoError, redis.RedisError) as e:
+            # Left in flight, the batch is retried once the visibility timeout passes.
+            logging.error(f"Couldn't apply due appointment events. Error: {e}")
+            continue
+        
+        if expiring or reminding:
+            acknowledge(cache_conn, [member for member in due if member not in malformed])
@@ -0,0 +1,111 @@
+from werkzeug.exceptions import abort
+from bson.objectid import ObjectId
+from datetime import date
+
+# Request parsing and response shaping shared by the Flask routes and their Quart
+# copies in api/aio, which only differ in how they call Mongo and Redis.
+
+# The visits embedded in a patient document: the key each listing nests them under,
+# the field date filters match, and what a listing shows of each visit.
+VISITS = {
+    "opd_records": {"list_key": "opds",
+                    "date": "date",
+                    "summary": {"ID": "id", "doctor": "doctor", "date": "date"}},
+    "ipd_records": {"list_key": "ipds",
+                    "date": "admission_date",
+                    "summary": {"ID": "id", "admission": "admission_date", "chief_complaint": "chief_complaint"}},
+    "er_records": {"list_key": "err",
+                   "date": "date",
+                   "summary": {"ID": "id", "date": "date", "chief_complaint": "chief_complaint"}},
+}
+
+
+def object_id(value, name):
+    if len(value) != 24:
+        abort(400, f"Invalid {name} ID")
+
+    return ObjectId(value)
+
+
+def page_offset(args, per_page):
+    page = args.get("page") or 1
+
+    return (int(page) * per_page) - per_page
+
+
+def with_age(record, exclude=()):
+    dob = record['dob']
+
+    age = date.today().year - dob.year - \
+        ((date.today().month, date.today().day) < (dob.month, dob.day))
+    record['age'] = age
+
+    return {key: str(value) for key, value in record.items() if key not in exclude}
+
+
+def patient_details(record):
+    return with_age(record, exclude=tuple(VISITS))
+
+
+def patient_summary(record):
+    return {"id": str(record['_id']),
+            "name": f"{record['firstname']} {record['lastname']}",
+            "contact_no": record['contact_no']}
+
+
+def doctor_summary(record):
+    return {"id": str(record['_id']),
+            "name": record['name'],
+            "contact_no": record['contact_no']}
+
+
+def visit_summary(field, visit):
+    return {key: visit[name] for key, name in VISITS[field]["summary"].items()}
+
+
+def visits_on(visits, field, on):
+    return [visit for visit in visits if visit[VISITS[field]["date"]] == on]
+
+
+def patient_visits(records, field, on=None):
+    # One entry per patient that has any visits, listing only those on `on` if given.
+    results = list()
+
+    for record in records:
+        if not record.get(field):
+            continue
+
+        visits = record[field] if on is None else visits_on(record[field], field, on)
+        results.append({"patient_id": str(record['_id']),
+                        VISITS[field]["list_key"]: [visit_summary(field, visit) for visit in visits]})
+
+    return results
+
+
+def appointment_query(user_id, args):
+    patient_id = args.get("patient_id")
+    doctor_id = args.get("doctor_id")
+
+    if not patient_id and not doctor_id:
+        abort(400, "No ID is provided. Please provide pateint id or doctor id or even both")
+
+    if patient_id and not doctor_id:
+        return {"patient_id": object_id(patient_id, "Patient"), "uid": ObjectId(user_id)}
+
+    if doctor_id and not patient_id:
+        return {"doctor_id": object_id(doctor_id, "Doctor"), "uid": ObjectId(user_id)}
+
+    if len(doctor_id) != 24 or len(patient_id) != 24:
+        abort(400, "Invalid ID provided")
+
+    return {"patient_id": ObjectId(patient_id), "doctor_id": ObjectId(doctor_id), "uid": ObjectId(user_id)}
+
+
+def appointment_details(record):
+    return {"id": str(record["_id"]), "Patient ID": str(record["patient_id"]),
+            "Doctor ID": str(record["doctor_id"]), "Date": record['date'], "status": record['status']}
+
+
+def appointment_summary(record):
+    return {"ID": str(record['_id']), "Patient ID": str(record['patient_id']), "Doctor ID": str(record['doctor_id']),
+            "Date": record['date'], "Status": record['status']}
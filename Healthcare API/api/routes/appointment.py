@@ -2,13 +2,11 @@ from flask import Blueprint, request, abort, jsonify, g
 from pydantic import ValidationError
 from bson.objectid import ObjectId
 from pymongo.errors import PyMongoError
-from datetime import datetime, date
-from api import utils, schemas
+from redis.exceptions import RedisError
+from datetime import date
+from api import utils, schemas, delay_queue, records
 import redis
 import time
-import json
-import threading
-import requests
 import logging
 
 appointment = Blueprint("appointment", __name__, url_prefix="/api/appointments")
@@ -32,19 +30,10 @@ def after_request(response):
 
 @appointment.teardown_request
 def teardown_request(exception=None):
-    if hasattr(g, "cache_conn"):
-        g.cache_conn.close()  
-        
-    url = "http://localhost:8000/api/logs"
+    utils.ship_request_log(exception=exception)
     
-    headers = {
-        'Content-Type': 'application/json'
-    }
-
-    data = json.dumps(utils.get_request_data(exception=exception), default=str)
-    
-    thread = threading.Thread(target=requests.post, kwargs={'url': url, 'data': data, 'headers': headers})
-    thread.start()
+    if hasattr(g, "cache_conn"):
+        g.cache_conn.close()
     
     
 @appointment.route("/<app_id>", methods=["GET"], strict_slashes=False)
@@ -52,10 +41,7 @@ def teardown_request(exception=None):
 def get_appointment_by_id(app_id):
     user_id = getattr(request, "user_id", None)
     
-    if len(app_id) != 24:
-        abort(400, "Invalid Appointment ID")
-        
-    query = {"_id": ObjectId(app_id), "uid": ObjectId(user_id)}
+    query = {"_id": records.object_id(app_id, "Appointment"), "uid": ObjectId(user_id)}
     
     try:
         record = g.db.appointments.find_one(query)
@@ -66,52 +52,25 @@ def get_appointment_by_id(app_id):
         logging.error(f"Couldn't query appointment(id: {app_id}). Error: {e}")
         abort(500, "The server encountered an Internal Error and was unable to complete your request")
         
-    data = {"id": str(record["_id"]), "Patient ID": str(record["patient_id"]),
-            "Doctor ID": str(record["doctor_id"]), "Date": record['date'], "status": record['status']}
-        
-    return jsonify({"Appointment": data}), 200
+    return jsonify({"Appointment": records.appointment_details(record)}), 200
 
 
 @appointment.route("/", methods=["GET"], strict_slashes=False)
 @utils.api_key_required
 def get_appointments_by_pid_or_did():
     user_id = getattr(request, "user_id", None)
-    patient_id = request.args.get("patient_id")
-    doctor_id = request.args.get("doctor_id")
-    page = request.args.get("page") or 1
-    offset = (int(page) * 20) - 20
-    
-    if not patient_id and not doctor_id:
-        abort(400, "No ID is provided. Please provide pateint id or doctor id or even both")
-        
-    if patient_id and not doctor_id:
-        if len(patient_id) != 24:
-            abort(400, "Invalid Patient ID")
-    
-        query = {"patient_id": ObjectId(patient_id), "uid": ObjectId(user_id)}
-        
-    elif doctor_id and not patient_id:
-        if len(doctor_id) != 24:
-            abort(400, "Invalid Doctor ID")
-    
-        query = {"doctor_id": ObjectId(doctor_id), "uid": ObjectId(user_id)}
-    
-    else:
-        if len(doctor_id) != 24 or len(patient_id) != 24:
-            abort(400, "Invalid ID provided")
-            
-        query = {"patient_id": ObjectId(patient_id), "doctor_id": ObjectId(doctor_id), "uid": ObjectId(user_id)}
+    offset = records.page_offset(request.args, 20)
+    query = records.appointment_query(user_id, request.args)
         
     try:
-        records = g.db.appointments.find(query).skip(offset).limit(20)
-        if not records:
+        found = g.db.appointments.find(query).skip(offset).limit(20)
+        if not found:
             abort(404, "No Record Found!")
     except PyMongoError as e:
-        logging.error(f"Couldn't query appointment record(uid: {user_id}, pid: {patient_id}). Error: {e}")
+        logging.error(f"Couldn't query appointment records({query}). Error: {e}")
         abort(500, "The server encountered an Internal Error and was unable to complete your request")
         
-    appointments = [{"ID": str(r['_id']), "Patient ID": str(r['patient_id']), "Doctor ID": str(r['doctor_id']),
-                     "Date": r['date'], "Status": r['status']} for r in records]
+    appointments = [records.appointment_summary(record) for record in found]
         
     return jsonify({"Appointments": appointments}), 200
 
@@ -122,21 +81,24 @@ def book_appointment():
     user_id = getattr(request, "user_id", None)
     
     try:
-        schemas.Appointment(**request.json)
+        appointment = schemas.Appointment.model_validate_json(request.get_data())
     except ValidationError as e:
         abort(400, f"Invalid Request. Error: {e}")
         
-    data = request.json
-    data['patient_id'] = ObjectId(data['patient_id'])
-    data['doctor_id'] = ObjectId(data['doctor_id'])
+    data = appointment.model_dump()
     data['uid'] = ObjectId(user_id)
-    data['date'] = datetime.strptime(data['date'], "%Y-%m-%d")
         
     try:
-        g.db.appointments.insert_one(data)
+        result = g.db.appointments.insert_one(data)
     except PyMongoError as e:
         logging.error(f"Couldn't add appointment record(uid: {user_id}). Error: {e}")
         abort(500, "The server encountered an Internal Error and was unable to complete your request")
+    
+    if data['status'] == "pending":
+        try:
+            g.cache_conn.zadd(delay_queue.QUEUE_KEY, delay_queue.appointment_events(result.inserted_id, data['date']))
+        except RedisError as e:
+            logging.error(f"Couldn't schedule appointment events(app_id: {result.inserted_id}). Error: {e}")
         
     return jsonify({"message": "Appointment added Successfully!"}), 200
 
@@ -147,13 +109,12 @@ def update_appointment_status(app_id):
     user_id = getattr(request, "user_id", None)
     status = request.args.get("status")
     
-    if len(app_id) != 24:
-        abort(400, "Invalid Appointment ID")
+    app_oid = records.object_id(app_id, "Appointment")
         
     if status not in ("pending", "done", "cancelled"):
         abort(400, "Invalid status for appointment")
         
-    query = {"_id": ObjectId(app_id), "uid": ObjectId(user_id)}
+    query = {"_id": app_oid, "uid": ObjectId(user_id)}
     update = {'$set': {'status': status}}
     
     try:
@@ -169,6 +130,14 @@ def update_appointment_status(app_id):
     except PyMongoError as e:
         logging.error(f"Couldn't update appointment status(app_id: {app_id}). Error: {e}")
         abort(500, "The server encountered an Internal Error and was unable to complete your request")
+    
+    try:
+        if status == "pending":
+            g.cache_conn.zadd(delay_queue.QUEUE_KEY, delay_queue.appointment_events(app_id, exists['date']))
+        else:
+            g.cache_conn.zrem(delay_queue.QUEUE_KEY, *delay_queue.appointment_event_members(app_id))
+    except RedisError as e:
+        logging.error(f"Couldn't reschedule appointment events(app_id: {app_id}). Error: {e}")
         
     return jsonify({"message": "Successfully updated appointment status"}), 200
     
@@ -178,15 +147,17 @@ def update_appointment_status(app_id):
 def delete_appointment(app_id):
     user_id = getattr(request, "user_id", None)
     
-    if len(app_id) != 24:
-        abort(400, "Invalid Appointment ID")
-        
-    query = {"_id": ObjectId(app_id), "uid": ObjectId(user_id)}
+    query = {"_id": records.object_id(app_id, "Appointment"), "uid": ObjectId(user_id)}
     
     try:
         g.db.appointments.delete_one(query)
     except PyMongoError as e:
         logging.error(f"Couldn't delete appointment({app_id}) data. Error: {e}")
         abort(500, "The server encountered an Internal Error and was unable to complete your request")
+    
+    try:
+        g.cache_conn.zrem(delay_queue.QUEUE_KEY, *delay_queue.appointment_event_members(app_id))
+    except RedisError as e:
+        logging.error(f"Couldn't unschedule appointment events(app_id: {app_id}). Error: {e}")
         
     return jsonify({"message": "Record Deleted Successfully!"})
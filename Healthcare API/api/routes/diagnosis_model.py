@@ -21,15 +21,8 @@ random_forest_model = joblib.load(random_forest_model_path)
 symptom_index = joblib.load(symptom_index_path)
 data_dict = joblib.load(data_dict_path)
 
-@model.route('/predict', methods=["POST"])
-def predict():
-    symptoms = request.json.get('symptoms')
-    
-    if not symptoms:
-        abort(400, "Symptoms not provided!")
-        
-    symptoms = symptoms.split(",") 
-      
+
+def run_models(symptoms):
     input_data = [0] * len(data_dict["symptom_index"]) 
     for symptom in symptoms: 
         index = data_dict["symptom_index"][symptom] 
@@ -49,4 +42,14 @@ def predict():
         "final_prediction":final_prediction 
     } 
     
-    return predictions, 200
+    return predictions
+
+
+@model.route('/predict', methods=["POST"])
+def predict():
+    symptoms = request.json.get('symptoms')
+    
+    if not symptoms:
+        abort(400, "Symptoms not provided!")
+    
+    return run_models(symptoms.split(",")), 200
@@ -1,13 +1,10 @@
 from flask import Blueprint, request, g, abort, jsonify
 from bson.objectid import ObjectId
-from datetime import datetime, date
-from api import schemas, utils
+from datetime import date
+from api import schemas, utils, records
 from pydantic import ValidationError
 import redis
 import pymongo.errors
-import requests
-import threading
-import json
 import logging
 import time
 
@@ -33,19 +30,10 @@ def after_request(response):
 
 @doctor.teardown_request
 def teardown_request(exception=None):
-    if hasattr(g, "cache_conn"):
-        g.cache_conn.close()  
-        
-    url = "http://localhost:8000/api/logs"
+    utils.ship_request_log(exception=exception)
     
-    headers = {
-        'Content-Type': 'application/json'
-    }
-
-    data = json.dumps(utils.get_request_data(exception=exception), default=str)
-    
-    thread = threading.Thread(target=requests.post, kwargs={'url': url, 'data': data, 'headers': headers})
-    thread.start()
+    if hasattr(g, "cache_conn"):
+        g.cache_conn.close()
         
 
 @doctor.route("/<doctor_id>", methods=["GET"], strict_slashes=False)
@@ -53,10 +41,7 @@ def teardown_request(exception=None):
 def get_doctor(doctor_id):
     user_id = getattr(request, 'user_id', None)
     
-    if len(doctor_id) != 24:
-        abort(400, "Invalid Doctor ID")
-
-    query = {"_id": ObjectId(doctor_id), "uid": ObjectId(user_id)}
+    query = {"_id": records.object_id(doctor_id, "Doctor"), "uid": ObjectId(user_id)}
     
     try:
         record = g.db.doctors.find_one(query)
@@ -67,42 +52,27 @@ def get_doctor(doctor_id):
         logging.error(f"Couldn't query record(uid: {user_id}, doc_id: {doctor_id}). Error: {e}")
         abort(500, "The server encountered an Internal Error and was unable to complete your request")
     
-    dob = record['dob']
-    age = date.today().year - dob.year - \
-        ((date.today().month, date.today().day) < (dob.month, dob.day))
-    record['age'] = age
-    
-    data = {key: str(value) for key, value in record.items()}
-    
-    return data, 200
+    return records.with_age(record), 200
     
     
 @doctor.route("/", methods=["GET"], strict_slashes=False)
 @utils.api_key_required
 def get_all_doctors():
     user_id = getattr(request, 'user_id', None)
-    page = request.args.get("page") or 1
-    offset = (int(page) * 20) - 20
+    offset = records.page_offset(request.args, 20)
     
     query = {"uid": ObjectId(user_id)}
     
     try:
-        records = g.db.doctors.find(query).skip(offset).limit(20)
-        if not records:
+        found = g.db.doctors.find(query).skip(offset).limit(20)
+        if not found:
             return jsonify({"message": "Record Not Found!"}), 404
         
     except pymongo.errors.PyMongoError as e:
         logging.error(f"Couldn't query user data. Error: {e}")
         abort(500, "The server encountered an Internal Error and was unable to complete your request")
 
-    doctors = list()
-
-    for record in records:
-        doctors.append({"id": str(record['_id']),
-                         "name": record['name'],
-                         "contact_no": record['contact_no']})
-
-    return doctors, 200
+    return [records.doctor_summary(record) for record in found], 200
 
 
 @doctor.route("/", methods=["POST"], strict_slashes=False)
@@ -111,12 +81,11 @@ def add_doctor():
     user_id = getattr(request, 'user_id', None)
     
     try:
-        doctor = schemas.Doctor(**request.json)
+        doctor = schemas.Doctor.model_validate_json(request.get_data())
     except ValidationError as e:
         abort(400, f"Invalid Request. Error: {e}")
         
-    data = request.json
-    data['dob'] = datetime.strptime(str(data['dob']), '%Y-%m-%d')
+    data = doctor.model_dump()
     data['uid'] = ObjectId(user_id)
     
     try:
@@ -136,10 +105,7 @@ def add_doctor():
 def update_doctor(doctor_id):
     user_id = getattr(request, 'user_id', None)
     
-    if len(doctor_id) != 24:
-        abort(400, "Invalid Doctor ID")
-    
-    query = {"_id": ObjectId(doctor_id), "uid": ObjectId(user_id)}
+    query = {"_id": records.object_id(doctor_id, "Doctor"), "uid": ObjectId(user_id)}
     
     try:
         exists = g.db.doctors.find_one(query)
@@ -151,14 +117,15 @@ def update_doctor(doctor_id):
         abort(500, "The server encountered an Internal Error and was unable to complete your request")
     
     try:
-        schemas.DoctorUpdate(**request.json)
+        fields = schemas.DoctorUpdate.model_validate_json(request.get_data()).model_dump(exclude_unset=True)
     except ValidationError as e:
         abort(400, f"Invalid Request. Error: {e}")
     
-    update_fields = request.json.keys()
+    if not fields:
+        abort(400, "No fields to update")
     
     update = {
-        '$set': {field: request.json[field] for field in update_fields}
+        '$set': fields
     }
     
     try:
@@ -176,10 +143,7 @@ def update_doctor(doctor_id):
 def delete_doctor(doctor_id):
     user_id = getattr(request, 'user_id', None)
     
-    if len(doctor_id) != 24:
-        abort(400, "Invalid Doctor ID")
-    
-    query = {"_id": ObjectId(doctor_id), "uid": ObjectId(user_id)}
+    query = {"_id": records.object_id(doctor_id, "Doctor"), "uid": ObjectId(user_id)}
     
     try:
         g.db.doctors.delete_one(query)
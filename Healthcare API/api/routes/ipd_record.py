@@ -3,14 +3,11 @@ from bson.objectid import ObjectId
 from pydantic import ValidationError
 from datetime import date
 import pymongo.errors
-from api import schemas, utils
+from api import schemas, utils, records
 import pymongo
 import logging
 import redis
 import time
-import threading
-import requests
-import json
 import uuid
 
 ipd_record = Blueprint("ipd_record", __name__, url_prefix="/api/ipd")
@@ -35,58 +32,37 @@ def after_request(response):
 
 @ipd_record.teardown_request
 def teardown_request(exception=None):
-    if hasattr(g, "cache_conn"):
-        g.cache_conn.close()  
-        
-    url = "http://localhost:8000/api/logs"
+    utils.ship_request_log(exception=exception)
     
-    headers = {
-        'Content-Type': 'application/json'
-    }
-
-    data = json.dumps(utils.get_request_data(exception=exception), default=str)
-    
-    thread = threading.Thread(target=requests.post, kwargs={'url': url, 'data': data, 'headers': headers})
-    thread.start()
+    if hasattr(g, "cache_conn"):
+        g.cache_conn.close()
 
 
 @ipd_record.route("/", methods=["GET"], strict_slashes=False)
 @utils.api_key_required
 def get_all_ipds():
     user_id = getattr(request, "user_id", None)
-    page = request.args.get("page") or 1
-    offset = (int(page) * 10) - 10
+    offset = records.page_offset(request.args, 10)
     
     query = {"uid": ObjectId(user_id)}
     
     try:
-        records = g.db.patients.find(query).skip(offset).limit(10)
-        if not records:
+        found = g.db.patients.find(query).skip(offset).limit(10)
+        if not found:
             return jsonify({"message": "Record Not Found!"}), 404
     
     except pymongo.errors.PyMongoError as e:
         logging.error(f"Couldn't query user data. Error: {e}")
         abort(500, "The server encountered an Internal Error and was unable to complete your request")
         
-    ipd_records = list()
-
-    for record in records:
-        if not record.get("ipd_records"):
-            continue
-        ipd_records.append({"patient_id": str(record['_id']),
-                            "ipds": [{"ID": r['id'],
-                                      "admission": r['admission_date'],
-                                      "chief_complaint": r['chief_complaint']} for r in record['ipd_records']]})
-        
-    return ipd_records, 200
+    return records.patient_visits(found, "ipd_records"), 200
 
 
 @ipd_record.route("/byDate", methods=["GET"], strict_slashes=False)
 @utils.api_key_required
 def get_ipd_by_date():
     user_id = getattr(request, "user_id", None)
-    page = request.args.get("page") or 1
-    offset = (int(page) * 10) - 10
+    offset = records.page_offset(request.args, 10)
     date = request.args.get("date")
     
     if not date:
@@ -95,25 +71,15 @@ def get_ipd_by_date():
     query = {"uid": ObjectId(user_id), "ipd_records": {"$elemMatch": {"admission_date": date}}}
         
     try:
-        records = g.db.patients.find(query).skip(offset).limit(10)
-        if not records:
+        found = g.db.patients.find(query).skip(offset).limit(10)
+        if not found:
             return jsonify({"message": "Invalid Patient ID"}), 400
     
     except pymongo.errors.PyMongoError as e:
         logging.error(f"Couldn't query record(uid: {user_id}. Error: {e}")
         abort(500, "The server encountered an Internal Error and was unable to complete your request")
     
-    ipd_records = list()
-    
-    for record in records:
-        if not record.get("ipd_records"):
-            continue
-        ipd_records.append({"patient_id": str(record['_id']),
-                                    "ipds": [{"ID": r['id'],
-                                            "admission": r['admission_date'],
-                                            "chief_complaint": r['chief_complaint']} for r in record['ipd_records'] if r['admission_date'] == date]})
-        
-    return jsonify({"IPD records": ipd_records}), 200  
+    return jsonify({"IPD records": records.patient_visits(found, "ipd_records", on=date)}), 200  
     
 
 @ipd_record.route("/<patient_id>", methods=["GET"], strict_slashes=False)
@@ -121,10 +87,7 @@ def get_ipd_by_date():
 def get_all_ipd_of_patient(patient_id):
     user_id = getattr(request, 'user_id', None)
     
-    if len(patient_id) != 24:
-        abort(400, "Invalid Patient ID")
-        
-    query = {"_id": ObjectId(patient_id), "uid": ObjectId(user_id)}
+    query = {"_id": records.object_id(patient_id, "Patient"), "uid": ObjectId(user_id)}
     
     try:
         record = g.db.patients.find_one(query)
@@ -138,8 +101,7 @@ def get_all_ipd_of_patient(patient_id):
     if 'ipd_records' not in record.keys():
         return jsonify({"message": "No IPD records found!"}), 404
     
-    ipd_records = [{"ID": r['id'], "admission": r['admission_date'],
-                    "chief_complaint": r['chief_complaint']} for r in record['ipd_records']]
+    ipd_records = [records.visit_summary("ipd_records", visit) for visit in record['ipd_records']]
     
     return jsonify({"IPD records": ipd_records}), 200
 
@@ -149,10 +111,7 @@ def get_all_ipd_of_patient(patient_id):
 def get_ipd_by_id(patient_id, ipd_id):
     user_id = getattr(request, "user_id", None)
     
-    if len(patient_id) != 24:
-        abort(400, "Invalid Patient ID")
-        
-    query = {"_id": ObjectId(patient_id), "uid": ObjectId(user_id)}
+    query = {"_id": records.object_id(patient_id, "Patient"), "uid": ObjectId(user_id)}
     
     try:
         patient = g.db.patients.find_one(query)
@@ -192,8 +151,7 @@ def get_ipd_of_patient_by_date(patient_id):
         logging.error(f"Couldn't query record(uid: {user_id}, pid: {patient_id}). Error: {e}")
         abort(500, "The server encountered an Internal Error and was unable to complete your request")
     
-    ipd_records = patient['ipd_records']
-    filtered_records = [r for r in ipd_records if r['admission_date'] == date]
+    filtered_records = records.visits_on(patient['ipd_records'], "ipd_records", date)
         
     if not filtered_records:
         return jsonify({"message": "No IPD records found!"}), 404
@@ -206,15 +164,14 @@ def get_ipd_of_patient_by_date(patient_id):
 def add_ipd_record(patient_id):
     user_id = getattr(request, 'user_id', None)
     
-    if len(patient_id) != 24:
-        abort(400, "Invalid Patient ID")
+    patient_oid = records.object_id(patient_id, "Patient")
     
     try:
-        schemas.IpdRecord(**request.json)
+        record = schemas.IpdRecord.model_validate_json(request.get_data())
     except ValidationError as e:
         abort(400, f"Invalid Request. Error: {e}")
         
-    query = {"_id": ObjectId(patient_id), "uid": ObjectId(user_id)}
+    query = {"_id": patient_oid, "uid": ObjectId(user_id)}
     
     try:
         exists = g.db.patients.find_one(query)
@@ -225,7 +182,7 @@ def add_ipd_record(patient_id):
         logging.error(f"Couldn't query patient({patient_id}) data. Error: {e}")
         abort(500, "The server encountered an Internal Error and was unable to complete your request")
     
-    data = request.json
+    data = record.model_dump(mode="json")
     data['id'] = str(uuid.uuid4())
     
     try:
@@ -244,10 +201,7 @@ def add_ipd_record(patient_id):
 def delete_ipd_record(patient_id, ipd_id):
     user_id = getattr(request, "user_id", None)
     
-    if len(patient_id) != 24:
-        abort(400, "Invalid Patient ID")
-        
-    query = {"_id": ObjectId(patient_id), "uid": ObjectId(user_id)}
+    query = {"_id": records.object_id(patient_id, "Patient"), "uid": ObjectId(user_id)}
     
     try:
         exists = g.db.patients.find_one(query)
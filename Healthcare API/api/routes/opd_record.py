@@ -3,14 +3,11 @@ from bson.objectid import ObjectId
 from pydantic import ValidationError
 from datetime import date
 import pymongo.errors
-from api import schemas, utils
+from api import schemas, utils, records
 import pymongo
 import logging
 import redis
 import time
-import threading
-import requests
-import json
 import uuid
 
 opd_record = Blueprint("opd_record", __name__, url_prefix="/api/opd")
@@ -35,58 +32,37 @@ def after_request(response):
 
 @opd_record.teardown_request
 def teardown_request(exception=None):
-    if hasattr(g, "cache_conn"):
-        g.cache_conn.close()  
-        
-    url = "http://localhost:8000/api/logs"
+    utils.ship_request_log(exception=exception)
     
-    headers = {
-        'Content-Type': 'application/json'
-    }
-
-    data = json.dumps(utils.get_request_data(exception=exception), default=str)
-    
-    thread = threading.Thread(target=requests.post, kwargs={'url': url, 'data': data, 'headers': headers})
-    thread.start()
+    if hasattr(g, "cache_conn"):
+        g.cache_conn.close()
 
 
 @opd_record.route("/", methods=["GET"], strict_slashes=False)
 @utils.api_key_required
 def get_all_opds():
     user_id = getattr(request, "user_id", None)
-    page = request.args.get("page") or 1
-    offset = (int(page) * 10) - 10
+    offset = records.page_offset(request.args, 10)
     
     query = {"uid": ObjectId(user_id)}
     
     try:
-        records = g.db.patients.find(query).skip(offset).limit(10)
-        if not records:
+        found = g.db.patients.find(query).skip(offset).limit(10)
+        if not found:
             return jsonify({"message": "Record Not Found!"}), 404
     
     except pymongo.errors.PyMongoError as e:
         logging.error(f"Couldn't query user data. Error: {e}")
         abort(500, "The server encountered an Internal Error and was unable to complete your request")
         
-    opd_records = list()
-
-    for record in records:
-        if not record.get("opd_records"):
-            continue
-        opd_records.append({"patient_id": str(record['_id']),
-                            "opds": [{"ID": r['id'],
-                                      "doctor": r['doctor'],
-                                      "date": r['date']} for r in record['opd_records']]})
-        
-    return opd_records, 200
+    return records.patient_visits(found, "opd_records"), 200
 
 
 @opd_record.route("/byDate", methods=["GET"], strict_slashes=False)
 @utils.api_key_required
 def get_opd_by_date():
     user_id = getattr(request, "user_id", None)
-    page = request.args.get("page") or 1
-    offset = (int(page) * 10) - 10
+    offset = records.page_offset(request.args, 10)
     date = request.args.get("date")
     
     if not date:
@@ -95,25 +71,15 @@ def get_opd_by_date():
     query = {"uid": ObjectId(user_id), "opd_records": {"$elemMatch": {"date": date}}}
         
     try:
-        records = g.db.patients.find(query).skip(offset).limit(10)
-        if not records:
+        found = g.db.patients.find(query).skip(offset).limit(10)
+        if not found:
             return jsonify({"message": "Invalid Patient ID"}), 400
     
     except pymongo.errors.PyMongoError as e:
         logging.error(f"Couldn't query record(uid: {user_id}. Error: {e}")
         abort(500, "The server encountered an Internal Error and was unable to complete your request")
     
-    opd_records = list()
-    
-    for record in records:
-        if not record.get("opd_records"):
-            continue
-        opd_records.append({"patient_id": str(record['_id']),
-                                    "opds": [{"ID": r['id'],
-                                            "doctor": r['doctor'],
-                                            "date": r['date']} for r in record['opd_records'] if r['date'] == date]})
-        
-    return jsonify({"OPD records": opd_records}), 200  
+    return jsonify({"OPD records": records.patient_visits(found, "opd_records", on=date)}), 200  
     
 
 @opd_record.route("/<patient_id>", methods=["GET"], strict_slashes=False)
@@ -121,10 +87,7 @@ def get_opd_by_date():
 def get_all_opd_of_patient(patient_id):
     user_id = getattr(request, 'user_id', None)
     
-    if len(patient_id) != 24:
-        abort(400, "Invalid Patient ID")
-        
-    query = {"_id": ObjectId(patient_id), "uid": ObjectId(user_id)}
+    query = {"_id": records.object_id(patient_id, "Patient"), "uid": ObjectId(user_id)}
     
     try:
         record = g.db.patients.find_one(query)
@@ -138,7 +101,7 @@ def get_all_opd_of_patient(patient_id):
     if 'opd_records' not in record.keys():
         return jsonify({"message": "No OPD records found!"}), 404
     
-    opd_records = [{"ID": r['id'], "doctor": r['doctor'], "date": r['date']} for r in  record['opd_records']]
+    opd_records = [records.visit_summary("opd_records", visit) for visit in record['opd_records']]
     
     return jsonify({"OPD records": opd_records}), 200
 
@@ -148,10 +111,7 @@ def get_all_opd_of_patient(patient_id):
 def get_opd_by_id(patient_id, opd_id):
     user_id = getattr(request, "user_id", None)
     
-    if len(patient_id) != 24:
-        abort(400, "Invalid Patient ID")
-        
-    query = {"_id": ObjectId(patient_id), "uid": ObjectId(user_id)}
+    query = {"_id": records.object_id(patient_id, "Patient"), "uid": ObjectId(user_id)}
     
     try:
         patient = g.db.patients.find_one(query)
@@ -191,8 +151,7 @@ def get_opd_of_patient_by_date(patient_id):
         logging.error(f"Couldn't query record(uid: {user_id}, pid: {patient_id}). Error: {e}")
         abort(500, "The server encountered an Internal Error and was unable to complete your request")
     
-    opd_records = patient['opd_records']
-    filtered_records = [r for r in opd_records if r['date'] == date]
+    filtered_records = records.visits_on(patient['opd_records'], "opd_records", date)
         
     if not filtered_records:
         return jsonify({"message": "No OPD records found!"}), 404
@@ -205,15 +164,14 @@ def get_opd_of_patient_by_date(patient_id):
 def add_opd_record(patient_id):
     user_id = getattr(request, 'user_id', None)
     
-    if len(patient_id) != 24:
-        abort(400, "Invalid Patient ID")
+    patient_oid = records.object_id(patient_id, "Patient")
     
     try:
-        schemas.OpdRecord(**request.json)
+        record = schemas.OpdRecord.model_validate_json(request.get_data())
     except ValidationError as e:
         abort(400, f"Invalid Request. Error: {e}")
         
-    query = {"_id": ObjectId(patient_id), "uid": ObjectId(user_id)}
+    query = {"_id": patient_oid, "uid": ObjectId(user_id)}
     
     try:
         exists = g.db.patients.find_one(query)
@@ -224,7 +182,7 @@ def add_opd_record(patient_id):
         logging.error(f"Couldn't query patient({patient_id}) data. Error: {e}")
         abort(500, "The server encountered an Internal Error and was unable to complete your request")
     
-    data = request.json
+    data = record.model_dump(mode="json")
     data['id'] = str(uuid.uuid4())
     
     try:
@@ -243,10 +201,7 @@ def add_opd_record(patient_id):
 def delete_opd_record(patient_id, opd_id):
     user_id = getattr(request, "user_id", None)
     
-    if len(patient_id) != 24:
-        abort(400, "Invalid Patient ID")
-        
-    query = {"_id": ObjectId(patient_id), "uid": ObjectId(user_id)}
+    query = {"_id": records.object_id(patient_id, "Patient"), "uid": ObjectId(user_id)}
     
     try:
         exists = g.db.patients.find_one(query)
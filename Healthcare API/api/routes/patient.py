@@ -1,13 +1,10 @@
 from flask import Blueprint, request, g, abort, jsonify
 from pydantic import ValidationError
 from bson.objectid import ObjectId
-from api import schemas, utils
-from datetime import datetime, date
+from api import schemas, utils, records
+from datetime import date
 import pymongo.errors
-import threading
 import redis
-import requests
-import json
 import logging
 import time
 
@@ -32,19 +29,10 @@ def after_request(response):
 
 @patient.teardown_request
 def teardown_request(exception=None):
-    if hasattr(g, "cache_conn"):
-        g.cache_conn.close()  
-        
-    url = "http://localhost:8000/api/logs"
+    utils.ship_request_log(exception=exception)
     
-    headers = {
-        'Content-Type': 'application/json'
-    }
-
-    data = json.dumps(utils.get_request_data(exception=exception), default=str)
-    
-    thread = threading.Thread(target=requests.post, kwargs={'url': url, 'data': data, 'headers': headers})
-    thread.start()
+    if hasattr(g, "cache_conn"):
+        g.cache_conn.close()
 
 
 @patient.route("/<patient_id>", methods=["GET"])
@@ -52,10 +40,7 @@ def teardown_request(exception=None):
 def get_patient(patient_id):
     user_id = getattr(request, 'user_id', None)
     
-    if len(patient_id) != 24:
-        abort(400, "Invalid Patient ID")
-
-    query = {"_id": ObjectId(patient_id), "uid": ObjectId(user_id)}
+    query = {"_id": records.object_id(patient_id, "Patient"), "uid": ObjectId(user_id)}
     
     try:
         record = g.db.patients.find_one(query)
@@ -66,44 +51,27 @@ def get_patient(patient_id):
         logging.error(f"Couldn't query record(uid: {user_id}, pid: {patient_id}). Error: {e}")
         abort(500, "The server encountered an Internal Error and was unable to complete your request")
     
-    dob = record['dob']
-
-    age = date.today().year - dob.year - \
-        ((date.today().month, date.today().day) < (dob.month, dob.day))
-    record['age'] = age
-    
-    data = {key: str(value) for key, value in record.items() if key not in ('opd_records', 'ipd_records',
-                                                                            'er_records')}
-    
-    return data, 200
+    return records.patient_details(record), 200
 
 
 @patient.route("/", methods=["GET"], strict_slashes=False)
 @utils.api_key_required
 def get_all_patients():
     user_id = getattr(request, 'user_id', None)
-    page = request.args.get("page") or 1
-    offset = (int(page) * 20) - 20
+    offset = records.page_offset(request.args, 20)
     
     query = {"uid": ObjectId(user_id)}
     
     try:
-        records = g.db.patients.find(query).skip(offset).limit(20)
-        if not records:
+        found = g.db.patients.find(query).skip(offset).limit(20)
+        if not found:
             return jsonify({"message": "Record Not Found!"}), 404
     
     except pymongo.errors.PyMongoError as e:
         logging.error(f"Couldn't query user data. Error: {e}")
         abort(500, "The server encountered an Internal Error and was unable to complete your request")
 
-    patients = list()
-
-    for record in records:
-        patients.append({"id": str(record['_id']),
-                         "name": f"{record['firstname']} {record['lastname']}",
-                         "contact_no": record['contact_no']})
-
-    return patients, 200
+    return [records.patient_summary(record) for record in found], 200
 
 
 @patient.route("/", methods=["POST"], strict_slashes=False)
@@ -112,12 +80,11 @@ def add_patient():
     user_id = getattr(request, 'user_id', None)
     
     try:
-        patient = schemas.Patient(**request.json)
+        patient = schemas.Patient.model_validate_json(request.get_data())
     except ValidationError as e:
         abort(400, f"Invalid Request. Error: {e}")
         
-    data = request.json
-    data['dob'] = datetime.strptime(str(data['dob']), '%Y-%m-%d')
+    data = patient.model_dump()
     data['uid'] = ObjectId(user_id)
     
     try:
@@ -137,10 +104,7 @@ def add_patient():
 def update_patient(patient_id):
     user_id = getattr(request, 'user_id', None)
     
-    if len(patient_id) != 24:
-        abort(400, "Invalid Patient ID")
-    
-    query = {"_id": ObjectId(patient_id), "uid": ObjectId(user_id)}
+    query = {"_id": records.object_id(patient_id, "Patient"), "uid": ObjectId(user_id)}
     
     try:
         exists = g.db.patients.find_one(query)
@@ -152,14 +116,15 @@ def update_patient(patient_id):
         abort(500, "The server encountered an Internal Error and was unable to complete your request")
     
     try:
-        schemas.PatientUpdate(**request.json)
+        fields = schemas.PatientUpdate.model_validate_json(request.get_data()).model_dump(exclude_unset=True)
     except ValidationError as e:
         abort(400, f"Invalid Request. Error: {e}")
     
-    update_fields = request.json.keys()
+    if not fields:
+        abort(400, "No fields to update")
     
     update = {
-        '$set': {field: request.json[field] for field in update_fields}
+        '$set': fields
     }
     
     try:
@@ -177,10 +142,7 @@ def update_patient(patient_id):
 def delete_patient(patient_id):
     user_id = getattr(request, 'user_id', None)
     
-    if len(patient_id) != 24:
-        abort(400, "Invalid Patient ID")
-    
-    query = {"_id": ObjectId(patient_id), "uid": ObjectId(user_id)}
+    query = {"_id": records.object_id(patient_id, "Patient"), "uid": ObjectId(user_id)}
     
     try:
         g.db.patients.delete_one(query)
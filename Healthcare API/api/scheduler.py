@@ -0,0 +1,119 @@
+from datetime import datetime
+from uuid import uuid4
+import pymongo
+import pymongo.errors
+import redis
+import logging
+import socket
+import time
+import os
+
+LEADER_KEY = "appointments:sweeper:leader"
+STATS_KEY = "appointments:sweeper:last_sweep"
+
+SWEEP_INTERVAL = int(os.getenv("APPOINTMENT_SWEEP_INTERVAL", 3600))
+SWEEP_BATCH_SIZE = int(os.getenv("APPOINTMENT_SWEEP_BATCH_SIZE", 500))
+LEASE_TTL = int(os.getenv("SCHEDULER_LEASE_TTL", 30))
+
+
+class LeaseLock:
+    # Renew and release compare the token first so a node that lost its lease
+    # (e.g. after a long GC pause) can't extend or delete the new leader's lease.
+    RENEW_SCRIPT = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            return redis.call('pexpire', KEYS[1], ARGV[2])
+        end
+        return 0
+    """
+    RELEASE_SCRIPT = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            return redis.call('del', KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(self, cache_conn, key, ttl):
+        self.cache_conn = cache_conn
+        self.key = key
+        self.ttl_ms = ttl * 1000
+        self.token = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex}"
+        self.held = False
+        self._renew = cache_conn.register_script(self.RENEW_SCRIPT)
+        self._release = cache_conn.register_script(self.RELEASE_SCRIPT)
+
+    def heartbeat(self):
+        try:
+            if self.held:
+                self.held = bool(self._renew(keys=[self.key], args=[self.token, self.ttl_ms]))
+            else:
+                self.held = bool(self.cache_conn.set(self.key, self.token, nx=True, px=self.ttl_ms))
+        except redis.RedisError as e:
+            logging.error(f"Couldn't refresh scheduler lease({self.key}). Error: {e}")
+            self.held = False
+            
+        return self.held
+
+    def release(self):
+        if self.held:
+            self._release(keys=[self.key], args=[self.token])
+            self.held = False
+
+
+def sweep_expired_appointments(db, cache_conn, lock):
+    # Returns whether the sweep ran to the end, i.e. didn't lose the lease half way.
+    # No lower bound on date: appointments booked (or set back to pending) with a date
+    # already in the past must still be found, and the {status, date} index keeps the
+    # query to the pending ones, which are few once the backlog has been swept.
+    cutoff = datetime.combine(datetime.now().date(), datetime.min.time())
+    query = {"status": "pending", "date": {"$lt": cutoff}}
+    
+    started = time.perf_counter()
+    updated = 0
+    
+    while True:
+        if not lock.heartbeat():
+            # Lost the lease half way, the new leader picks up whatever is still pending.
+            return False
+        
+        # Matching documents leave the {status, date} index range once they're
+        # cancelled, so re-running the same bounded query walks the backlog.
+        batch = [record["_id"] for record in db.appointments.find(query, {"_id": 1})
+                                                            .sort([("date", pymongo.ASCENDING)])
+                                                            .limit(SWEEP_BATCH_SIZE)]
+        if not batch:
+            break
+        
+        result = db.appointments.update_many({"_id": {"$in": batch}, "status": "pending"},
+                                             {"$set": {"status": "cancelled"}})
+        updated += result.modified_count
+            
+    # The outcome of the last completed sweep, for whoever wants to check on it.
+    cache_conn.hset(STATS_KEY, mapping={"updated": updated,
+                                        "duration": round(time.perf_counter() - started, 3),
+                                        "cutoff": cutoff.isoformat(),
+                                        "finished_at": datetime.now().isoformat()})
+    
+    return True
+
+
+def run_appointment_sweeper(db, cache_pool, stop_event):
+    cache_conn = redis.Redis(connection_pool=cache_pool)
+    lock = LeaseLock(cache_conn, LEADER_KEY, ttl=LEASE_TTL)
+    
+    db.appointments.create_index([("status", pymongo.ASCENDING), ("date", pymongo.ASCENDING)])
+    
+    next_sweep = 0
+    
+    try:
+        while not stop_event.is_set():
+            if lock.heartbeat() and time.monotonic() >= next_sweep:
+                try:
+                    # An interrupted sweep is retried as soon as this node leads again.
+                    if sweep_expired_appointments(db=db, cache_conn=cache_conn, lock=lock):
+                        next_sweep = time.monotonic() + SWEEP_INTERVAL
+                except (pymongo.errors.PyMongoError, redis.RedisError) as e:
+                    logging.error(f"Couldn't sweep expired appointments. Error: {e}")
+                    
+            stop_event.wait(LEASE_TTL / 3)
+    finally:
+        lock.release()
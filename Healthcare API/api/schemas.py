@@ -1,12 +1,30 @@
-from pydantic import BaseModel
-from datetime import date, time
-from typing import Literal, Optional
+from pydantic import BaseModel, AfterValidator, PlainSerializer
+from bson.objectid import ObjectId
+from datetime import date, time, datetime
+from typing import Annotated, Any, Literal, Optional
+
+
+def to_datetime(value: date) -> datetime:
+    return datetime.combine(value, datetime.min.time())
+
+
+def check_object_id(value: str) -> str:
+    if not ObjectId.is_valid(value):
+        raise ValueError("Invalid ObjectId")
+    return value
+
+
+# Fields that are stored with a different type than they're sent in. model_dump()
+# returns them Mongo-ready (BSON has no date-only type), so handlers can validate
+# the raw body with model_validate_json() and insert the dumped model directly.
+MongoDate = Annotated[date, PlainSerializer(to_datetime, return_type=datetime)]
+MongoObjectId = Annotated[str, AfterValidator(check_object_id), PlainSerializer(ObjectId, return_type=Any)]
 
 
 class Patient(BaseModel):
     firstname: str
     lastname: str
-    dob: date
+    dob: MongoDate
     gender: Literal['MALE', 'FEMALE']
     blood_group: Optional[Literal['A+', 'A-', 'B+', 'B-', 'O+', 'O-', 'AB+', 'AB-']] = None
     contact_no: str
@@ -15,7 +33,7 @@ class Patient(BaseModel):
 class PatientUpdate(BaseModel):
     firstname: Optional[str] = None
     lastname: Optional[str] = None
-    dob: Optional[date] = None
+    dob: Optional[MongoDate] = None
     gender: Optional[Literal["MALE", "FEMALE"]] = None
     blood_group: Optional[Literal['A+', 'A-', 'B+', 'B-', 'O+', 'O-', 'AB+', 'AB-']] = None
     contact_no: Optional[str] = None
@@ -23,7 +41,7 @@ class PatientUpdate(BaseModel):
 
 class Doctor(BaseModel):
     name: str
-    dob: date
+    dob: MongoDate
     gender: Literal['MALE', 'FEMALE']
     contact_no: str
     job_title: str
@@ -33,7 +51,7 @@ class Doctor(BaseModel):
 
 class DoctorUpdate(BaseModel):
     name: Optional[str] = None
-    dob: Optional[date] = None
+    dob: Optional[MongoDate] = None
     gender: Optional[Literal['MALE', 'FEMALE']] = None
     contact_no: Optional[str] = None
     job_title: Optional[str] = None
@@ -66,8 +84,8 @@ class ErRecord(BaseModel):
 
     
 class Appointment(BaseModel):
-    patient_id: str
-    doctor_id: str
-    date: date
+    patient_id: MongoObjectId
+    doctor_id: MongoObjectId
+    date: MongoDate
     status: Literal["pending", "done", "cancelled"] = "pending"
     
\ No newline at end of file
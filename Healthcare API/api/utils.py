@@ -1,19 +1,27 @@
 from flask import request, abort, g
 from werkzeug.exceptions import HTTPException
 from dotenv import load_dotenv
-from datetime import datetime
 from api import utils
 import pymongo
+import redis
+import requests
+import threading
 import logging
 import hashlib
+import json
 import os
-import time
-import schedule
 
 import pymongo.errors
 
 load_dotenv()
 
+# "stream" appends request logs to a Redis stream that the Monitoring Service's
+# log worker drains in batches; "http" posts each log to the service directly.
+LOG_TRANSPORT = os.getenv("LOG_TRANSPORT", "stream")
+LOG_STREAM_KEY = os.getenv("LOG_STREAM_KEY", "api_logs")
+LOG_STREAM_MAXLEN = int(os.getenv("LOG_STREAM_MAXLEN", 1000000))
+MONITORING_SERVICE_URL = os.getenv("MONITORING_SERVICE_URL", "http://localhost:8000")
+
 
 def hash_with_pepper(credentials: str):
     peppered_cred = credentials + os.getenv("PEPPER")
@@ -100,6 +108,51 @@ def get_request_data(exception):
     return data
 
 
+def stream_log_fields(data):
+    request_data = data["request"]
+    response_data = data["response"]
+    
+    # Kept flat with short keys since every entry stores its own field names.
+    fields = {
+        "u": data["user_id"],
+        "m": request_data["method"],
+        "e": request_data["endpoint"] or "",
+        "p": request_data["path"],
+        "ip": request_data["client_ip"] or "",
+        "t": request_data["time"],
+        "s": response_data["status_code"]
+    }
+    
+    if "response_time" in response_data:
+        fields["r"] = response_data["response_time"]
+        
+    return fields
+
+
+def ship_request_log(exception):
+    data = get_request_data(exception=exception)
+    
+    if not data:
+        return
+    
+    if LOG_TRANSPORT == "stream":
+        try:
+            g.cache_conn.xadd(LOG_STREAM_KEY, stream_log_fields(data), maxlen=LOG_STREAM_MAXLEN, approximate=True)
+        except redis.RedisError as e:
+            logging.error(f"Couldn't append request log to stream({LOG_STREAM_KEY}). Error: {e}")
+        return
+    
+    url = f"{MONITORING_SERVICE_URL}/api/logs"
+    
+    headers = {
+        'Content-Type': 'application/json'
+    }
+    
+    thread = threading.Thread(target=requests.post, kwargs={'url': url, 'data': json.dumps(data, default=str),
+                                                            'headers': headers})
+    thread.start()
+
+
 def invalidate_key_cache(email):
     query = {"email": email}
     
@@ -128,26 +181,3 @@ def delete_related_records(user_id: str):
         logging.error(f"Couldn't delete records related to user({user_id}). Error: {e}")
         abort(500, "The server encountered an Internal Error and was unable to complete your request")
 
-
-def check_and_update_appointments(db):
-    current_date = datetime.now().date()
-    query = {"date": {"$lt": datetime.combine(current_date, datetime.min.time())}, "status": "pending"}
-    update = {"$set": {"status": "cancelled"}}
-    
-    print("Checking appointments!")
-    try:
-        db.appointments.update_many(query, update)
-    except pymongo.errors.CollectionInvalid:
-        print("Collection does not exist. Waiting for the next scheduled check.")
-    except pymongo.errors.PyMongoError as e:
-        logging.error(f"Couldn't update Appointment status. Error: {e}")
-        abort(500, "The server encountered an Internal Error and was unable to complete your request")
-
-
-def schedule_appointment_checks(db):
-    schedule.every().hour.do(lambda: check_and_update_appointments(db=db))
-    
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
-        
\ No newline at end of file
@@ -0,0 +1,19 @@
+from dotenv import load_dotenv
+import uvicorn
+import os
+
+load_dotenv()
+
+
+if __name__ == "__main__":
+    host, port = os.getenv("WEB_BIND", "0.0.0.0:8002").rsplit(":", 1)
+
+    # One event loop per worker; each one opens its own Motor/Redis clients
+    # in before_serving, so workers can be added without any fork concerns.
+    uvicorn.run("api.aio:server",
+                host=host,
+                port=int(port),
+                workers=int(os.getenv("WEB_WORKERS", 1)),
+                backlog=int(os.getenv("WEB_BACKLOG", 4096)),
+                timeout_keep_alive=int(os.getenv("WEB_KEEPALIVE", 5)),
+                timeout_graceful_shutdown=int(os.getenv("WEB_GRACEFUL_TIMEOUT", 30)))
@@ -1,4 +1,6 @@
-from api import server
+from api import server, init_clients, start_appointment_checks
 
 if __name__ == "__main__":
+    init_clients()
+    start_appointment_checks()
     server.run(debug=True, port=8002)
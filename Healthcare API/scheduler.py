@@ -0,0 +1,23 @@
+from api import init_clients, close_clients, start_appointment_checks
+import threading
+import signal
+
+if __name__ == "__main__":
+    init_clients()
+    
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+
+    # Any number of these can run: delay queue pops are atomic and only the
+    # holder of the Redis lease sweeps.
+    threads = start_appointment_checks(stop_event=stop_event)
+    
+    try:
+        while not stop_event.is_set():
+            stop_event.wait(1)
+            
+        for thread in threads:
+            thread.join()
+    finally:
+        close_clients()
@@ -0,0 +1,94 @@
+from api.delay_queue import (POP_SCRIPT, QUEUE_KEY, INFLIGHT_KEY, REMINDER_LEAD, appointment_events,
+                             appointment_event_members, run_delay_queue_worker)
+from datetime import datetime, timedelta
+import threading
+import fakeredis
+import pytest
+
+VISIBILITY_TIMEOUT = 60
+
+
+@pytest.fixture
+def cache_conn():
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture
+def pop_due(cache_conn):
+    script = cache_conn.register_script(POP_SCRIPT)
+
+    def pop(now, batch_size=100):
+        return script(keys=[QUEUE_KEY, INFLIGHT_KEY], args=[now, batch_size, VISIBILITY_TIMEOUT])
+
+    return pop
+
+
+def test_appointment_events():
+    date = datetime(2030, 1, 1)
+
+    events = appointment_events("abc", date)
+
+    assert events == {"expire:abc": (date + timedelta(days=1)).timestamp(),
+                      "remind:abc": (date - timedelta(seconds=REMINDER_LEAD)).timestamp()}
+    assert set(appointment_event_members("abc")) == set(events)
+
+
+def test_rescheduling_moves_the_existing_events(cache_conn):
+    cache_conn.zadd(QUEUE_KEY, appointment_events("abc", datetime(2030, 1, 1)))
+    cache_conn.zadd(QUEUE_KEY, appointment_events("abc", datetime(2030, 2, 1)))
+
+    assert cache_conn.zcard(QUEUE_KEY) == 2
+    assert cache_conn.zscore(QUEUE_KEY, "expire:abc") == datetime(2030, 2, 2).timestamp()
+
+
+def test_pop_moves_due_members_in_flight(cache_conn, pop_due):
+    cache_conn.zadd(QUEUE_KEY, {"expire:a": 100, "remind:b": 200, "expire:c": 300})
+
+    assert pop_due(250) == [b"expire:a", b"remind:b"]
+    assert cache_conn.zrange(QUEUE_KEY, 0, -1) == [b"expire:c"]
+    assert cache_conn.zrange(INFLIGHT_KEY, 0, -1, withscores=True) == [(b"expire:a", 250 + VISIBILITY_TIMEOUT),
+                                                                       (b"remind:b", 250 + VISIBILITY_TIMEOUT)]
+
+
+def test_pop_takes_at_most_a_batch(cache_conn, pop_due):
+    cache_conn.zadd(QUEUE_KEY, {f"expire:{i}": i for i in range(5)})
+
+    assert pop_due(10, batch_size=2) == [b"expire:0", b"expire:1"]
+    assert pop_due(10, batch_size=2) == [b"expire:2", b"expire:3"]
+    assert cache_conn.zcard(INFLIGHT_KEY) == 4
+
+
+def test_unacknowledged_members_come_back_after_the_visibility_timeout(cache_conn, pop_due):
+    cache_conn.zadd(QUEUE_KEY, {"expire:a": 100})
+
+    assert pop_due(100) == [b"expire:a"]
+    # The worker died before acknowledging; nothing is handed out until the timeout passes.
+    assert pop_due(100 + VISIBILITY_TIMEOUT - 1) == []
+    assert pop_due(100 + VISIBILITY_TIMEOUT) == [b"expire:a"]
+    assert cache_conn.zcard(QUEUE_KEY) == 0
+
+
+def test_acknowledged_members_are_gone(cache_conn, pop_due):
+    cache_conn.zadd(QUEUE_KEY, {"expire:a": 100})
+    due = pop_due(100)
+
+    cache_conn.zrem(INFLIGHT_KEY, *due)
+
+    assert pop_due(100 + VISIBILITY_TIMEOUT) == []
+
+
+class StopWhenIdle(threading.Event):
+    # Ends the worker loop the first time it finds nothing due.
+    def wait(self, timeout=None):
+        self.set()
+        return True
+
+
+def test_worker_drops_malformed_members_and_keeps_going():
+    cache_conn = fakeredis.FakeRedis()
+    cache_conn.zadd(QUEUE_KEY, {"expire": 0, "remind:not-an-id": 0})
+
+    run_delay_queue_worker(db=None, cache_pool=cache_conn.connection_pool, stop_event=StopWhenIdle())
+
+    assert cache_conn.zcard(QUEUE_KEY) == 0
+    assert cache_conn.zcard(INFLIGHT_KEY) == 0
@@ -0,0 +1,79 @@
+from api.scheduler import LeaseLock, STATS_KEY, sweep_expired_appointments
+import fakeredis
+import pytest
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def cache_conn(server):
+    return fakeredis.FakeRedis(server=server)
+
+
+def test_only_one_node_holds_the_lease(cache_conn):
+    first = LeaseLock(cache_conn, "lease", ttl=30)
+    second = LeaseLock(cache_conn, "lease", ttl=30)
+
+    assert first.heartbeat()
+    assert not second.heartbeat()
+    assert first.heartbeat()
+    assert cache_conn.get("lease").decode() == first.token
+
+
+def test_heartbeat_renews_the_lease(cache_conn):
+    lock = LeaseLock(cache_conn, "lease", ttl=30)
+    lock.heartbeat()
+    cache_conn.pexpire("lease", 1000)
+
+    assert lock.heartbeat()
+    assert cache_conn.pttl("lease") > 29000
+
+
+def test_release_hands_the_lease_over(cache_conn):
+    first = LeaseLock(cache_conn, "lease", ttl=30)
+    second = LeaseLock(cache_conn, "lease", ttl=30)
+    first.heartbeat()
+
+    first.release()
+
+    assert not first.held
+    assert second.heartbeat()
+
+
+def test_expired_holder_cannot_touch_the_new_leaders_lease(cache_conn):
+    first = LeaseLock(cache_conn, "lease", ttl=30)
+    second = LeaseLock(cache_conn, "lease", ttl=30)
+    first.heartbeat()
+
+    # The lease runs out while the first holder is paused, and another node takes it.
+    cache_conn.delete("lease")
+    assert second.heartbeat()
+
+    assert not first.heartbeat()
+
+    first.held = True
+    first.release()
+
+    assert cache_conn.get("lease").decode() == second.token
+    assert second.heartbeat()
+
+
+def test_redis_errors_drop_the_lease(server, cache_conn):
+    lock = LeaseLock(cache_conn, "lease", ttl=30)
+    lock.heartbeat()
+
+    server.connected = False
+
+    assert not lock.heartbeat()
+    assert not lock.held
+
+
+def test_sweep_that_loses_the_lease_is_not_complete(cache_conn):
+    lock = LeaseLock(cache_conn, "lease", ttl=30)
+    LeaseLock(cache_conn, "lease", ttl=30).heartbeat()
+
+    assert sweep_expired_appointments(db=None, cache_conn=cache_conn, lock=lock) is False
+    assert not cache_conn.exists(STATS_KEY)
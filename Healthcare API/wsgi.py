@@ -0,0 +1,50 @@
+from gunicorn.app.base import BaseApplication
+from dotenv import load_dotenv
+import multiprocessing
+import os
+
+load_dotenv()
+
+
+def post_fork(arbiter, worker):
+    import api
+    api.init_clients()
+
+
+def worker_exit(arbiter, worker):
+    import api
+    api.close_clients()
+
+
+class Application(BaseApplication):
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from api import server
+        return server
+
+
+options = {
+    "bind": os.getenv("WEB_BIND", "0.0.0.0:8002"),
+    "workers": int(os.getenv("WEB_WORKERS", multiprocessing.cpu_count() * 2 + 1)),
+    "threads": int(os.getenv("WEB_THREADS", 4)),
+    "worker_class": "gthread",
+    "timeout": int(os.getenv("WEB_TIMEOUT", 30)),
+    "graceful_timeout": int(os.getenv("WEB_GRACEFUL_TIMEOUT", 30)),
+    "keepalive": int(os.getenv("WEB_KEEPALIVE", 5)),
+    # Import the app (and the diagnosis models it loads) once in the master so
+    # workers share them copy-on-write; clients are only created after the fork.
+    "preload_app": True,
+    "post_fork": post_fork,
+    "worker_exit": worker_exit,
+}
+
+
+if __name__ == "__main__":
+    Application(options).run()
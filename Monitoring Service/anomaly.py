@@ -0,0 +1,308 @@
+from psycopg2.extras import execute_values, Json
+from broker import ALERT_CHANNEL_PREFIX
+from datetime import datetime, timezone
+import logging
+import redis
+import json
+import math
+import os
+
+# Per user/endpoint detectors, updated at ingest. Logs are counted into fixed
+# windows; when a window closes its error rate and mean log-latency are scored
+# against an exponentially weighted mean/variance of the previous windows.
+STATE_PREFIX = "anomaly:"
+REGISTRY_KEY = "anomaly:detectors"
+
+WINDOW = int(os.getenv("ANOMALY_WINDOW", 60))
+ALPHA = float(os.getenv("ANOMALY_ALPHA", 0.1))
+Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", 4))
+# Windows a detector must have seen, and requests a window must hold, to be scored.
+WARMUP_WINDOWS = int(os.getenv("ANOMALY_WARMUP_WINDOWS", 10))
+MIN_REQUESTS = int(os.getenv("ANOMALY_MIN_REQUESTS", 20))
+# Besides the z-score an alert needs a meaningful absolute change, so flat
+# baselines with near-zero variance don't alert on noise.
+MIN_ERROR_RATE_DELTA = float(os.getenv("ANOMALY_MIN_ERROR_RATE_DELTA", 0.1))
+MIN_LATENCY_RATIO = float(os.getenv("ANOMALY_MIN_LATENCY_RATIO", 1.5))
+CHECKPOINT_INTERVAL = int(os.getenv("ANOMALY_CHECKPOINT_INTERVAL", 60))
+
+CHECKPOINT_LOCK_ID = 7310046
+
+# Runs per (detector, window) so the state is shared by every ingest process.
+# An alert fires when a metric becomes anomalous, not for every anomalous window.
+OBSERVE_SCRIPT = """
+local fields = {'w', 'c', 'e', 'ls', 'ln', 'em', 'ev', 'lm', 'lv', 'n', 'ae', 'al'}
+local s = redis.call('hmget', KEYS[1], unpack(fields))
+local window = tonumber(ARGV[1])
+local w = tonumber(s[1])
+
+if w == nil then
+    redis.call('hset', KEYS[1], 'w', window, 'c', ARGV[2], 'e', ARGV[3], 'ls', ARGV[4], 'ln', ARGV[5], 'n', 0)
+    redis.call('sadd', KEYS[2], KEYS[1])
+    return {}
+end
+
+if window <= w then
+    redis.call('hincrby', KEYS[1], 'c', ARGV[2])
+    redis.call('hincrby', KEYS[1], 'e', ARGV[3])
+    redis.call('hincrbyfloat', KEYS[1], 'ls', ARGV[4])
+    redis.call('hincrby', KEYS[1], 'ln', ARGV[5])
+    return {}
+end
+
+local c, e, ls, ln = tonumber(s[2]), tonumber(s[3]), tonumber(s[4]), tonumber(s[5])
+local em, ev, lm, lv = tonumber(s[6]) or 0, tonumber(s[7]) or 0, tonumber(s[8]) or 0, tonumber(s[9]) or 0
+local n, ae, al = tonumber(s[10]) or 0, s[11] or '0', s[12] or '0'
+local alpha, z = tonumber(ARGV[6]), tonumber(ARGV[7])
+local warmup, min_requests = tonumber(ARGV[8]), tonumber(ARGV[9])
+local min_delta, min_ratio = tonumber(ARGV[10]), tonumber(ARGV[11])
+local alerts = {}
+
+local function ewma(mean, var, x)
+    local diff = x - mean
+    local incr = alpha * diff
+    return mean + incr, (1 - alpha) * (var + diff * incr)
+end
+
+if c >= min_requests then
+    local rate = e / c
+    local latency = ln > 0 and ls / ln or nil
+    
+    if n >= warmup then
+        -- Never tighter than binomial noise for this window's request count.
+        local score = (rate - em) / math.max(math.sqrt(ev), math.sqrt(em * (1 - em) / c), 1e-6)
+        if score >= z and rate - em >= min_delta then
+            if ae ~= '1' then
+                table.insert(alerts, {'error_rate', tostring(rate), tostring(em), tostring(score), tostring(w)})
+            end
+            ae = '1'
+        elseif score < z / 2 then
+            ae = '0'
+        end
+        
+        if latency then
+            local score = (latency - lm) / math.max(math.sqrt(lv), 1e-6)
+            if score >= z and math.exp(latency - lm) >= min_ratio then
+                if al ~= '1' then
+                    table.insert(alerts, {'latency', tostring(math.exp(latency)), tostring(math.exp(lm)), tostring(score), tostring(w)})
+                end
+                al = '1'
+            elseif score < z / 2 then
+                al = '0'
+            end
+        end
+    end
+    
+    if n == 0 then
+        em, lm = rate, latency or 0
+    else
+        em, ev = ewma(em, ev, rate)
+        if latency then
+            lm, lv = ewma(lm, lv, latency)
+        end
+    end
+    n = n + 1
+end
+
+redis.call('hset', KEYS[1], 'w', window, 'c', ARGV[2], 'e', ARGV[3], 'ls', ARGV[4], 'ln', ARGV[5],
+           'em', tostring(em), 'ev', tostring(ev), 'lm', tostring(lm), 'lv', tostring(lv), 'n', n, 'ae', ae, 'al', al)
+return alerts
+"""
+
+INSERT_ALERTS_QUERY = """
+    INSERT INTO anomaly_alerts(user_id, endpoint, metric, value, baseline, zscore, window_start)
+    VALUES %s
+"""
+
+
+RECENT_ALERTS_QUERY = """
+    SELECT endpoint, metric, value, baseline, zscore, window_start, created_at
+    FROM anomaly_alerts
+    WHERE user_id = %s AND (%s::timestamptz IS NULL OR window_start >= %s)
+    ORDER BY window_start DESC, id DESC
+    LIMIT %s
+"""
+
+
+def detector_key(user_id, endpoint, prefix=STATE_PREFIX):
+    return f"{prefix}{user_id}:{endpoint or ''}"
+
+
+def window_deltas(rows):
+    # {(user_id, endpoint): {window: [count, errors, log-latency sum, latencies]}}
+    deltas = {}
+    
+    for row in rows:
+        user_id, endpoint, status_code, ts, resp_time = row[0], row[2], row[4], row[5], row[6]
+        window = int(ts.timestamp()) // WINDOW * WINDOW
+        delta = deltas.setdefault((user_id, endpoint or ""), {}).setdefault(window, [0, 0, 0.0, 0])
+        
+        delta[0] += 1
+        
+        if not (status_code >= 200 and status_code < 400):
+            delta[1] += 1
+            
+        if resp_time is not None and resp_time > 0:
+            delta[2] += math.log(resp_time)
+            delta[3] += 1
+            
+    return deltas
+
+
+def observe(cache_conn, rows, prefix=STATE_PREFIX):
+    # O(1) per log in Python plus one script call per detector and window in the batch.
+    script = cache_conn.register_script(OBSERVE_SCRIPT)
+    pipe = cache_conn.pipeline(transaction=False)
+    calls = []
+    
+    for (user_id, endpoint), windows in window_deltas(rows).items():
+        for window in sorted(windows):
+            count, errors, log_sum, latencies = windows[window]
+            script(keys=[detector_key(user_id, endpoint, prefix), f"{prefix}detectors"],
+                   args=[window, count, errors, repr(log_sum), latencies, ALPHA, Z_THRESHOLD,
+                         WARMUP_WINDOWS, MIN_REQUESTS, MIN_ERROR_RATE_DELTA, MIN_LATENCY_RATIO],
+                   client=pipe)
+            calls.append((user_id, endpoint))
+            
+    alerts = []
+    
+    for (user_id, endpoint), result in zip(calls, pipe.execute()):
+        for metric, value, baseline, score, window in result:
+            alerts.append({"user_id": user_id,
+                           "endpoint": endpoint or None,
+                           "metric": metric.decode(),
+                           "value": round(float(value), 6),
+                           "baseline": round(float(baseline), 6),
+                           "zscore": round(float(score), 2),
+                           "window_start": datetime.fromtimestamp(int(window), tz=timezone.utc).isoformat()})
+            
+    return alerts
+
+
+def record_alerts(cursor, cache_conn, alerts):
+    if not alerts:
+        return
+    
+    execute_values(cursor, INSERT_ALERTS_QUERY,
+                   [(a["user_id"], a["endpoint"], a["metric"], a["value"], a["baseline"], a["zscore"], a["window_start"])
+                    for a in alerts])
+    cursor.connection.commit()
+    
+    pipe = cache_conn.pipeline(transaction=False)
+    
+    for alert in alerts:
+        pipe.publish(f"{ALERT_CHANNEL_PREFIX}{alert['user_id']}", json.dumps(alert))
+        
+    pipe.execute()
+
+
+def detect(cursor, cache_conn, rows):
+    alerts = observe(cache_conn, rows)
+    record_alerts(cursor, cache_conn, alerts)
+    
+    return alerts
+
+
+def recent_alerts(cursor, user_id, since=None, limit=100):
+    cursor.execute(RECENT_ALERTS_QUERY, (user_id, since, since, limit))
+    
+    return [{"endpoint": endpoint,
+             "metric": metric,
+             "value": value,
+             "baseline": baseline,
+             "zscore": zscore,
+             "window_start": window_start.isoformat(),
+             "created_at": created_at.isoformat()}
+            for endpoint, metric, value, baseline, zscore, window_start, created_at in cursor.fetchall()]
+
+
+def checkpoint(conn, cache_conn):
+    # Copies every detector's Redis state into Postgres, so it survives a Redis loss.
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", (CHECKPOINT_LOCK_ID,))
+    
+    if not cursor.fetchone()[0]:
+        conn.rollback()
+        return 0
+    
+    saved = 0
+    
+    for keys in batched(cache_conn.sscan_iter(REGISTRY_KEY, count=1000), 1000):
+        pipe = cache_conn.pipeline(transaction=False)
+        
+        for key in keys:
+            pipe.hgetall(key)
+            
+        rows = [(key.decode(), Json({field.decode(): value.decode() for field, value in state.items()}))
+                for key, state in zip(keys, pipe.execute()) if state]
+        
+        if rows:
+            execute_values(cursor, """
+                INSERT INTO anomaly_detectors(key, state) VALUES %s
+                ON CONFLICT (key) DO UPDATE SET state = EXCLUDED.state, updated_at = now()
+            """, rows)
+            saved += len(rows)
+            
+    conn.commit()
+    
+    return saved
+
+
+def restore(conn, cache_conn):
+    # Only when Redis has lost every detector, e.g. after a flush or failover.
+    if cache_conn.scard(REGISTRY_KEY):
+        return 0
+    
+    cursor = conn.cursor()
+    cursor.execute("SELECT key, state FROM anomaly_detectors")
+    rows = cursor.fetchall()
+    conn.rollback()
+    
+    pipe = cache_conn.pipeline(transaction=False)
+    
+    for key, state in rows:
+        pipe.hset(key, mapping=state)
+        pipe.sadd(REGISTRY_KEY, key)
+        
+    pipe.execute()
+    
+    return len(rows)
+
+
+def batched(iterable, size):
+    batch = []
+    
+    for item in iterable:
+        batch.append(item)
+        
+        if len(batch) == size:
+            yield batch
+            batch = []
+            
+    if batch:
+        yield batch
+
+
+def run_checkpointer(pool, cache_pool, stop_event):
+    cache_conn = redis.Redis(connection_pool=cache_pool)
+    restored = False
+    
+    while True:
+        try:
+            conn = pool.getconn()
+        except Exception as e:
+            logging.error(f"Couldn't get a connection to checkpoint anomaly detectors. Error: {e}")
+        else:
+            try:
+                if not restored:
+                    restore(conn, cache_conn)
+                    restored = True
+                    
+                checkpoint(conn, cache_conn)
+            except Exception as e:
+                conn.rollback()
+                logging.error(f"Couldn't checkpoint anomaly detectors. Error: {e}")
+            finally:
+                pool.putconn(conn)
+                
+        if stop_event.wait(CHECKPOINT_INTERVAL):
+            break
@@ -0,0 +1,319 @@
+from counters import FIELDS, live_counts
+import redis.asyncio as aioredis
+import threading
+import logging
+import asyncio
+import queue
+import redis
+import json
+import time
+import os
+
+# Each user's counter totals are published on their own channel whenever logs for them
+# are ingested, so a stream only wakes for its own user and never has to query Postgres.
+CHANNEL_PREFIX = "request_count:updates:"
+# Anomaly alerts (see anomaly.py) go out the same way on a channel of their own.
+ALERT_CHANNEL_PREFIX = "anomalies:"
+
+# A client gets at most one update per interval; anything in between is coalesced.
+MIN_INTERVAL = float(os.getenv("STREAM_MIN_INTERVAL", 1))
+POLL_INTERVAL = 0.2
+
+TOTALS_QUERY = "SELECT user_id, total_req, success_resp, error_resp FROM request_count WHERE user_id = ANY(%s)"
+
+
+def channel(user_id):
+    return f"{CHANNEL_PREFIX}{user_id}"
+
+
+def current_totals(cursor, cache_conn, user_ids):
+    # Persisted counts plus whatever is still waiting in Redis to be flushed.
+    cursor.execute(TOTALS_QUERY, (list(user_ids),))
+    persisted = {row[0]: row[1:] for row in cursor.fetchall()}
+    cursor.connection.rollback()
+    
+    totals = {}
+    
+    for user_id in user_ids:
+        live = live_counts(cache_conn, user_id)
+        stored = persisted.get(user_id, (0, 0, 0))
+        totals[user_id] = {field: stored[index] + live[field] for index, field in enumerate(FIELDS)}
+        
+    return totals
+
+
+def publish_totals(cursor, cache_conn, user_ids):
+    user_ids = sorted(set(user_ids))
+    
+    # Only users somebody is watching cost a query.
+    subscribers = cache_conn.pubsub_numsub(*[channel(user_id) for user_id in user_ids])
+    watched = [user_id for user_id, (_, count) in zip(user_ids, subscribers) if count]
+    
+    if not watched:
+        return 0
+    
+    pipe = cache_conn.pipeline(transaction=False)
+    
+    for user_id, totals in current_totals(cursor, cache_conn, watched).items():
+        pipe.publish(channel(user_id), json.dumps(totals))
+        
+    pipe.execute()
+    
+    return len(watched)
+
+
+class Subscription:
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self._cond = threading.Condition()
+        self._latest = None
+        self._delivered_at = 0.0
+
+    def push(self, payload):
+        with self._cond:
+            self._latest = payload
+            self._cond.notify()
+
+    def next(self, timeout):
+        # The newest payload, or None if there was nothing new within timeout.
+        deadline = time.monotonic() + timeout
+        
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                ready_at = self._delivered_at + MIN_INTERVAL
+                
+                if self._latest is not None and now >= ready_at:
+                    payload, self._latest = self._latest, None
+                    self._delivered_at = now
+                    return payload
+                
+                if now >= deadline:
+                    return None
+                
+                self._cond.wait((deadline if self._latest is None else min(deadline, ready_at)) - now)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class AsyncSubscription:
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self._event = asyncio.Event()
+        self._latest = None
+        self._delivered_at = 0.0
+
+    def push(self, payload):
+        self._latest = payload
+        self._event.set()
+
+    async def next(self, timeout):
+        deadline = time.monotonic() + timeout
+        
+        while True:
+            now = time.monotonic()
+            
+            if self._latest is not None:
+                ready_at = self._delivered_at + MIN_INTERVAL
+                
+                if now >= ready_at:
+                    payload, self._latest = self._latest, None
+                    self._delivered_at = now
+                    return payload
+                
+                if ready_at >= deadline:
+                    await asyncio.sleep(deadline - now)
+                    return None
+                
+                await asyncio.sleep(ready_at - now)
+                continue
+            
+            if now >= deadline:
+                return None
+            
+            self._event.clear()
+            
+            try:
+                await asyncio.wait_for(self._event.wait(), deadline - now)
+            except asyncio.TimeoutError:
+                return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class AsyncQueueSubscription:
+    # For events that mustn't be coalesced (alerts): queued in order, oldest
+    # dropped if a client falls more than `MAX_QUEUED` behind.
+    MAX_QUEUED = 100
+
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self._queue = asyncio.Queue(maxsize=self.MAX_QUEUED)
+
+    def push(self, payload):
+        if self._queue.full():
+            self._queue.get_nowait()
+            
+        self._queue.put_nowait(payload)
+
+    async def next(self, timeout):
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class BaseBroker:
+    # Fans per-user Redis channels out to this process's streams over one pub/sub
+    # connection. A channel stays subscribed while any local stream watches that
+    # user; (un)subscribes are queued for the listener as pub/sub isn't thread-safe.
+
+    subscription_class = None
+    channel_prefix = CHANNEL_PREFIX
+
+    def __init__(self, cache_pool):
+        self.cache_pool = cache_pool
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._changes = queue.SimpleQueue()
+
+    def subscribe(self, user_id):
+        subscription = self.subscription_class(self, user_id)
+        
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+            
+        self._changes.put(user_id)
+        
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id, set())
+            subscribers.discard(subscription)
+            
+            if not subscribers:
+                self._subscribers.pop(subscription.user_id, None)
+                
+        self._changes.put(subscription.user_id)
+
+    def stats(self):
+        with self._lock:
+            return {"users": len(self._subscribers),
+                    "subscriptions": sum(len(subscribers) for subscribers in self._subscribers.values())}
+
+    def watched_channels(self):
+        with self._lock:
+            return [f"{self.channel_prefix}{user_id}" for user_id in self._subscribers]
+
+    def pending_changes(self):
+        # (channel, watched) for every user whose subscribers changed since the last call.
+        while True:
+            try:
+                user_id = self._changes.get_nowait()
+            except queue.Empty:
+                return
+            
+            with self._lock:
+                watched = user_id in self._subscribers
+                
+            yield f"{self.channel_prefix}{user_id}", watched
+
+    def deliver(self, message):
+        user_id = message["channel"].decode()[len(self.channel_prefix):]
+        payload = json.loads(message["data"])
+        
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+            
+        for subscription in subscribers:
+            subscription.push(payload)
+
+
+class Broker(BaseBroker):
+    subscription_class = Subscription
+
+    def start(self, stop_event):
+        threading.Thread(target=self.run, args=(stop_event,), daemon=True).start()
+
+    def run(self, stop_event):
+        while not stop_event.is_set():
+            try:
+                self._listen(stop_event)
+            except redis.RedisError as e:
+                logging.error(f"Stream broker lost its Redis connection. Error: {e}")
+                stop_event.wait(1)
+
+    def _listen(self, stop_event):
+        pubsub = redis.Redis(connection_pool=self.cache_pool).pubsub(ignore_subscribe_messages=True)
+        
+        # Every watched user is subscribed again after a reconnect.
+        if channels := self.watched_channels():
+            pubsub.subscribe(*channels)
+            
+        try:
+            while not stop_event.is_set():
+                # Both are no-ops in Redis when already (un)subscribed.
+                for name, watched in self.pending_changes():
+                    if watched:
+                        pubsub.subscribe(name)
+                    else:
+                        pubsub.unsubscribe(name)
+                
+                message = pubsub.get_message(timeout=POLL_INTERVAL)
+                
+                if message is not None:
+                    self.deliver(message)
+        finally:
+            pubsub.close()
+
+
+class AsyncBroker(BaseBroker):
+    subscription_class = AsyncSubscription
+
+    async def run(self, stop_event):
+        while not stop_event.is_set():
+            try:
+                await self._listen(stop_event)
+            except redis.RedisError as e:
+                logging.error(f"Stream broker lost its Redis connection. Error: {e}")
+                await asyncio.sleep(1)
+
+    async def _listen(self, stop_event):
+        pubsub = aioredis.Redis(connection_pool=self.cache_pool).pubsub(ignore_subscribe_messages=True)
+        
+        if channels := self.watched_channels():
+            await pubsub.subscribe(*channels)
+            
+        try:
+            while not stop_event.is_set():
+                for name, watched in self.pending_changes():
+                    if watched:
+                        await pubsub.subscribe(name)
+                    else:
+                        await pubsub.unsubscribe(name)
+                        
+                # Reading needs a connection, which only exists after the first subscribe.
+                if not pubsub.subscribed:
+                    await asyncio.sleep(POLL_INTERVAL)
+                    continue
+                
+                message = await pubsub.get_message(timeout=POLL_INTERVAL)
+                
+                if message is not None:
+                    self.deliver(message)
+        finally:
+            await pubsub.aclose()
+
+
+class AsyncAlertBroker(AsyncBroker):
+    subscription_class = AsyncQueueSubscription
+    channel_prefix = ALERT_CHANNEL_PREFIX
@@ -0,0 +1,146 @@
+from uuid import uuid4
+import threading
+import logging
+import redis
+import json
+import time
+
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# How long a lost refresher keeps the others out, and how long a request with
+# nothing to serve waits for another process's refresh before computing itself.
+LOCK_TTL_MS = 30000
+WAIT_FOR_REFRESH = 5
+
+
+class SWRCache:
+    # A computed value cached in-process and in Redis. Fresh for `ttl` seconds, then
+    # served stale for up to `stale_ttl` more while a background refresh runs. The
+    # Redis lock means one process recomputes and the rest read its result.
+
+    def __init__(self, name, compute, cache_pool, ttl, stale_ttl):
+        self.key = f"swr:{name}"
+        self.lock_key = f"swr:{name}:refreshing"
+        self.compute = compute
+        self.cache_pool = cache_pool
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        
+        self._entry = None
+        self._refreshing = threading.Lock()
+
+    def age(self, entry):
+        return time.time() - entry["computed_at"]
+
+    def _load(self):
+        # Another process may have refreshed since this one last looked.
+        try:
+            raw = redis.Redis(connection_pool=self.cache_pool).get(self.key)
+        except redis.RedisError as e:
+            logging.error(f"Couldn't read {self.key} from Redis. Error: {e}")
+            return self._entry
+        
+        if raw is not None:
+            entry = json.loads(raw)
+            
+            if self._entry is None or entry["computed_at"] > self._entry["computed_at"]:
+                self._entry = entry
+                
+        return self._entry
+
+    def get(self):
+        entry = self._entry
+        
+        if entry is None or self.age(entry) > self.ttl:
+            entry = self._load()
+            
+        if entry is not None and self.age(entry) <= self.ttl:
+            return entry
+        
+        if entry is not None and self.age(entry) <= self.ttl + self.stale_ttl:
+            # One background refresh at a time, however many stale reads arrive meanwhile.
+            if not self._refreshing.locked():
+                threading.Thread(target=self._refresh_in_background, daemon=True).start()
+                
+            return entry
+        
+        # Nothing servable: wait for whoever is refreshing, or compute it here.
+        deadline = time.monotonic() + WAIT_FOR_REFRESH
+        
+        while time.monotonic() < deadline:
+            entry = self.refresh()
+            
+            if entry is not None:
+                return entry
+            
+            time.sleep(0.1)
+            entry = self._load()
+            
+            if entry is not None and self.age(entry) <= self.ttl + self.stale_ttl:
+                return entry
+            
+        return self.refresh(force=True)
+
+    def refresh(self, force=False):
+        # Returns the new entry, or None if another thread or process is already refreshing.
+        if not self._refreshing.acquire(blocking=False):
+            return None
+        
+        cache_conn = redis.Redis(connection_pool=self.cache_pool)
+        token = str(uuid4())
+        
+        try:
+            try:
+                locked = cache_conn.set(self.lock_key, token, nx=True, px=LOCK_TTL_MS)
+            except redis.RedisError:
+                # Without Redis every process just keeps its own copy fresh.
+                locked = True
+                
+            if not locked and not force:
+                return None
+            
+            try:
+                entry = {"value": self.compute(), "computed_at": time.time()}
+                self._entry = entry
+                
+                try:
+                    cache_conn.set(self.key, json.dumps(entry), ex=int(self.ttl + self.stale_ttl))
+                except redis.RedisError as e:
+                    logging.error(f"Couldn't store {self.key} in Redis. Error: {e}")
+                    
+                return entry
+            finally:
+                # Released even when compute() fails, so other processes can retry at once.
+                try:
+                    cache_conn.eval(RELEASE_SCRIPT, 1, self.lock_key, token)
+                except redis.RedisError as e:
+                    logging.error(f"Couldn't release {self.lock_key}. Error: {e}")
+        finally:
+            self._refreshing.release()
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logging.error(f"Couldn't refresh {self.key}. Error: {e}")
+
+    def run_refresher(self, stop_event):
+        # Keeps the value fresh ahead of requests; with several processes running
+        # this, the lock makes it one recomputation per interval overall.
+        interval = self.ttl / 2
+        
+        while not stop_event.wait(interval):
+            entry = self._load()
+            
+            if entry is not None and self.age(entry) < interval:
+                continue
+            
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.error(f"Couldn't refresh {self.key}. Error: {e}")
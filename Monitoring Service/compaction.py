@@ -0,0 +1,278 @@
+from psycopg2 import sql
+from dotenv import load_dotenv
+from datetime import datetime, timedelta, timezone
+import partitions
+import rollups
+import threading
+import argparse
+import logging
+import psycopg2
+import signal
+import gzip
+import csv
+import os
+
+load_dotenv()
+
+logging.basicConfig(filename="compaction.log", level=logging.ERROR,
+                    filemode="a", format="%(asctime)s : %(levelname)s : %(message)s")
+
+# Raw logs older than this are folded into the hourly rollups and removed.
+COMPACT_AFTER_DAYS = int(os.getenv("COMPACT_AFTER_DAYS", 7))
+# When set, removed rows are first written there as gzipped CSV, one file per batch.
+ARCHIVE_DIR = os.getenv("COMPACTION_ARCHIVE_DIR")
+BATCH_SIZE = int(os.getenv("COMPACTION_BATCH_SIZE", 5000))
+# Pause between batches so compaction never competes with ingest for long.
+BATCH_PAUSE = float(os.getenv("COMPACTION_BATCH_PAUSE", 0.2))
+# Detaching a partition needs a brief exclusive lock on api_logs; rather than
+# queueing ingest behind it, give up and retry on the next run.
+LOCK_TIMEOUT = os.getenv("COMPACTION_LOCK_TIMEOUT", "2s")
+INTERVAL = int(os.getenv("COMPACTION_INTERVAL", 3600))
+
+COMPACTION_LOCK_ID = 7310044
+
+COLUMNS = ("id", "user_id", "method", "endpoint", "path", "status_code", "ts", "resp_time", "client_ip", "sample_weight")
+
+
+def db_connection():
+    return psycopg2.connect(dbname=os.getenv("DB_NAME"),
+                            user=os.getenv("DB_USER"),
+                            password=os.getenv("DB_PASSWORD"),
+                            host=os.getenv("DB_HOST"),
+                            port=os.getenv("DB_PORT"))
+
+
+def load_state(cursor, source, day):
+    cursor.execute("INSERT INTO api_logs_compactions(source, day) VALUES (%s, %s) ON CONFLICT DO NOTHING",
+                   (source, day))
+    cursor.execute("""SELECT folded, batches_archived, last_ts, last_id, completed_at
+                      FROM api_logs_compactions WHERE source = %s""", (source,))
+    
+    return dict(zip(("folded", "batches_archived", "last_ts", "last_id", "completed_at"), cursor.fetchone()))
+
+
+def save_state(cursor, source, **fields):
+    assignments = sql.SQL(", ").join(sql.SQL("{} = {}").format(sql.Identifier(name), sql.Literal(value))
+                                     for name, value in fields.items())
+    cursor.execute(sql.SQL("UPDATE api_logs_compactions SET {}, updated_at = now() WHERE source = %s")
+                   .format(assignments), (source,))
+
+
+def fold_day(conn, day):
+    # Logs ingested since the rollups existed are already in them; older history
+    # (e.g. migrated from api_logs_legacy) is rolled up here before it's removed.
+    start, end = partitions.day_bounds(day)
+    
+    return rollups.fill_missing(conn, start, end)
+
+
+def archive_batch(source, batch_number, rows):
+    directory = os.path.join(ARCHIVE_DIR, source)
+    os.makedirs(directory, exist_ok=True)
+    
+    # Named by batch number, so a batch redone after a crash overwrites its file.
+    with gzip.open(os.path.join(directory, f"{batch_number:06d}.csv.gz"), "wt", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(COLUMNS)
+        writer.writerows(rows)
+
+
+def drain(conn, source, table, end, state, delete, stop_event):
+    # Walks rows older than `end` in (ts, id) order, archiving each batch and, for the
+    # default partition, deleting it. Progress is committed per batch.
+    cursor = conn.cursor()
+    query = sql.SQL("""
+        SELECT {columns} FROM {table}
+        WHERE ts < %s AND (ts, id) > (COALESCE(%s, '-infinity'::timestamptz), COALESCE(%s, 0))
+        ORDER BY ts, id
+        LIMIT %s
+    """).format(columns=sql.SQL(", ").join(map(sql.Identifier, COLUMNS)), table=sql.Identifier(table))
+    
+    last_ts, last_id, batch_number = state["last_ts"], state["last_id"], state["batches_archived"]
+    removed = 0
+    
+    while not stop_event.is_set():
+        cursor.execute(query, (end, last_ts, last_id, BATCH_SIZE))
+        rows = cursor.fetchall()
+        
+        if not rows:
+            conn.commit()
+            return removed, True
+        
+        if ARCHIVE_DIR:
+            archive_batch(source, batch_number, rows)
+            
+        deleted = 0
+        
+        if delete:
+            cursor.execute(sql.SQL("DELETE FROM {} WHERE id = ANY(%s) AND ts >= %s AND ts <= %s")
+                           .format(sql.Identifier(table)), ([row[0] for row in rows], rows[0][6], rows[-1][6]))
+            deleted = cursor.rowcount
+            removed += deleted
+            
+        batch_number += 1
+        last_ts, last_id = rows[-1][6], rows[-1][0]
+        
+        cursor.execute("""UPDATE api_logs_compactions
+                          SET rows_archived = rows_archived + %s, batches_archived = %s, last_ts = %s, last_id = %s,
+                              rows_removed = rows_removed + %s, updated_at = now()
+                          WHERE source = %s""",
+                       (len(rows), batch_number, last_ts, last_id, deleted, source))
+        conn.commit()
+        
+        print(f"{source}: batch {batch_number}, {len(rows)} rows up to {last_ts}")
+        stop_event.wait(BATCH_PAUSE)
+        
+    return removed, False
+
+
+def relation_size(cursor, table):
+    cursor.execute("SELECT pg_total_relation_size(%s)", (table,))
+    
+    return cursor.fetchone()[0]
+
+
+def compact_partition(conn, name, day, stop_event):
+    cursor = conn.cursor()
+    state = load_state(cursor, name, day)
+    conn.commit()
+    
+    if not state["folded"]:
+        fold_day(conn, day)
+        save_state(cursor, name, folded=True)
+        conn.commit()
+        
+    # Archiving reads the partition; without an archive it's simply dropped.
+    if ARCHIVE_DIR:
+        _, finished = drain(conn, name, name, partitions.day_bounds(day)[1], state, False, stop_event)
+        
+        if not finished:
+            return 0
+        
+    size = relation_size(cursor, name)
+    cursor.execute(sql.SQL("SELECT COUNT(*) FROM {}").format(sql.Identifier(name)))
+    rows = cursor.fetchone()[0]
+    
+    try:
+        cursor.execute("SET LOCAL lock_timeout = %s", (LOCK_TIMEOUT,))
+        cursor.execute(sql.SQL("ALTER TABLE api_logs DETACH PARTITION {}").format(sql.Identifier(name)))
+        cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+        save_state(cursor, name, rows_removed=rows, bytes_reclaimed=size, completed_at=datetime.now(timezone.utc))
+        conn.commit()
+    except psycopg2.errors.LockNotAvailable:
+        conn.rollback()
+        print(f"{name}: api_logs is busy, will retry on the next run")
+        return 0
+    
+    print(f"{name}: dropped {rows} rows, reclaimed {size / 2 ** 20:.1f} MiB")
+    
+    return size
+
+
+def compact_default(conn, cutoff, stop_event):
+    # Rows that landed in the default partition are deleted batch by batch, then
+    # VACUUM makes the space reusable.
+    cursor = conn.cursor()
+    cursor.execute(sql.SQL("SELECT MIN(ts) FROM {} WHERE ts < %s").format(sql.Identifier(partitions.DEFAULT_PARTITION)),
+                   (cutoff,))
+    oldest = cursor.fetchone()[0]
+    conn.commit()
+    
+    if oldest is None:
+        return 0
+    
+    source = partitions.DEFAULT_PARTITION
+    state = load_state(cursor, source, cutoff.date())
+    conn.commit()
+    
+    day = oldest.astimezone(timezone.utc).date()
+    
+    while day < cutoff.date():
+        fold_day(conn, day)
+        day += timedelta(days=1)
+        
+    before = relation_size(cursor, source)
+    removed, finished = drain(conn, source, source, cutoff, state, True, stop_event)
+    
+    conn.autocommit = True
+    cursor.execute(sql.SQL("VACUUM {}").format(sql.Identifier(source)))
+    conn.autocommit = False
+    
+    reclaimed = max(before - relation_size(cursor, source), 0)
+    
+    # Finished default-partition runs rewind so the next run starts from the top again,
+    # but keep batches_archived: archive files are named by it, and the earlier ones
+    # hold the only copy of the rows deleted here.
+    if finished:
+        save_state(cursor, source, last_ts=None, last_id=None, bytes_reclaimed=reclaimed)
+    else:
+        save_state(cursor, source, bytes_reclaimed=reclaimed)
+    conn.commit()
+    
+    print(f"{source}: deleted {removed} rows, reclaimed {reclaimed / 2 ** 20:.1f} MiB")
+    
+    return reclaimed
+
+
+def compact(conn, stop_event, today=None):
+    today = today or datetime.now(timezone.utc).date()
+    cutoff_day = today - timedelta(days=COMPACT_AFTER_DAYS)
+    cursor = conn.cursor()
+    
+    # Session-level, as the work spans many transactions.
+    cursor.execute("SELECT pg_try_advisory_lock(%s)", (COMPACTION_LOCK_ID,))
+    
+    if not cursor.fetchone()[0]:
+        conn.commit()
+        print("Compaction is already running elsewhere")
+        return None
+    
+    conn.commit()
+    
+    try:
+        reclaimed = 0
+        
+        for day, name in sorted(partitions.existing_partitions(cursor).items()):
+            if day >= cutoff_day or stop_event.is_set():
+                break
+            
+            reclaimed += compact_partition(conn, name, day, stop_event)
+            
+        if not stop_event.is_set():
+            reclaimed += compact_default(conn, partitions.day_bounds(cutoff_day)[0], stop_event)
+            
+        print(f"Reclaimed {reclaimed / 2 ** 20:.1f} MiB in total")
+        
+        return reclaimed
+    finally:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (COMPACTION_LOCK_ID,))
+        conn.commit()
+
+
+def run(stop_event, once=False):
+    while not stop_event.is_set():
+        conn = None
+        
+        try:
+            conn = db_connection()
+            compact(conn, stop_event)
+        except (psycopg2.Error, OSError) as e:
+            logging.error(f"Compaction run failed. Error: {e}")
+        finally:
+            if conn is not None:
+                conn.close()
+                
+        if once or stop_event.wait(INTERVAL):
+            break
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fold old api_logs into rollups and remove the raw rows")
+    parser.add_argument("--once", action="store_true", help="Run a single pass instead of every COMPACTION_INTERVAL")
+    args = parser.parse_args()
+    
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+    
+    run(stop_event, once=args.once)
@@ -0,0 +1,134 @@
+from psycopg2.extras import execute_values
+from ingest import count_requests
+from uuid import uuid4
+import psycopg2
+import redis
+import logging
+import os
+
+# Per-user request counters are incremented in Redis on ingest and folded into
+# request_count by a periodic flush, so ingest never waits on the hot row lock.
+PENDING_KEY = "request_count:pending"
+FLUSHING_KEY = "request_count:flushing"
+FIELDS = ("total_req", "success_resp", "error_resp")
+
+FLUSH_INTERVAL = float(os.getenv("REQUEST_COUNT_FLUSH_INTERVAL", 5))
+
+# Hands the accumulated deltas to a flusher under a flush id. A snapshot left by
+# a flusher that died is handed out again before any new deltas are taken.
+CLAIM_SCRIPT = """
+if redis.call('exists', KEYS[2]) == 0 then
+    if redis.call('exists', KEYS[1]) == 0 then
+        return {}
+    end
+    redis.call('rename', KEYS[1], KEYS[2])
+    redis.call('hset', KEYS[2], 'flush_id', ARGV[1])
+end
+return redis.call('hgetall', KEYS[2])
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('hget', KEYS[1], 'flush_id') == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+UPSERT_REQUEST_COUNT_QUERY = """
+    INSERT INTO request_count(user_id, total_req, success_resp, error_resp)
+    VALUES %s
+    ON CONFLICT (user_id) DO UPDATE 
+    SET total_req = request_count.total_req + EXCLUDED.total_req,
+        success_resp = request_count.success_resp + EXCLUDED.success_resp,
+        error_resp = request_count.error_resp + EXCLUDED.error_resp
+"""
+
+
+def record(cache_conn, rows):
+    pipe = cache_conn.pipeline(transaction=False)
+    
+    for user_id, *counts in count_requests(rows):
+        for field, count in zip(FIELDS, counts):
+            if count:
+                pipe.hincrby(PENDING_KEY, f"{user_id}:{field}", count)
+                
+    pipe.execute()
+
+
+def apply(cursor, rows):
+    # For callers that can afford the row locks (the batched log worker): updates
+    # request_count in the caller's transaction, so the counts commit or roll back
+    # with the logs they were taken from.
+    counts = count_requests(rows)
+    
+    if counts:
+        execute_values(cursor, UPSERT_REQUEST_COUNT_QUERY, counts, page_size=len(counts))
+
+
+def live_counts(cache_conn, user_id):
+    fields = [f"{user_id}:{field}" for field in FIELDS]
+    
+    pipe = cache_conn.pipeline(transaction=False)
+    pipe.hmget(PENDING_KEY, fields)
+    pipe.hmget(FLUSHING_KEY, fields)
+    pending, flushing = pipe.execute()
+    
+    # A flushed snapshot is counted twice for the moment between its commit and
+    # its key being released.
+    return {field: int(pending[index] or 0) + int(flushing[index] or 0) for index, field in enumerate(FIELDS)}
+
+
+def flush(conn, cache_conn):
+    flush_id = str(uuid4())
+    snapshot = cache_conn.eval(CLAIM_SCRIPT, 2, PENDING_KEY, FLUSHING_KEY, flush_id)
+    
+    if not snapshot:
+        return 0
+    
+    snapshot = dict(zip(snapshot[::2], snapshot[1::2]))
+    flush_id = snapshot.pop(b"flush_id").decode()
+    
+    counts = {}
+    
+    for field, value in snapshot.items():
+        user_id, name = field.decode().rsplit(":", 1)
+        counts.setdefault(user_id, dict.fromkeys(FIELDS, 0))[name] = int(value)
+        
+    rows = [(user_id, *(counts[user_id][field] for field in FIELDS)) for user_id in sorted(counts)]
+    
+    cursor = conn.cursor()
+    
+    try:
+        # The marker makes the flush idempotent: if another flusher (or an earlier
+        # attempt of this one) already applied this snapshot, nothing is added.
+        cursor.execute("INSERT INTO request_count_flushes(flush_id) VALUES (%s) ON CONFLICT DO NOTHING", (flush_id,))
+        
+        if cursor.rowcount:
+            execute_values(cursor, UPSERT_REQUEST_COUNT_QUERY, rows, page_size=len(rows))
+            
+        conn.commit()
+    except psycopg2.Error:
+        conn.rollback()
+        raise
+    
+    cache_conn.eval(RELEASE_SCRIPT, 1, FLUSHING_KEY, flush_id)
+    
+    return len(rows)
+
+
+def run_flusher(pool, cache_pool, stop_event):
+    cache_conn = redis.Redis(connection_pool=cache_pool)
+    
+    while not stop_event.wait(FLUSH_INTERVAL):
+        try:
+            conn = pool.getconn()
+        except psycopg2.Error as e:
+            logging.error(f"Couldn't get a connection to flush request counters. Error: {e}")
+            continue
+        
+        try:
+            flush(conn, cache_conn)
+        except (psycopg2.Error, redis.RedisError) as e:
+            logging.error(f"Couldn't flush request counters. Error: {e}")
+        finally:
+            pool.putconn(conn)
@@ -0,0 +1,64 @@
+import json
+import os
+
+CACHE_PREFIX = "dashboard:"
+CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", 5))
+LOG_LIMIT = int(os.getenv("DASHBOARD_LOG_LIMIT", 7))
+
+# Recent logs and persisted counts in one round trip. The counts are repeated on each
+# log row, and a user with no logs still gets a single row (with NULL log columns).
+DASHBOARD_QUERY = """
+    WITH recent AS (
+        SELECT id, method, endpoint, path, status_code, ts, resp_time, client_ip FROM api_logs
+        WHERE user_id = $1
+        ORDER BY ts DESC, id DESC
+        LIMIT $2::int
+    ), counts AS (
+        SELECT total_req, success_resp, error_resp FROM request_count WHERE user_id = $1
+    )
+    SELECT counts.total_req, counts.success_resp, counts.error_resp,
+           recent.method, recent.endpoint, recent.path, recent.status_code, recent.ts, recent.resp_time
+    FROM (SELECT 1) AS one
+    LEFT JOIN counts ON TRUE
+    LEFT JOIN recent ON TRUE
+    ORDER BY recent.ts DESC, recent.id DESC
+"""
+
+
+def format_log(row):
+    # In the server's local time, like /api/logs, but ISO dates and whole-second times.
+    ts = row[7].astimezone()
+    
+    return {"method": row[3],
+            "endpoint": row[4],
+            "path": row[5],
+            "status_code": row[6],
+            "date": ts.date().isoformat(),
+            "time": ts.strftime("%H:%M:%S"),
+            "resp_time": round(row[8], 4) if row[8] is not None else None}
+
+
+def summary(cursor, user_id, live, analysis):
+    # live: counts still waiting in Redis to be flushed (counters.live_counts);
+    # analysis: the global /api/analysis body.
+    cursor.execute("EXECUTE select_dashboard (%s, %s)", (user_id, LOG_LIMIT))
+    rows = cursor.fetchall()
+    
+    persisted = rows[0][:3] if rows[0][0] is not None else (0, 0, 0)
+    
+    return {"user_id": user_id,
+            "request_count": {"total_req": persisted[0] + live["total_req"],
+                              "success_resp": persisted[1] + live["success_resp"],
+                              "error_resp": persisted[2] + live["error_resp"]},
+            "api_logs": [format_log(row) for row in rows if row[7] is not None],
+            "api_analysis": analysis}
+
+
+def cached(cache_conn, user_id):
+    payload = cache_conn.get(f"{CACHE_PREFIX}{user_id}")
+    
+    return json.loads(payload) if payload is not None else None
+
+
+def store(cache_conn, user_id, body):
+    cache_conn.set(f"{CACHE_PREFIX}{user_id}", json.dumps(body), px=int(CACHE_TTL * 1000))
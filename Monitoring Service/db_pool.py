@@ -0,0 +1,126 @@
+from psycopg2.pool import PoolError
+import psycopg2
+import psycopg2.extensions
+import threading
+import queue
+import time
+
+
+class PoolTimeout(PoolError):
+    pass
+
+
+class ConnectionPool:
+    # A thread-safe stand-in for psycopg2's SimpleConnectionPool. Connections open
+    # lazily up to maxconn and callers wait up to acquire_timeout for a free one.
+    # Each new connection gets statement_timeout and has `prepared` ({name: sql})
+    # prepared, so hot queries run as EXECUTE name (...). Connections idle longer
+    # than health_check_interval are pinged before they're handed out.
+
+    def __init__(self, maxconn, acquire_timeout, statement_timeout, health_check_interval, prepared, **conn_kwargs):
+        self.maxconn = maxconn
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self.prepared = prepared
+        self.conn_kwargs = dict(conn_kwargs, options=f"-c statement_timeout={statement_timeout}")
+        
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        
+        self.in_use = 0
+        self.acquires = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.conn_kwargs)
+        cursor = conn.cursor()
+        
+        for name, query in self.prepared.items():
+            cursor.execute(f"PREPARE {name} AS {query}")
+            
+        conn.commit()
+        cursor.close()
+        
+        return conn
+
+    def _is_healthy(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        started = time.perf_counter()
+        
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout(f"No database connection became free within {self.acquire_timeout}s")
+        
+        waited = time.perf_counter() - started
+        
+        try:
+            conn, last_used = self._idle.get_nowait()
+        except queue.Empty:
+            conn, last_used = None, None
+        
+        try:
+            if conn is not None and (conn.closed or (time.monotonic() - last_used > self.health_check_interval
+                                                     and not self._is_healthy(conn))):
+                conn.close()
+                conn = None
+                
+            if conn is None:
+                conn = self._connect()
+        except psycopg2.Error:
+            self._slots.release()
+            raise
+        
+        with self._lock:
+            self.in_use += 1
+            self.acquires += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            
+        return conn
+
+    def putconn(self, conn):
+        try:
+            if not conn.closed and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            conn.close()
+            
+        if not conn.closed:
+            self._idle.put((conn, time.monotonic()))
+            
+        with self._lock:
+            self.in_use -= 1
+            
+        self._slots.release()
+
+    def closeall(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            return {"max": self.maxconn,
+                    "in_use": self.in_use,
+                    "idle": self._idle.qsize(),
+                    "utilization": round(self.in_use / self.maxconn, 3),
+                    "acquires": self.acquires,
+                    "timeouts": self.timeouts,
+                    "wait_seconds": round(self.wait_seconds, 6),
+                    "max_wait_seconds": round(self.max_wait_seconds, 6)}
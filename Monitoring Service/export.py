@@ -0,0 +1,120 @@
+from datetime import timezone
+import threading
+import json
+import csv
+import io
+import os
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 5000))
+# Each running export holds a pooled connection for its whole duration.
+MAX_CONCURRENT = int(os.getenv("EXPORT_MAX_CONCURRENT", 2))
+
+COLUMNS = ("ts", "method", "endpoint", "path", "status_code", "resp_time", "client_ip", "sample_weight")
+
+EXPORT_QUERY = """
+    SELECT ts, method, endpoint, path, status_code, resp_time, client_ip, sample_weight FROM api_logs
+    WHERE user_id = %s AND ts >= COALESCE(%s::timestamptz, '-infinity') AND ts < COALESCE(%s::timestamptz, 'infinity')
+    ORDER BY ts, id
+"""
+
+FORMATS = {"csv": ("text/csv", "csv"),
+           "ndjson": ("application/x-ndjson", "ndjson"),
+           "parquet": ("application/vnd.apache.parquet", "parquet")}
+
+slots = threading.BoundedSemaphore(MAX_CONCURRENT)
+
+
+def iter_chunks(conn, user_id, start, end):
+    # A named cursor keeps the result set on the server; only CHUNK_SIZE rows are
+    # in memory at a time.
+    cursor = conn.cursor(name="api_logs_export")
+    cursor.itersize = CHUNK_SIZE
+    cursor.execute(EXPORT_QUERY, (user_id, start, end))
+    
+    try:
+        while rows := cursor.fetchmany(CHUNK_SIZE):
+            yield rows
+    finally:
+        cursor.close()
+
+
+def csv_chunks(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    
+    for rows in chunks:
+        writer.writerows((row[0].astimezone(timezone.utc).isoformat(), *row[1:]) for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(chunks):
+    for rows in chunks:
+        yield "".join(json.dumps(dict(zip(COLUMNS, (row[0].astimezone(timezone.utc).isoformat(), *row[1:]))))
+                      + "\n" for row in rows)
+
+
+class ChunkSink:
+    # Write-only file for ParquetWriter whose contents are handed out and cleared
+    # after every row group.
+    def __init__(self):
+        self.buffer = io.BytesIO()
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.buffer.write(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = self.buffer.getvalue()
+        self.buffer = io.BytesIO()
+        return data
+
+
+def parquet_chunks(chunks):
+    # One row group per chunk, so memory is bounded by CHUNK_SIZE rows regardless of export size.
+    schema = pyarrow.schema([("ts", pyarrow.timestamp("us", tz="UTC")),
+                             ("method", pyarrow.string()),
+                             ("endpoint", pyarrow.string()),
+                             ("path", pyarrow.string()),
+                             ("status_code", pyarrow.int32()),
+                             ("resp_time", pyarrow.float64()),
+                             ("client_ip", pyarrow.string()),
+                             ("sample_weight", pyarrow.float32())])
+    sink = ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression="zstd")
+    
+    for rows in chunks:
+        columns = list(zip(*rows))
+        writer.write_table(pyarrow.Table.from_arrays([pyarrow.array(column, type=field.type)
+                                                      for column, field in zip(columns, schema)], schema=schema))
+        yield sink.drain()
+        
+    writer.close()
+    yield sink.drain()
+
+
+def render(fmt, chunks):
+    return {"csv": csv_chunks, "ndjson": ndjson_chunks, "parquet": parquet_chunks}[fmt](chunks)
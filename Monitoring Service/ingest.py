@@ -0,0 +1,76 @@
+from psycopg2.extras import execute_values
+from datetime import datetime, timezone
+import rollups
+import sampling
+
+INSERT_LOGS_QUERY = """
+    INSERT INTO api_logs(user_id, method, endpoint, path, status_code, ts, resp_time, client_ip, sample_weight)
+    VALUES %s
+"""
+
+
+def parse_log(log):
+    req = log['request']
+    resp = log['response']
+    
+    # Failed requests are logged without a response time.
+    resp_time = resp.get('response_time')
+    
+    return (log['user_id'],
+            req['method'],
+            req['endpoint'],
+            req['path'],
+            resp['status_code'],
+            datetime.fromtimestamp(req['time'], tz=timezone.utc),
+            float(resp_time) if resp_time is not None else None,
+            req['client_ip'])
+
+
+def parse_stream_entry(fields):
+    # Compact entries written by the Healthcare API's log producer.
+    fields = {key.decode(): value.decode() for key, value in fields.items()}
+    timestamp = datetime.fromtimestamp(float(fields['t']), tz=timezone.utc)
+    
+    return (fields['u'],
+            fields['m'],
+            fields['e'] or None,
+            fields['p'],
+            int(fields['s']),
+            timestamp,
+            float(fields['r']) if 'r' in fields else None,
+            fields['ip'] or None)
+
+
+def count_requests(rows):
+    counts = {}
+    
+    for row in rows:
+        user_id, status_code = row[0], row[4]
+        total, success, error = counts.get(user_id, (0, 0, 0))
+        
+        if status_code >= 200 and status_code < 400:
+            counts[user_id] = (total + 1, success + 1, error)
+        else:
+            counts[user_id] = (total + 1, success, error + 1)
+            
+    # Sorted so concurrent flushes lock request_count rows in the same order.
+    return [(user_id, *counts[user_id]) for user_id in sorted(counts)]
+
+
+def write_logs(cursor, rows, defer_rollups=False):
+    # Rollups (and request_count, which callers update from the same rows) see
+    # every log; only the raw rows stored are sampled. Batches apply their rollups
+    # here, once per bucket; callers writing one log at a time defer them, as every
+    # concurrent request would otherwise lock the same minute and hour rows.
+    if defer_rollups:
+        rollups.defer(cursor, rows)
+    else:
+        rollups.apply(cursor, rows)
+        
+    kept = sampling.policies.sample(cursor, rows)
+    
+    # page_size covers the whole batch so it's sent as exactly one statement.
+    if kept:
+        execute_values(cursor, INSERT_LOGS_QUERY, kept, page_size=len(kept))
+        
+    return len(kept)
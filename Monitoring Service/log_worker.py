@@ -0,0 +1,165 @@
+from dotenv import load_dotenv
+from ingest import parse_stream_entry, write_logs
+import counters
+import anomaly
+import broker
+import psycopg2
+import redis
+import threading
+import logging
+import signal
+import socket
+import os
+
+load_dotenv()
+
+logging.basicConfig(filename="log_worker.log", level=logging.ERROR,
+                    filemode="a", format="%(asctime)s : %(levelname)s : %(message)s")
+
+STREAM_KEY = os.getenv("LOG_STREAM_KEY", "api_logs")
+GROUP = os.getenv("LOG_STREAM_GROUP", "monitoring")
+
+BATCH_SIZE = int(os.getenv("LOG_WORKER_BATCH_SIZE", 1000))
+BLOCK_MS = int(os.getenv("LOG_WORKER_BLOCK_MS", 1000))
+# Entries a consumer read but didn't acknowledge within this time are assumed
+# to belong to a crashed worker and are claimed by the next one that polls.
+CLAIM_IDLE_MS = int(os.getenv("LOG_WORKER_CLAIM_IDLE_MS", 60000))
+
+# Returns the entries not written before; see migrations/009_log_stream_entries.sql.
+MARK_ENTRIES_QUERY = """
+    INSERT INTO log_stream_entries(entry_id) SELECT unnest(%s::text[])
+    ON CONFLICT DO NOTHING
+    RETURNING entry_id
+"""
+
+
+def redis_connection():
+    # The stream lives in the Healthcare API's Redis database (db 1).
+    return redis.Redis(host=os.getenv("REDIS_HOST"), port=os.getenv("REDIS_PORT"),
+                       db=int(os.getenv("LOG_STREAM_DB", 1)))
+
+
+def ensure_group(cache_conn):
+    try:
+        cache_conn.xgroup_create(STREAM_KEY, GROUP, id="0", mkstream=True)
+    except redis.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def stream_stats(cache_conn):
+    stats = {"length": cache_conn.xlen(STREAM_KEY), "pending": None, "lag": None}
+    
+    for group in cache_conn.xinfo_groups(STREAM_KEY):
+        if group["name"].decode() == GROUP:
+            stats["pending"] = group["pending"]
+            # Only reported by Redis 7+.
+            stats["lag"] = group.get("lag")
+            
+    return stats
+
+
+def read_batch(cache_conn, consumer):
+    _, entries, *_ = cache_conn.xautoclaim(STREAM_KEY, GROUP, consumer, min_idle_time=CLAIM_IDLE_MS,
+                                           start_id="0-0", count=BATCH_SIZE)
+    if entries:
+        return entries
+    
+    response = cache_conn.xreadgroup(GROUP, consumer, {STREAM_KEY: ">"}, count=BATCH_SIZE, block=BLOCK_MS)
+    
+    return response[0][1] if response else []
+
+
+def process_batch(conn, cache_conn, entries):
+    parsed, ids = [], []
+    
+    for entry_id, fields in entries:
+        ids.append(entry_id)
+        
+        # A malformed entry would otherwise be retried forever, so it's dropped.
+        try:
+            parsed.append((entry_id.decode(), parse_stream_entry(fields)))
+        except (KeyError, ValueError) as e:
+            logging.error(f"Dropping malformed log entry({entry_id}). Error: {e}")
+    
+    rows = []
+    
+    if parsed:
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute(MARK_ENTRIES_QUERY, ([entry_id for entry_id, _ in parsed],))
+            new_ids = {row[0] for row in cursor.fetchall()}
+            rows = [row for entry_id, row in parsed if entry_id in new_ids]
+            
+            # A batch is large enough to take the request_count row locks once, so the
+            # counts are written with the logs rather than through Redis, where they
+            # could be lost (or, on redelivery, doubled) after this commit.
+            if rows:
+                write_logs(cursor, rows)
+                counters.apply(cursor, rows)
+                
+            conn.commit()
+        except psycopg2.Error:
+            conn.rollback()
+            raise
+        
+    cache_conn.xack(STREAM_KEY, GROUP, *ids)
+    
+    # Pushes fresh totals to anyone streaming these users; the logs are already
+    # safely stored, so a failure here only delays their dashboards.
+    if rows:
+        try:
+            broker.publish_totals(conn.cursor(), cache_conn, [row[0] for row in rows])
+        except (psycopg2.Error, redis.RedisError) as e:
+            conn.rollback()
+            logging.error(f"Couldn't publish request count updates. Error: {e}")
+            
+        try:
+            anomaly.detect(conn.cursor(), cache_conn, rows)
+        except (psycopg2.Error, redis.RedisError) as e:
+            conn.rollback()
+            logging.error(f"Couldn't run anomaly detection. Error: {e}")
+
+
+def db_connection():
+    return psycopg2.connect(dbname=os.getenv("DB_NAME"),
+                            user=os.getenv("DB_USER"),
+                            password=os.getenv("DB_PASSWORD"),
+                            host=os.getenv("DB_HOST"),
+                            port=os.getenv("DB_PORT"))
+
+
+def run(stop_event):
+    cache_conn = redis_connection()
+    conn = db_connection()
+    consumer = f"{socket.gethostname()}:{os.getpid()}"
+    
+    ensure_group(cache_conn)
+    
+    try:
+        while not stop_event.is_set():
+            try:
+                if conn.closed:
+                    conn = db_connection()
+                    
+                entries = read_batch(cache_conn, consumer)
+                if entries:
+                    process_batch(conn, cache_conn, entries)
+            except (redis.RedisError, psycopg2.Error) as e:
+                # Unacknowledged entries stay pending and are reclaimed later.
+                logging.error(f"Couldn't ingest log batch. Error: {e}")
+                stop_event.wait(1)
+    finally:
+        # Deleting a consumer discards its pending entries, so only an idle one is removed.
+        if not cache_conn.xpending_range(STREAM_KEY, GROUP, min="-", max="+", count=1, consumername=consumer):
+            cache_conn.xgroup_delconsumer(STREAM_KEY, GROUP, consumer)
+        conn.close()
+
+
+if __name__ == "__main__":
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+    
+    run(stop_event)
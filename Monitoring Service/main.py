@@ -1,125 +1,249 @@
-from flask import Flask, jsonify, request, abort, g, Response, stream_with_context
+from flask import Flask, jsonify, request, abort, g, Response
 from dotenv import load_dotenv
 from flask_cors import CORS
-from datetime import datetime
-import psycopg2.pool
+from ingest import parse_log, write_logs
+from db_pool import ConnectionPool, PoolTimeout
+from broker import Broker, publish_totals
+from cache import SWRCache
+from datetime import datetime, timezone
+import log_worker
+import counters
+import rollups
+import partitions
+import timeline
+import timeseries
+import sampling
+import anomaly
+import dashboard
+import export
+import metrics
+import psycopg2
+import redis
 import threading
+import logging
 import os
 import json
 
 load_dotenv()
 
 service = Flask(__name__)
-CORS(service)
+CORS(service, expose_headers=["X-Next-Cursor"])
 service.secret_key = os.getenv("SECRET_KEY")
 
-try:
-    pool = psycopg2.pool.SimpleConnectionPool(
-        minconn=1,
-        maxconn=5,
+logging.getLogger('werkzeug').disabled = True
+logging.basicConfig(filename="monitoring.log", level=logging.ERROR,
+                    filemode="a", format="%(asctime)s : %(levelname)s : %(message)s")
+
+MAX_BATCH_SIZE = int(os.getenv("MAX_LOG_BATCH_SIZE", 10000))
+HEARTBEAT_INTERVAL = float(os.getenv("STREAM_HEARTBEAT_INTERVAL", 15))
+
+# Prepared once per pooled connection, run with EXECUTE <name> (...).
+PREPARED_STATEMENTS = {
+    "select_request_count": "SELECT total_req, success_resp, error_resp FROM request_count WHERE user_id = $1",
+    "select_timeline": timeline.TIMELINE_QUERY,
+    "select_dashboard": dashboard.DASHBOARD_QUERY,
+}
+
+# Clients are created by init_clients() once per process (after fork when running
+# under a prefork server) as psycopg2 connections can't be shared across processes.
+pool = None
+cache_pool = None
+broker = None
+analysis_cache = None
+
+
+def init_clients():
+    global pool, cache_pool, broker, analysis_cache
+    
+    # Connections are opened on demand, so a database outage surfaces per request
+    # (get_conn) instead of failing the worker at boot.
+    pool = ConnectionPool(
+        maxconn=int(os.getenv("DB_POOL_SIZE", 5)),
+        acquire_timeout=float(os.getenv("DB_POOL_TIMEOUT", 5)),
+        statement_timeout=int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 5000)),
+        health_check_interval=float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", 30)),
+        prepared=PREPARED_STATEMENTS,
         dbname=os.getenv("DB_NAME"),
         user=os.getenv("DB_USER"),
         password=os.getenv("DB_PASSWORD"),
         host=os.getenv("DB_HOST"),
         port=os.getenv("DB_PORT")
         )
+        
+    # Shared with the Healthcare API, whose log producers write the stream to db 1.
+    cache_pool = redis.ConnectionPool(
+                host=os.getenv("REDIS_HOST"),
+                port=os.getenv("REDIS_PORT"),
+                db=int(os.getenv("LOG_STREAM_DB", 1)),
+                max_connections=int(os.getenv("REDIS_POOL_SIZE", 10))
+            )
+    
+    broker = Broker(cache_pool)
+    broker.start(threading.Event())
+    
+    threading.Thread(target=counters.run_flusher, daemon=True,
+                     kwargs={'pool': pool, 'cache_pool': cache_pool, 'stop_event': threading.Event()}).start()
+    threading.Thread(target=rollups.run_folder, daemon=True,
+                     kwargs={'pool': pool, 'stop_event': threading.Event()}).start()
+    threading.Thread(target=partitions.run_maintenance, daemon=True,
+                     kwargs={'pool': pool, 'stop_event': threading.Event()}).start()
+    threading.Thread(target=anomaly.run_checkpointer, daemon=True,
+                     kwargs={'pool': pool, 'cache_pool': cache_pool, 'stop_event': threading.Event()}).start()
+    
+    # The portal asks for the same global analysis on every page view, so it's
+    # recomputed in the background (by one process at a time) rather than per request.
+    analysis_cache = SWRCache("analysis", compute_analysis, cache_pool,
+                              ttl=float(os.getenv("ANALYSIS_CACHE_TTL", 30)),
+                              stale_ttl=float(os.getenv("ANALYSIS_CACHE_STALE_TTL", 300)))
+    threading.Thread(target=analysis_cache.run_refresher, daemon=True, args=(threading.Event(),)).start()
 
-except psycopg2.Error:
-    abort(500, "The server encountered an Internal Error and was unable to complete your request")
+
+def close_clients():
+    if pool is not None:
+        pool.closeall()
+        
+    if cache_pool is not None:
+        cache_pool.disconnect()
+    
     
+def compute_analysis():
+    conn = pool.getconn()
+    
+    try:
+        return rollups.analysis(conn.cursor())
+    finally:
+        pool.putconn(conn)
+
+
+def get_conn():
+    # Checked out on first use so routes that never touch Postgres (/metrics, streams)
+    # don't hold a connection for the whole request.
+    if "conn" not in g:
+        try:
+            g.conn = pool.getconn()
+        except PoolTimeout:
+            abort(503, "The server is busy, please retry shortly")
+        except psycopg2.Error:
+            abort(500, "The server encountered an Internal Error and was unable to complete your request")
+            
+    return g.conn
     
-@service.before_request
-def before_request():
-    g.conn = pool.getconn()
+
+def release_conn():
+    conn = g.pop("conn", None)
     
+    if conn is not None:
+        pool.putconn(conn)
+
 
 @service.teardown_request
 def teardown_request(exception=None):
-    if hasattr(g, "conn"):
-        pool.putconn(g.conn)
+    release_conn()
  
         
-log_event = threading.Event()
+def publish_updates(rows):
+    cache_conn = redis.Redis(connection_pool=cache_pool)
+    
+    try:
+        counters.record(cache_conn, rows)
+    except redis.RedisError as e:
+        logging.error(f"Couldn't record request counters. Error: {e}")
+        return
+    
+    try:
+        publish_totals(g.conn.cursor(), cache_conn, [row[0] for row in rows])
+    except (psycopg2.Error, redis.RedisError) as e:
+        g.conn.rollback()
+        logging.error(f"Couldn't publish request count updates. Error: {e}")
+        
+    try:
+        anomaly.detect(g.conn.cursor(), cache_conn, rows)
+    except (psycopg2.Error, redis.RedisError) as e:
+        g.conn.rollback()
+        logging.error(f"Couldn't run anomaly detection. Error: {e}")
 
 
 def get_req_count(user_id):
-    query = "SELECT total_req, success_resp, error_resp FROM request_count WHERE user_id = %s"
+    cursor = get_conn().cursor()
     
-    cursor = g.conn.cursor()
+    cursor.execute("EXECUTE select_request_count (%s)", (user_id,))
     
-    cursor.execute(query, (user_id,))
+    result = cursor.fetchone() or (0, 0, 0)
     
-    result = cursor.fetchone()
+    # Increments since the last flush are still in Redis.
+    live = counters.live_counts(redis.Redis(connection_pool=cache_pool), user_id)
     
-    return {'total_req': result[0],
-            'success_resp': result[1],
-            'error_resp': result[2]}
+    return {'total_req': result[0] + live['total_req'],
+            'success_resp': result[1] + live['success_resp'],
+            'error_resp': result[2] + live['error_resp']}
     
 
 @service.route("/api/logs", methods=["POST"])
 def add_api_logs():
-    user_id = request.json['user_id']
-    req = request.json['request']
-    resp = request.json['response']
-    
-    date = datetime.strptime(req['date'], "%Y-%m-%d")
-    time = datetime.fromtimestamp(req['time']).time()
-    
-    query = """
-        INSERT INTO api_logs(user_id, method, endpoint, path, status_code, date, time, resp_time, client_ip)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """
-    params = (user_id,
-              req['method'],
-              req['endpoint'],
-              req['path'],
-              resp['status_code'],
-              date,
-              time,
-              resp['response_time'],
-              req['client_ip'])
-    
-    query_additional = """
-        INSERT INTO request_count(user_id, total_req, success_resp, error_resp)
-        VALUES (%s, 1, %s, %s)
-        ON CONFLICT (user_id) DO UPDATE 
-        SET total_req = request_count.total_req + 1,
-            success_resp = request_count.success_resp + EXCLUDED.success_resp,
-            error_resp = request_count.error_resp + EXCLUDED.error_resp
-    """
-    
-    if resp['status_code'] >= 200 and resp['status_code'] < 400:
-        success_increment = 1
-        failure_increment = 0
-    else:
-        success_increment = 0
-        failure_increment = 1
-        
-    params_additional = (user_id, success_increment, failure_increment)
-    
-    cursor = g.conn.cursor()
-    
-    try:
-        cursor.execute(query, params)
-        cursor.execute(query_additional, params_additional)
+    try:
+        rows = [parse_log(request.json)]
+    except (KeyError, TypeError, ValueError) as e:
+        abort(400, f"Invalid Request. Error: {e}")
+    
+    cursor = get_conn().cursor()
+    
+    # Same path as a batch, so the two can't drift apart, except that the rollups
+    # are left to rollups.run_folder.
+    try:
+        write_logs(cursor, rows, defer_rollups=True)
         g.conn.commit()
     except psycopg2.errors.Error:
         g.conn.rollback()
         abort(500, "The server encountered an Internal Error and was unable to complete your request")
-        
-    log_event.set()
+    
+    publish_updates(rows)
     
     return jsonify({"message": "Log added Successfully"}), 200
+
+
+@service.route("/api/logs/batch", methods=["POST"])
+def add_api_logs_batch():
+    logs = request.json
     
+    if not isinstance(logs, list) or not logs:
+        abort(400, "Expected a non-empty array of logs")
+        
+    if len(logs) > MAX_BATCH_SIZE:
+        abort(413, f"A batch can't contain more than {MAX_BATCH_SIZE} logs")
     
-@service.route("/api/logs/<user_id>", methods=["GET"])
-def get_api_logs(user_id):    
-    query = "SELECT method, path, status_code, date, time, resp_time, client_ip FROM api_logs WHERE user_id = %s ORDER BY date DESC, time DESC LIMIT 7"
+    try:
+        rows = [parse_log(log) for log in logs]
+    except (KeyError, TypeError, ValueError) as e:
+        abort(400, f"Invalid Request. Error: {e}")
     
-    cursor = g.conn.cursor()
+    cursor = get_conn().cursor()
     
+    # One multi-row INSERT and one request_count upsert per user, in a single transaction.
     try:
-        cursor.execute(query, (user_id,))
+        write_logs(cursor, rows)
+        g.conn.commit()
+    except psycopg2.errors.Error:
+        g.conn.rollback()
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+    
+    publish_updates(rows)
+    
+    return jsonify({"message": "Logs added Successfully", "count": len(rows)}), 200
+    
+    
+@service.route("/api/logs/<user_id>", methods=["GET"])
+def get_api_logs(user_id):
+    # Newest first. Optional from/to (ISO 8601), status (404 or 4xx), endpoint, limit and
+    # cursor; the cursor for the next page comes back in the X-Next-Cursor header.
+    try:
+        params, limit = timeline.query_params(user_id, request.args)
+    except ValueError as e:
+        abort(400, f"Invalid Request. Error: {e}")
+        
+    cursor = get_conn().cursor()
+    
+    try:
+        cursor.execute("EXECUTE select_timeline (%s, %s, %s, %s, %s, %s, %s, %s, %s)", params)
         rows = cursor.fetchall()
     except psycopg2.errors.Error:
         g.conn.rollback()
@@ -130,15 +254,72 @@ def get_api_logs(user_id):
     if not rows:
         return "Record Not Found!", 404
     
-    data = [{"method": row[0],
-             "path": row[1],
-             "status_code": row[2],
-             "date": row[3],
-             "time": str(row[4]),
-             "resp_time": row[5],
-             "client_ip": row[6]} for row in rows]
+    rows, next_cursor = timeline.paginate(rows, limit)
+    
+    # date/time are still reported separately, in the server's local time as before.
+    data = [{"method": row[1],
+             "endpoint": row[2],
+             "path": row[3],
+             "status_code": row[4],
+             "date": row[5].astimezone().date(),
+             "time": str(row[5].astimezone().time()),
+             "resp_time": row[6],
+             "client_ip": row[7]} for row in rows]
+    
+    response = jsonify(data)
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    
+    return response, 200
+
+
+@service.route("/api/logs/<user_id>/export", methods=["GET"])
+def export_api_logs(user_id):
+    # Every stored log for the user in [from, to) (both optional, ISO 8601), oldest
+    # first, as csv (default), ndjson or parquet. Sampled rows carry sample_weight.
+    fmt = request.args.get("format", "csv")
+    
+    if fmt not in export.FORMATS:
+        abort(400, f"format must be one of {', '.join(export.FORMATS)}")
+        
+    if fmt == "parquet" and export.pyarrow is None:
+        abort(501, "Parquet export needs pyarrow installed on the server")
+        
+    try:
+        start = timeline.parse_time(request.args["from"]) if request.args.get("from") else None
+        end = timeline.parse_time(request.args["to"]) if request.args.get("to") else None
+    except ValueError as e:
+        abort(400, f"Invalid Request. Error: {e}")
+        
+    if not export.slots.acquire(blocking=False):
+        abort(429, "Too many exports running, please retry shortly")
+        
+    try:
+        conn = pool.getconn()
+    except PoolTimeout:
+        export.slots.release()
+        abort(503, "The server is busy, please retry shortly")
+    except psycopg2.Error:
+        export.slots.release()
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+        
+    # The generator outlives the request context, so it owns the connection and
+    # gives it back (with the slot) when the export finishes or the client goes away.
+    def generate():
+        try:
+            yield from export.render(fmt, export.iter_chunks(conn, user_id, start, end))
+        except psycopg2.Error as e:
+            logging.error(f"Export for {user_id} failed part way. Error: {e}")
+        finally:
+            pool.putconn(conn)
+            export.slots.release()
+            
+    mimetype, extension = export.FORMATS[fmt]
+    filename = f"api_logs_{user_id}.{extension}"
     
-    return jsonify(data), 200
+    return Response(generate(), mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename={filename}"})
 
 
 @service.route("/api/requestCount/<user_id>", methods=["GET"])
@@ -148,50 +329,279 @@ def get_request_count(user_id):
     return result, 200
 
 
+@service.route("/api/sampling/<user_id>", methods=["GET"])
+def get_sampling_policy(user_id):
+    rate, slow_threshold = sampling.policies.policy(user_id)
+    
+    return {"user_id": user_id, "rate": rate, "slow_threshold": slow_threshold}, 200
+
+
+@service.route("/api/sampling/<user_id>", methods=["PUT"])
+def set_sampling_policy(user_id):
+    # Picked up by every ingest process within LOG_SAMPLING_REFRESH_INTERVAL.
+    data = request.json or {}
+    
+    try:
+        rate = float(data["rate"])
+        slow_threshold = float(data["slow_threshold"]) if data.get("slow_threshold") is not None else None
+    except (KeyError, TypeError, ValueError) as e:
+        abort(400, f"Invalid Request. Error: {e}")
+        
+    if not 0 < rate <= 1:
+        abort(400, "rate must be greater than 0 and at most 1")
+        
+    cursor = get_conn().cursor()
+    
+    try:
+        cursor.execute("""INSERT INTO sampling_policies(user_id, rate, slow_threshold) VALUES (%s, %s, %s)
+                          ON CONFLICT (user_id) DO UPDATE
+                          SET rate = EXCLUDED.rate, slow_threshold = EXCLUDED.slow_threshold, updated_at = now()""",
+                       (user_id, rate, slow_threshold))
+        g.conn.commit()
+    except psycopg2.errors.Error:
+        g.conn.rollback()
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+        
+    return jsonify({"message": "Sampling policy updated Successfully"}), 200
+
+
+@service.route("/api/sampling/<user_id>", methods=["DELETE"])
+def delete_sampling_policy(user_id):
+    cursor = get_conn().cursor()
+    
+    try:
+        cursor.execute("DELETE FROM sampling_policies WHERE user_id = %s", (user_id,))
+        g.conn.commit()
+    except psycopg2.errors.Error:
+        g.conn.rollback()
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+        
+    return jsonify({"message": "Sampling policy removed, defaults apply"}), 200
+
+
 @service.route("/api/analysis", methods=["GET"])
 def api_analysis():
-    avg_resp_query = "SELECT AVG(resp_time) FROM api_logs;"
-    peak_hours_query = "SELECT EXTRACT(hour FROM time) AS hour, COUNT(*) FROM api_logs GROUP BY hour ORDER BY COUNT(*) DESC LIMIT 1;"
-    top_endpoint_query = "SELECT endpoint, COUNT(*) AS request_count FROM api_logs GROUP BY endpoint ORDER BY request_count DESC LIMIT 1;"
+    # Served from memory; see init_clients for how the cached value is kept fresh.
+    try:
+        entry = analysis_cache.get()
+    except PoolTimeout:
+        abort(503, "The server is busy, please retry shortly")
+    except psycopg2.Error:
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+        
+    computed_at = datetime.fromtimestamp(entry["computed_at"], tz=timezone.utc)
     
-    cursor = g.conn.cursor()
+    return jsonify(dict(entry["value"], computed_at=computed_at.isoformat()))
+
+
+@service.route("/api/dashboard/<user_id>", methods=["GET"])
+def get_dashboard(user_id):
+    # Everything the portal's dashboard renders, formatted for display and cached
+    # for DASHBOARD_CACHE_TTL seconds per user.
+    cache_conn = redis.Redis(connection_pool=cache_pool)
     
-    cursor.execute(avg_resp_query)
-    avg_response_time = cursor.fetchone()[0]
-    avg_response_time = round(avg_response_time, 3)
+    try:
+        body = dashboard.cached(cache_conn, user_id)
+    except redis.RedisError as e:
+        logging.error(f"Couldn't read a cached dashboard. Error: {e}")
+        body = None
+        
+    if body is not None:
+        return jsonify(body), 200
     
-    cursor.execute(peak_hours_query)
-    peak_hour_data = cursor.fetchone()
+    try:
+        analysis = analysis_cache.get()
+        live = counters.live_counts(cache_conn, user_id)
+        body = dashboard.summary(get_conn().cursor(), user_id, live, analysis["value"])
+    except PoolTimeout:
+        abort(503, "The server is busy, please retry shortly")
+    except (psycopg2.Error, redis.RedisError):
+        if "conn" in g:
+            g.conn.rollback()
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+        
+    try:
+        dashboard.store(cache_conn, user_id, body)
+    except redis.RedisError as e:
+        logging.error(f"Couldn't cache a dashboard. Error: {e}")
+        
+    return jsonify(body), 200
+
+
+@service.route("/api/analysis/latency", methods=["GET"])
+def latency_analysis():
+    # Optional from/to (ISO 8601), user_id, endpoint, group_by (user or endpoint) and
+    # quantiles (comma separated, default 0.5,0.95,0.99).
+    try:
+        start = timeline.parse_time(request.args["from"]) if request.args.get("from") else None
+        end = timeline.parse_time(request.args["to"]) if request.args.get("to") else None
+        quantiles = [float(q) for q in request.args.get("quantiles", "0.5,0.95,0.99").split(",")]
+        
+        if any(q < 0 or q > 1 for q in quantiles):
+            raise ValueError("quantiles must be between 0 and 1")
+    except ValueError as e:
+        abort(400, f"Invalid Request. Error: {e}")
+        
+    group_by = request.args.get("group_by")
     
-    cursor.execute(top_endpoint_query)
-    top_endpoint_data = cursor.fetchall()
+    if group_by is not None and group_by not in rollups.GROUP_COLUMNS:
+        abort(400, f"group_by must be one of {', '.join(rollups.GROUP_COLUMNS)}")
+        
+    cursor = get_conn().cursor()
     
-    return jsonify({"average_response_time": avg_response_time,
-                    "peak_hour": f"{peak_hour_data[0]}:00",
-                    "requests_in_peak_hour": peak_hour_data[1],
-                    "top_endpoint": top_endpoint_data[0][0],
-                    "requests_to_top_endpoint": top_endpoint_data[0][1]})
+    try:
+        sketches = rollups.latency_sketches(cursor, start, end, request.args.get("user_id"),
+                                            request.args.get("endpoint"), group_by)
+    except psycopg2.errors.Error:
+        g.conn.rollback()
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+        
+    results = []
+    
+    for key, sketch in sorted(sketches.items(), key=lambda item: item[1].count, reverse=True):
+        # Groups whose requests all failed have no response times.
+        if not sketch.count:
+            continue
+        
+        result = {group_by: key or None} if group_by else {}
+        result["count"] = sketch.count
+        
+        for q in quantiles:
+            result[f"p{q * 100:g}"] = round(sketch.quantile(q), 6)
+            
+        results.append(result)
+        
+    return jsonify({"from": start.isoformat() if start else None,
+                    "to": end.isoformat() if end else None,
+                    "results": results}), 200
+
+
+@service.route("/api/timeseries/<user_id>", methods=["GET"])
+def get_timeseries(user_id):
+    # Optional from/to (ISO 8601, default the last 24 hours), bucket (1m, 5m, 15m, 1h,
+    # 6h or 1d; coarsened automatically to stay within TIMESERIES_MAX_POINTS) and
+    # metric (comma separated, see timeseries.METRICS).
+    try:
+        start, end, bucket, requested_metrics = timeseries.query_params(request.args)
+    except ValueError as e:
+        abort(400, f"Invalid Request. Error: {e}")
+        
+    cursor = get_conn().cursor()
+    
+    try:
+        points = timeseries.series(cursor, user_id, start, end, bucket, requested_metrics)
+    except psycopg2.errors.Error:
+        g.conn.rollback()
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+        
+    return jsonify({"user_id": user_id,
+                    "from": start.isoformat(),
+                    "to": end.isoformat(),
+                    "bucket": bucket,
+                    "points": points}), 200
+
+
+@service.route("/api/anomalies/<user_id>", methods=["GET"])
+def get_anomalies(user_id):
+    # Optional since (ISO 8601) and limit (1-1000, default 100); newest first.
+    try:
+        since = request.args.get("since")
+        since = timeline.parse_time(since) if since else None
+        limit = int(request.args.get("limit", 100))
+        
+        if not 1 <= limit <= 1000:
+            raise ValueError("limit must be between 1 and 1000")
+    except ValueError as e:
+        abort(400, f"Invalid Request. Error: {e}")
+        
+    cursor = get_conn().cursor()
+    
+    try:
+        alerts = anomaly.recent_alerts(cursor, user_id, since, limit)
+    except psycopg2.errors.Error:
+        g.conn.rollback()
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+        
+    return jsonify({"user_id": user_id, "alerts": alerts}), 200
+
+
+@service.route("/metrics", methods=["GET"])
+def get_metrics():
+    cache_conn = redis.Redis(connection_pool=cache_pool)
+    
+    try:
+        stats = log_worker.stream_stats(cache_conn)
+    except redis.RedisError:
+        stats = {}
+        
+    pool_stats = pool.stats()
+    stream_stats = broker.stats()
+        
+    body = metrics.render([
+        ("log_stream_length", "gauge", "Entries currently held in the log stream",
+         [({}, stats.get("length"))]),
+        ("log_stream_pending", "gauge", "Entries delivered to a log worker but not yet acknowledged",
+         [({}, stats.get("pending"))]),
+        ("log_stream_lag", "gauge", "Entries in the log stream not yet delivered to any log worker",
+         [({}, stats.get("lag"))]),
+        ("stream_users", "gauge", "Users with at least one stream connected to this process",
+         [({}, stream_stats["users"])]),
+        ("stream_subscriptions", "gauge", "Streams connected to this process",
+         [({}, stream_stats["subscriptions"])]),
+        ("db_pool_max_connections", "gauge", "Connections the Postgres pool may open",
+         [({}, pool_stats["max"])]),
+        ("db_pool_connections_in_use", "gauge", "Pooled connections currently checked out",
+         [({}, pool_stats["in_use"])]),
+        ("db_pool_connections_idle", "gauge", "Open pooled connections waiting to be checked out",
+         [({}, pool_stats["idle"])]),
+        ("db_pool_utilization", "gauge", "Share of the pool currently checked out",
+         [({}, pool_stats["utilization"])]),
+        ("db_pool_acquires_total", "counter", "Connections handed out by the pool",
+         [({}, pool_stats["acquires"])]),
+        ("db_pool_acquire_timeouts_total", "counter", "Requests that gave up waiting for a free connection",
+         [({}, pool_stats["timeouts"])]),
+        ("db_pool_wait_seconds_total", "counter", "Time spent waiting for a free connection",
+         [({}, pool_stats["wait_seconds"])]),
+        ("db_pool_max_wait_seconds", "gauge", "Longest wait for a free connection since start",
+         [({}, pool_stats["max_wait_seconds"])]),
+    ])
+    
+    return Response(body, mimetype="text/plain; version=0.0.4")
 
 
 @service.route("/stream/<user_id>")
 def stream(user_id):
+    subscription = broker.subscribe(user_id)
+    
+    # The only query a stream makes; later updates arrive with their totals.
+    try:
+        initial = get_req_count(user_id=user_id)
+    except Exception:
+        subscription.close()
+        raise
+    finally:
+        release_conn()
+    
     def event_stream():
-        while True:
-            print("waiting for event")
-            log_event.wait()
-            log_event.clear()
-            print("event happend")
-            
-            result = get_req_count(user_id=user_id)
-            data = json.dumps(result)
-            
-            print(data)
+        try:
+            yield f"data: {json.dumps(initial)}\n\n"
             
-            yield f"data: {data}\n\n"
+            while True:
+                payload = subscription.next(timeout=HEARTBEAT_INTERVAL)
+                
+                # Comment lines keep proxies from timing the stream out and let a
+                # write fail once the client has gone.
+                if payload is None:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield f"data: {json.dumps(payload)}\n\n"
+        finally:
+            subscription.close()
             
-    return Response(stream_with_context(event_stream()), mimetype="text/event-stream")
+    return Response(event_stream(), mimetype="text/event-stream")
 
 
 if __name__ == "__main__":
+    init_clients()
     service.run(debug=True, port=8000)
     
\ No newline at end of file
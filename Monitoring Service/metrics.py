@@ -0,0 +1,20 @@
+def render(metrics):
+    # Prometheus text exposition format; metrics are (name, type, help, samples)
+    # where samples is a list of (labels, value).
+    lines = []
+    
+    for name, kind, help_text, samples in metrics:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        
+        for labels, value in samples:
+            if value is None:
+                continue
+            
+            if labels:
+                label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}")
+            else:
+                lines.append(f"{name} {value}")
+                
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,45 @@
+from dotenv import load_dotenv
+import psycopg2
+import os
+
+load_dotenv()
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+def pending_migrations(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            name TEXT PRIMARY KEY,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    cursor.execute("SELECT name FROM schema_migrations")
+    applied = {row[0] for row in cursor.fetchall()}
+    
+    return [name for name in sorted(os.listdir(MIGRATIONS_DIR)) if name.endswith(".sql") and name not in applied]
+
+
+def migrate(conn):
+    cursor = conn.cursor()
+    
+    for name in pending_migrations(cursor):
+        with open(os.path.join(MIGRATIONS_DIR, name)) as file:
+            cursor.execute(file.read())
+            
+        cursor.execute("INSERT INTO schema_migrations(name) VALUES (%s)", (name,))
+        conn.commit()
+        
+        print(f"Applied {name}")
+
+
+if __name__ == "__main__":
+    conn = psycopg2.connect(dbname=os.getenv("DB_NAME"),
+                            user=os.getenv("DB_USER"),
+                            password=os.getenv("DB_PASSWORD"),
+                            host=os.getenv("DB_HOST"),
+                            port=os.getenv("DB_PORT"))
+    try:
+        migrate(conn)
+    finally:
+        conn.close()
@@ -0,0 +1,19 @@
+-- Tables the service has always used; IF NOT EXISTS keeps this a no-op on existing databases.
+CREATE TABLE IF NOT EXISTS api_logs (
+    user_id VARCHAR(24) NOT NULL,
+    method VARCHAR(10) NOT NULL,
+    endpoint VARCHAR(100),
+    path VARCHAR(255) NOT NULL,
+    status_code INTEGER NOT NULL,
+    date DATE NOT NULL,
+    time TIME NOT NULL,
+    resp_time DOUBLE PRECISION,
+    client_ip VARCHAR(45)
+);
+
+CREATE TABLE IF NOT EXISTS request_count (
+    user_id VARCHAR(24) PRIMARY KEY,
+    total_req BIGINT NOT NULL DEFAULT 0,
+    success_resp BIGINT NOT NULL DEFAULT 0,
+    error_resp BIGINT NOT NULL DEFAULT 0
+);
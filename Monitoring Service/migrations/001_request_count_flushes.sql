@@ -0,0 +1,5 @@
+-- One row per applied counter flush, so a flush retried after a crash is applied once.
+CREATE TABLE IF NOT EXISTS request_count_flushes (
+    flush_id UUID PRIMARY KEY,
+    flushed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
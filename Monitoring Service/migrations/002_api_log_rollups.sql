@@ -0,0 +1,15 @@
+-- Hourly per-user/per-endpoint aggregates of api_logs, maintained at ingest by rollups.py.
+-- endpoint is '' for logs without one so it can be part of the key.
+CREATE TABLE IF NOT EXISTS api_log_rollups (
+    hour TIMESTAMP NOT NULL,
+    user_id VARCHAR(24) NOT NULL,
+    endpoint VARCHAR(100) NOT NULL,
+    requests BIGINT NOT NULL DEFAULT 0,
+    errors BIGINT NOT NULL DEFAULT 0,
+    resp_time_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    resp_time_count BIGINT NOT NULL DEFAULT 0,
+    sketch BYTEA,
+    PRIMARY KEY (hour, user_id, endpoint)
+);
+
+CREATE INDEX IF NOT EXISTS api_log_rollups_user_hour_idx ON api_log_rollups (user_id, hour);
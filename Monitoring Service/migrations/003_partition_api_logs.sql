@@ -0,0 +1,29 @@
+-- api_logs becomes a table range-partitioned by day on a single ts column.
+-- Existing rows stay in api_logs_legacy until `python partitions.py migrate-legacy`
+-- moves them across; daily partitions are created and retired by partitions.py.
+ALTER TABLE api_logs RENAME TO api_logs_legacy;
+
+CREATE SEQUENCE IF NOT EXISTS api_logs_id_seq AS BIGINT;
+
+CREATE TABLE api_logs (
+    id BIGINT NOT NULL DEFAULT nextval('api_logs_id_seq'),
+    user_id VARCHAR(24) NOT NULL,
+    method VARCHAR(10) NOT NULL,
+    endpoint VARCHAR(100),
+    path VARCHAR(255) NOT NULL,
+    status_code INTEGER NOT NULL,
+    ts TIMESTAMPTZ NOT NULL,
+    resp_time DOUBLE PRECISION,
+    client_ip VARCHAR(45),
+    PRIMARY KEY (ts, id)
+) PARTITION BY RANGE (ts);
+
+ALTER SEQUENCE api_logs_id_seq OWNED BY api_logs.id;
+
+-- Catches rows for days that have no partition yet; partitions.py moves them out.
+CREATE TABLE api_logs_default PARTITION OF api_logs DEFAULT;
+
+CREATE INDEX api_logs_user_ts_idx ON api_logs (user_id, ts DESC);
+
+-- Legacy date + time values were written in the server's local time.
+ALTER TABLE api_log_rollups ALTER COLUMN hour TYPE TIMESTAMPTZ USING hour::timestamptz;
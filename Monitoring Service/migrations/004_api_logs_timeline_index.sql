@@ -0,0 +1,5 @@
+-- Covers the timeline query (timeline.py) so pages are index-only range scans.
+DROP INDEX IF EXISTS api_logs_user_ts_idx;
+
+CREATE INDEX IF NOT EXISTS api_logs_timeline_idx ON api_logs (user_id, ts DESC, id DESC)
+    INCLUDE (method, endpoint, path, status_code, resp_time, client_ip);
@@ -0,0 +1,14 @@
+-- Per-user, per-minute aggregates of api_logs for short-range charts (/api/timeseries).
+-- Maintained at ingest by rollups.py; rows past API_LOGS_MINUTE_ROLLUP_DAYS are pruned by partitions.py.
+CREATE TABLE IF NOT EXISTS api_log_rollups_minute (
+    minute TIMESTAMPTZ NOT NULL,
+    user_id VARCHAR(24) NOT NULL,
+    requests BIGINT NOT NULL DEFAULT 0,
+    errors BIGINT NOT NULL DEFAULT 0,
+    resp_time_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    resp_time_count BIGINT NOT NULL DEFAULT 0,
+    sketch BYTEA,
+    PRIMARY KEY (minute, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS api_log_rollups_minute_user_idx ON api_log_rollups_minute (user_id, minute);
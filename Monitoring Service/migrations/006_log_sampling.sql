@@ -0,0 +1,11 @@
+-- Successful fast requests may be stored sampled (sampling.py); each stored row
+-- carries how many requests it stands for. Adding a column with a constant
+-- default doesn't rewrite existing partitions.
+ALTER TABLE api_logs ADD COLUMN IF NOT EXISTS sample_weight REAL NOT NULL DEFAULT 1;
+
+CREATE TABLE IF NOT EXISTS sampling_policies (
+    user_id VARCHAR(24) PRIMARY KEY,
+    rate REAL NOT NULL CHECK (rate > 0 AND rate <= 1),
+    slow_threshold DOUBLE PRECISION,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
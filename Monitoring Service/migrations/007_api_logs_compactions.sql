@@ -0,0 +1,15 @@
+-- Progress of compaction.py, one row per partition (or default-partition day) it
+-- has worked on, so an interrupted run resumes where it stopped.
+CREATE TABLE IF NOT EXISTS api_logs_compactions (
+    source TEXT PRIMARY KEY,
+    day DATE NOT NULL,
+    folded BOOLEAN NOT NULL DEFAULT FALSE,
+    rows_archived BIGINT NOT NULL DEFAULT 0,
+    batches_archived INTEGER NOT NULL DEFAULT 0,
+    last_ts TIMESTAMPTZ,
+    last_id BIGINT,
+    rows_removed BIGINT NOT NULL DEFAULT 0,
+    bytes_reclaimed BIGINT NOT NULL DEFAULT 0,
+    completed_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
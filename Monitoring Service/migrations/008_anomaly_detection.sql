@@ -0,0 +1,22 @@
+-- Alerts raised by anomaly.py when a user/endpoint's error rate or latency
+-- departs from its recent baseline.
+CREATE TABLE IF NOT EXISTS anomaly_alerts (
+    id BIGSERIAL PRIMARY KEY,
+    user_id VARCHAR(24) NOT NULL,
+    endpoint VARCHAR(255),
+    metric VARCHAR(32) NOT NULL,
+    value DOUBLE PRECISION NOT NULL,
+    baseline DOUBLE PRECISION NOT NULL,
+    zscore DOUBLE PRECISION NOT NULL,
+    window_start TIMESTAMPTZ NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS anomaly_alerts_user_idx ON anomaly_alerts (user_id, window_start DESC);
+
+-- Periodic checkpoint of the detectors' Redis state, restored if Redis loses it.
+CREATE TABLE IF NOT EXISTS anomaly_detectors (
+    key TEXT PRIMARY KEY,
+    state JSONB NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
@@ -0,0 +1,9 @@
+-- Stream entries the log worker has written, recorded in the same transaction as
+-- their logs, so an entry redelivered after a failure between that commit and its
+-- XACK is skipped instead of being inserted (and rolled up) a second time.
+CREATE TABLE IF NOT EXISTS log_stream_entries (
+    entry_id TEXT PRIMARY KEY,
+    processed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS log_stream_entries_processed_idx ON log_stream_entries (processed_at);
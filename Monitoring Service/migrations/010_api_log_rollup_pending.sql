@@ -0,0 +1,14 @@
+-- Single logs posted to /api/logs, waiting to be folded into the rollups by
+-- rollups.run_folder. Appending here instead of updating the rollups in the request
+-- keeps concurrent single-log inserts off the shared minute and hour rollup rows.
+CREATE TABLE IF NOT EXISTS api_log_rollup_pending (
+    id BIGSERIAL PRIMARY KEY,
+    user_id VARCHAR(24) NOT NULL,
+    method VARCHAR(10) NOT NULL,
+    endpoint VARCHAR(100),
+    path VARCHAR(255) NOT NULL,
+    status_code INTEGER NOT NULL,
+    ts TIMESTAMPTZ NOT NULL,
+    resp_time DOUBLE PRECISION,
+    client_ip VARCHAR(45)
+);
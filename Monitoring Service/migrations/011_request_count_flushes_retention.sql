@@ -0,0 +1,2 @@
+-- partitions.py prunes applied flush markers by age.
+CREATE INDEX IF NOT EXISTS request_count_flushes_flushed_idx ON request_count_flushes (flushed_at);
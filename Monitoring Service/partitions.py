@@ -0,0 +1,201 @@
+from psycopg2 import sql
+from dotenv import load_dotenv
+from datetime import datetime, time, timedelta, timezone
+import argparse
+import logging
+import psycopg2
+import os
+
+load_dotenv()
+
+PARTITION_PREFIX = "api_logs_p"
+DEFAULT_PARTITION = "api_logs_default"
+
+PRECREATE_DAYS = int(os.getenv("API_LOGS_PRECREATE_DAYS", 7))
+RETENTION_DAYS = int(os.getenv("API_LOGS_RETENTION_DAYS", 90))
+# "drop" deletes expired partitions, "detach" leaves them as standalone tables for archiving.
+RETENTION_MODE = os.getenv("API_LOGS_RETENTION_MODE", "drop")
+MINUTE_ROLLUP_DAYS = int(os.getenv("API_LOGS_MINUTE_ROLLUP_DAYS", 7))
+# Long past any redelivery: entries are only redelivered while still pending in the stream.
+STREAM_ENTRY_RETENTION_HOURS = int(os.getenv("LOG_STREAM_ENTRY_RETENTION_HOURS", 24))
+# Likewise for counter flushes: a claimed snapshot is retried every flush interval
+# until Redis releases it, so a marker is only needed for a few intervals.
+FLUSH_RETENTION_HOURS = int(os.getenv("REQUEST_COUNT_FLUSH_RETENTION_HOURS", 24))
+MAINTENANCE_INTERVAL = int(os.getenv("API_LOGS_MAINTENANCE_INTERVAL", 3600))
+
+# Keeps concurrent workers from running maintenance at the same time.
+MAINTENANCE_LOCK_ID = 7310036
+
+
+def day_bounds(day):
+    start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+    
+    return start, start + timedelta(days=1)
+
+
+def partition_name(day):
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+def existing_partitions(cursor):
+    cursor.execute("""
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = 'api_logs'
+    """)
+    
+    return {datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d").date(): name
+            for (name,) in cursor.fetchall() if name.startswith(PARTITION_PREFIX)}
+
+
+def create_partition(cursor, day):
+    name = sql.Identifier(partition_name(day))
+    start, end = day_bounds(day)
+    
+    # Built standalone and attached so rows that already landed in the default
+    # partition for this day can be moved into it first.
+    cursor.execute(sql.SQL("CREATE TABLE {} (LIKE api_logs INCLUDING DEFAULTS INCLUDING CONSTRAINTS)").format(name))
+    cursor.execute(sql.SQL("""
+        WITH moved AS (DELETE FROM {} WHERE ts >= %s AND ts < %s RETURNING *)
+        INSERT INTO {} SELECT * FROM moved
+    """).format(sql.Identifier(DEFAULT_PARTITION), name), (start, end))
+    cursor.execute(sql.SQL("ALTER TABLE api_logs ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)").format(name),
+                   (start, end))
+
+
+def retire_partition(cursor, name):
+    cursor.execute(sql.SQL("ALTER TABLE api_logs DETACH PARTITION {}").format(sql.Identifier(name)))
+    
+    if RETENTION_MODE == "drop":
+        cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+
+
+def maintain(conn, today=None):
+    today = today or datetime.now(timezone.utc).date()
+    cutoff = today - timedelta(days=RETENTION_DAYS)
+    cursor = conn.cursor()
+    
+    cursor.execute("SET LOCAL statement_timeout = 0")
+    cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", (MAINTENANCE_LOCK_ID,))
+    
+    if not cursor.fetchone()[0]:
+        conn.rollback()
+        return None
+    
+    partitions = existing_partitions(cursor)
+    created, retired = [], []
+    
+    for offset in range(-1, PRECREATE_DAYS + 1):
+        day = today + timedelta(days=offset)
+        
+        if day not in partitions:
+            create_partition(cursor, day)
+            created.append(partition_name(day))
+            
+    for day, name in sorted(partitions.items()):
+        if day < cutoff:
+            retire_partition(cursor, name)
+            retired.append(name)
+            
+    cursor.execute(sql.SQL("DELETE FROM {} WHERE ts < %s").format(sql.Identifier(DEFAULT_PARTITION)),
+                   (day_bounds(cutoff)[0],))
+    cursor.execute("DELETE FROM api_log_rollups_minute WHERE minute < %s",
+                   (day_bounds(today - timedelta(days=MINUTE_ROLLUP_DAYS))[0],))
+    cursor.execute("DELETE FROM log_stream_entries WHERE processed_at < now() - make_interval(hours => %s)",
+                   (STREAM_ENTRY_RETENTION_HOURS,))
+    cursor.execute("DELETE FROM request_count_flushes WHERE flushed_at < now() - make_interval(hours => %s)",
+                   (FLUSH_RETENTION_HOURS,))
+    
+    conn.commit()
+    
+    return created, retired
+
+
+def run_maintenance(pool, stop_event):
+    while True:
+        try:
+            conn = pool.getconn()
+        except psycopg2.Error as e:
+            logging.error(f"Couldn't get a connection for api_logs maintenance. Error: {e}")
+        else:
+            try:
+                maintain(conn)
+            except psycopg2.Error as e:
+                conn.rollback()
+                logging.error(f"api_logs partition maintenance failed. Error: {e}")
+            finally:
+                pool.putconn(conn)
+                
+        if stop_event.wait(MAINTENANCE_INTERVAL):
+            break
+
+
+def migrate_legacy(conn):
+    # Moves rows from the pre-partitioning table one day per transaction, so it can be
+    # stopped and resumed; the legacy table is dropped once it's empty.
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT to_regclass('api_logs_legacy')")
+    
+    if cursor.fetchone()[0] is None:
+        return 0
+    
+    cursor.execute("CREATE INDEX IF NOT EXISTS api_logs_legacy_date_idx ON api_logs_legacy (date)")
+    cursor.execute("SELECT MIN(date), MAX(date) FROM api_logs_legacy")
+    first, last = cursor.fetchone()
+    conn.commit()
+    
+    moved = 0
+    day = first
+    
+    while day is not None and day <= last:
+        # Legacy dates are local, so a day's rows can straddle two UTC partitions.
+        partitions = existing_partitions(cursor)
+        
+        for partition_day in (day - timedelta(days=1), day, day + timedelta(days=1)):
+            if partition_day not in partitions:
+                create_partition(cursor, partition_day)
+                
+        cursor.execute("""
+            WITH legacy AS (DELETE FROM api_logs_legacy WHERE date = %s RETURNING *)
+            INSERT INTO api_logs(user_id, method, endpoint, path, status_code, ts, resp_time, client_ip)
+            SELECT user_id, method, endpoint, path, status_code, (date + time)::timestamptz, resp_time, client_ip
+            FROM legacy
+        """, (day,))
+        
+        moved += cursor.rowcount
+        conn.commit()
+        
+        print(f"{day}: moved {cursor.rowcount} logs")
+        
+        day += timedelta(days=1)
+        
+    cursor.execute("DROP TABLE api_logs_legacy")
+    conn.commit()
+    
+    return moved
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage api_logs partitions")
+    parser.add_argument("command", choices=["maintain", "migrate-legacy"])
+    args = parser.parse_args()
+    
+    conn = psycopg2.connect(dbname=os.getenv("DB_NAME"),
+                            user=os.getenv("DB_USER"),
+                            password=os.getenv("DB_PASSWORD"),
+                            host=os.getenv("DB_HOST"),
+                            port=os.getenv("DB_PORT"))
+    try:
+        if args.command == "maintain":
+            result = maintain(conn)
+            
+            if result is None:
+                print("Maintenance is already running elsewhere")
+            else:
+                print(f"Created {result[0] or 'no partitions'}, retired {result[1] or 'no partitions'}")
+        else:
+            print(f"Moved {migrate_legacy(conn)} logs")
+    finally:
+        conn.close()
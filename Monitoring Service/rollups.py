@@ -0,0 +1,325 @@
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+from sketch import LatencySketch
+from datetime import date, datetime, timedelta, timezone
+import argparse
+import logging
+import psycopg2
+import os
+
+load_dotenv()
+
+REBUILD_CHUNK_SIZE = 10000
+# How often deferred single logs are folded into the rollups, and how many per transaction.
+FOLD_INTERVAL = float(os.getenv("ROLLUP_FOLD_INTERVAL", 2))
+FOLD_BATCH_SIZE = int(os.getenv("ROLLUP_FOLD_BATCH_SIZE", 5000))
+
+INSERT_KEYS_QUERY = """
+    INSERT INTO {table}({columns}) VALUES %s
+    ON CONFLICT DO NOTHING
+"""
+
+LOCK_ROLLUPS_QUERY = """
+    SELECT {columns}, sketch FROM {table}
+    WHERE ({columns}) IN %s
+    ORDER BY {columns}
+    FOR UPDATE
+"""
+
+UPDATE_ROLLUPS_QUERY = """
+    UPDATE {table} AS r
+    SET requests = r.requests + v.requests,
+        errors = r.errors + v.errors,
+        resp_time_sum = r.resp_time_sum + v.resp_time_sum,
+        resp_time_count = r.resp_time_count + v.resp_time_count,
+        sketch = v.sketch
+    FROM (VALUES %s) AS v({columns}, requests, errors, resp_time_sum, resp_time_count, sketch)
+    WHERE {join}
+"""
+
+
+def hourly_key(row):
+    # row is an api_logs tuple as built by ingest.parse_log. Buckets are UTC hours:
+    # rows read back (rebuild) carry the session time zone, which may be off the hour.
+    hour = row[5].astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    
+    return (hour, row[0], row[2] or "")
+
+
+def minute_key(row):
+    return (row[5].astimezone(timezone.utc).replace(second=0, microsecond=0), row[0])
+
+
+# table: (key columns, key function). Hourly rollups are per endpoint and kept for
+# good; the per-minute ones only back short-range charts and are pruned by partitions.py.
+ROLLUP_TABLES = {
+    "api_log_rollups": (("hour", "user_id", "endpoint"), hourly_key),
+    "api_log_rollups_minute": (("minute", "user_id"), minute_key),
+}
+
+# Logs in [start, end) whose bucket in {table} has no row at all, matched the way the
+# key functions above bucket them (UTC).
+MISSING_LOGS_QUERY = """
+    SELECT l.user_id, l.method, l.endpoint, l.path, l.status_code, l.ts, l.resp_time, l.client_ip, l.sample_weight
+    FROM api_logs AS l
+    WHERE l.ts >= %s AND l.ts < %s
+      AND NOT EXISTS (SELECT 1 FROM {table} AS r WHERE {match})
+"""
+
+INSERT_PENDING_QUERY = """
+    INSERT INTO api_log_rollup_pending(user_id, method, endpoint, path, status_code, ts, resp_time, client_ip)
+    VALUES %s
+"""
+
+# SKIP LOCKED lets every process run a folder without two of them claiming the same rows.
+TAKE_PENDING_QUERY = """
+    DELETE FROM api_log_rollup_pending
+    WHERE id IN (SELECT id FROM api_log_rollup_pending ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED)
+    RETURNING user_id, method, endpoint, path, status_code, ts, resp_time, client_ip
+"""
+
+MISSING_MATCH = {
+    "api_log_rollups": """r.hour = date_trunc('hour', l.ts AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'
+                          AND r.user_id = l.user_id AND r.endpoint = COALESCE(l.endpoint, '')""",
+    "api_log_rollups_minute": """r.minute = date_trunc('minute', l.ts AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'
+                                 AND r.user_id = l.user_id""",
+}
+
+
+def aggregate(rows, rollup_key):
+    groups = {}
+    
+    for row in rows:
+        key = rollup_key(row)
+        
+        if key not in groups:
+            groups[key] = [0, 0, 0.0, 0, LatencySketch()]
+            
+        group = groups[key]
+        status_code, resp_time = row[4], row[6]
+        # Ingest passes every log (weight 1); stored rows may be sampled (see rebuild).
+        weight = round(row[8]) if len(row) > 8 else 1
+        
+        group[0] += weight
+        
+        if not (status_code >= 200 and status_code < 400):
+            group[1] += weight
+            
+        if resp_time is not None:
+            group[2] += resp_time * weight
+            group[3] += weight
+            group[4].add(resp_time, weight)
+            
+    return groups
+
+
+def apply(cursor, rows, tables=ROLLUP_TABLES):
+    # Runs inside the ingest transaction (or fold_pending's), so rollups commit or
+    # roll back with the logs.
+    for table in tables:
+        columns, rollup_key = ROLLUP_TABLES[table]
+        groups = aggregate(rows, rollup_key)
+        
+        if not groups:
+            continue
+        
+        names = {"table": table,
+                 "columns": ", ".join(columns),
+                 "join": " AND ".join(f"r.{column} = v.{column}" for column in columns)}
+        
+        # Sorted so concurrent writers take row locks in the same order.
+        keys = sorted(groups)
+        
+        execute_values(cursor, INSERT_KEYS_QUERY.format(**names), keys, page_size=len(keys))
+        
+        # Sketches can't be merged in SQL, so the rows are locked, merged here and written back.
+        cursor.execute(LOCK_ROLLUPS_QUERY.format(**names), (tuple(keys),))
+        
+        for *key, stored in cursor.fetchall():
+            groups[tuple(key)][4].merge(LatencySketch.from_bytes(stored))
+        
+        values = [(*key, requests, errors, resp_sum, resp_count, psycopg2.Binary(sketch.to_bytes()))
+                  for key, (requests, errors, resp_sum, resp_count, sketch) in sorted(groups.items())]
+        
+        execute_values(cursor, UPDATE_ROLLUPS_QUERY.format(**names), values, page_size=len(values))
+
+
+def defer(cursor, rows):
+    # Queues rows for fold_pending instead of applying them, so the caller's
+    # transaction only appends and never waits on another writer's rollup rows.
+    execute_values(cursor, INSERT_PENDING_QUERY, rows, page_size=len(rows))
+
+
+def fold_pending(conn):
+    # Moves deferred rows into the rollups; each chunk is taken and applied in one
+    # transaction, so a failure leaves it queued rather than lost or counted twice.
+    cursor = conn.cursor()
+    total = 0
+    
+    while True:
+        cursor.execute(TAKE_PENDING_QUERY, (FOLD_BATCH_SIZE,))
+        rows = cursor.fetchall()
+        
+        if rows:
+            apply(cursor, rows)
+            
+        conn.commit()
+        total += len(rows)
+        
+        if len(rows) < FOLD_BATCH_SIZE:
+            return total
+
+
+def run_folder(pool, stop_event):
+    while not stop_event.wait(FOLD_INTERVAL):
+        try:
+            conn = pool.getconn()
+        except psycopg2.Error as e:
+            logging.error(f"Couldn't get a connection to fold pending rollups. Error: {e}")
+            continue
+        
+        try:
+            fold_pending(conn)
+        except psycopg2.Error as e:
+            conn.rollback()
+            logging.error(f"Couldn't fold pending rollups. Error: {e}")
+        finally:
+            pool.putconn(conn)
+
+
+def analysis(cursor):
+    # Global summary for the portal, aggregated over the hourly rollups only.
+    avg_resp_query = "SELECT SUM(resp_time_sum) / NULLIF(SUM(resp_time_count), 0) FROM api_log_rollups;"
+    peak_hours_query = "SELECT EXTRACT(hour FROM hour)::int AS hour_of_day, SUM(requests)::bigint FROM api_log_rollups GROUP BY hour_of_day ORDER BY 2 DESC LIMIT 1;"
+    top_endpoint_query = "SELECT endpoint, SUM(requests)::bigint AS request_count FROM api_log_rollups GROUP BY endpoint ORDER BY request_count DESC LIMIT 1;"
+    
+    cursor.execute(avg_resp_query)
+    avg_response_time = cursor.fetchone()[0]
+    
+    if avg_response_time is not None:
+        avg_response_time = round(avg_response_time, 3)
+    
+    cursor.execute(peak_hours_query)
+    peak_hour_data = cursor.fetchone() or (None, 0)
+    
+    cursor.execute(top_endpoint_query)
+    top_endpoint_data = cursor.fetchone() or ("", 0)
+    
+    return {"average_response_time": avg_response_time,
+            "peak_hour": f"{peak_hour_data[0]}:00" if peak_hour_data[0] is not None else None,
+            "requests_in_peak_hour": peak_hour_data[1],
+            "top_endpoint": top_endpoint_data[0] or None,
+            "requests_to_top_endpoint": top_endpoint_data[1]}
+
+
+GROUP_COLUMNS = {"user": "user_id", "endpoint": "endpoint"}
+
+
+def latency_sketches(cursor, start=None, end=None, user_id=None, endpoint=None, group_by=None):
+    # Merges the stored sketches for the matching rollup rows, so the cost is the
+    # number of hours x users x endpoints in range, never the number of logs.
+    # Rollups are hourly, so start/end effectively snap to the hour.
+    column = GROUP_COLUMNS[group_by] if group_by else "NULL"
+    
+    cursor.execute(f"""
+        SELECT {column}, sketch FROM api_log_rollups
+        WHERE hour >= COALESCE(%s::timestamptz, '-infinity') AND hour < COALESCE(%s::timestamptz, 'infinity')
+          AND (%s::text IS NULL OR user_id = %s)
+          AND (%s::text IS NULL OR endpoint = %s)
+          AND sketch IS NOT NULL
+    """, (start, end, user_id, user_id, endpoint, endpoint))
+    
+    sketches = {}
+    
+    while rows := cursor.fetchmany(REBUILD_CHUNK_SIZE):
+        for key, stored in rows:
+            sketches.setdefault(key, LatencySketch()).merge(LatencySketch.from_bytes(stored))
+            
+    return sketches
+
+
+def rebuild(conn, start, end):
+    # Recomputes the rollups for [start, end) from the raw logs, replacing what's
+    # there. Only safe while the range still holds all its raw logs, i.e. after the
+    # compaction cutoff; where logs were sampled the result is an estimate scaled by
+    # sample_weight. fill_missing is the catch-up job for everything else.
+    cursor = conn.cursor()
+    
+    cursor.execute("DELETE FROM api_log_rollups WHERE hour >= %s AND hour < %s", (start, end))
+    cursor.execute("DELETE FROM api_log_rollups_minute WHERE minute >= %s AND minute < %s", (start, end))
+    
+    logs = conn.cursor(name="rollup_rebuild")
+    logs.itersize = REBUILD_CHUNK_SIZE
+    logs.execute("""SELECT user_id, method, endpoint, path, status_code, ts, resp_time, client_ip, sample_weight
+                    FROM api_logs WHERE ts >= %s AND ts < %s""", (start, end))
+    
+    total = 0
+    
+    while rows := logs.fetchmany(REBUILD_CHUNK_SIZE):
+        apply(cursor, rows)
+        total += len(rows)
+        
+    logs.close()
+    conn.commit()
+    
+    return total
+
+
+def fill_missing(conn, start, end):
+    # Like rebuild, but only for buckets with no rollup row, e.g. history migrated
+    # from before the rollups existed. Buckets maintained at ingest are exact and are
+    # never touched, so sampled rows can't replace them with estimates.
+    # Deferred logs are already in api_logs; fold them first so they aren't also
+    # counted here for a bucket that has no row yet.
+    fold_pending(conn)
+    
+    cursor = conn.cursor()
+    total = 0
+    
+    for table in ROLLUP_TABLES:
+        # The NOT EXISTS is evaluated against the cursor's snapshot, so a bucket
+        # created by an earlier chunk still receives the rest of its logs.
+        logs = conn.cursor(name="rollup_fill")
+        logs.itersize = REBUILD_CHUNK_SIZE
+        logs.execute(MISSING_LOGS_QUERY.format(table=table, match=MISSING_MATCH[table]), (start, end))
+        
+        while rows := logs.fetchmany(REBUILD_CHUNK_SIZE):
+            apply(cursor, rows, [table])
+            total += len(rows)
+            
+        logs.close()
+        
+    conn.commit()
+    
+    return total
+
+
+if __name__ == "__main__":
+    from compaction import COMPACT_AFTER_DAYS
+    
+    parser = argparse.ArgumentParser(description="Fill in api_log_rollups and api_log_rollups_minute from api_logs")
+    parser.add_argument("start", type=date.fromisoformat)
+    parser.add_argument("end", type=date.fromisoformat, nargs="?", default=date.today() + timedelta(days=1))
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Delete and recompute the rollups in range instead of only filling missing buckets")
+    args = parser.parse_args()
+    
+    # Raw logs before the compaction cutoff are gone, so rebuilding there would
+    # delete rollups that can't be recomputed.
+    cutoff = datetime.now(timezone.utc).date() - timedelta(days=COMPACT_AFTER_DAYS)
+    
+    if args.rebuild and args.start < cutoff:
+        parser.error(f"--rebuild can't start before {cutoff}: older logs have been compacted away")
+    
+    conn = psycopg2.connect(dbname=os.getenv("DB_NAME"),
+                            user=os.getenv("DB_USER"),
+                            password=os.getenv("DB_PASSWORD"),
+                            host=os.getenv("DB_HOST"),
+                            port=os.getenv("DB_PORT"))
+    try:
+        if args.rebuild:
+            print(f"Rebuilt rollups from {rebuild(conn, args.start, args.end)} logs")
+        else:
+            print(f"Rolled up {fill_missing(conn, args.start, args.end)} logs into missing buckets")
+    finally:
+        conn.close()
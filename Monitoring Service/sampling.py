@@ -0,0 +1,58 @@
+import threading
+import random
+import time
+import os
+
+# Defaults keep every log; per-user overrides live in sampling_policies.
+DEFAULT_RATE = float(os.getenv("LOG_SAMPLE_RATE", 1.0))
+# Seconds; requests at least this slow are always stored.
+DEFAULT_SLOW_THRESHOLD = float(os.getenv("LOG_SLOW_THRESHOLD", 1.0))
+REFRESH_INTERVAL = float(os.getenv("LOG_SAMPLING_REFRESH_INTERVAL", 30))
+
+POLICIES_QUERY = "SELECT user_id, rate, slow_threshold FROM sampling_policies"
+
+
+class SamplingPolicies:
+    def __init__(self):
+        self._policies = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def refresh(self, cursor):
+        # Reloaded at most every REFRESH_INTERVAL, on the ingest transaction's cursor.
+        now = time.monotonic()
+        
+        with self._lock:
+            if self._loaded_at is not None and now - self._loaded_at < REFRESH_INTERVAL:
+                return
+            self._loaded_at = now
+            
+        cursor.execute(POLICIES_QUERY)
+        self._policies = {user_id: (rate, slow_threshold) for user_id, rate, slow_threshold in cursor.fetchall()}
+
+    def policy(self, user_id):
+        rate, slow_threshold = self._policies.get(user_id, (DEFAULT_RATE, None))
+        
+        return rate, slow_threshold if slow_threshold is not None else DEFAULT_SLOW_THRESHOLD
+
+    def sample(self, cursor, rows):
+        # Errors, slow requests and requests without a response time are always kept;
+        # the rest are kept at the user's rate and weighted by 1/rate, so counts
+        # estimated from the stored rows stay unbiased.
+        self.refresh(cursor)
+        kept = []
+        
+        for row in rows:
+            status_code, resp_time = row[4], row[6]
+            rate, slow_threshold = self.policy(row[0])
+            
+            if (rate >= 1 or not (status_code >= 200 and status_code < 400)
+                    or resp_time is None or resp_time >= slow_threshold):
+                kept.append((*row, 1.0))
+            elif random.random() < rate:
+                kept.append((*row, 1 / rate))
+                
+        return kept
+
+
+policies = SamplingPolicies()
@@ -0,0 +1,219 @@
+from quart import Quart, request, Response, abort
+from quart_cors import cors
+from dotenv import load_dotenv
+from db_pool import ConnectionPool
+from broker import AsyncBroker, AsyncAlertBroker, current_totals
+import metrics
+import redis.asyncio as aioredis
+import psycopg2
+import uvicorn
+import asyncio
+import logging
+import redis
+import json
+import time
+import os
+
+load_dotenv()
+
+# Serves /stream/<user_id> on an event loop, so an open dashboard costs a coroutine
+# and a socket rather than a worker thread and a Postgres connection.
+stream_service = Quart(__name__)
+stream_service = cors(stream_service, allow_origin="*")
+stream_service.config["RESPONSE_TIMEOUT"] = None
+
+HEARTBEAT_INTERVAL = float(os.getenv("STREAM_HEARTBEAT_INTERVAL", 15))
+MAX_STREAMS = int(os.getenv("STREAM_MAX_CONNECTIONS", 10000))
+# A client whose socket can't take an event within this long is disconnected; it
+# reconnects with Last-Event-ID and gets the current totals.
+SEND_TIMEOUT = float(os.getenv("STREAM_SEND_TIMEOUT", 10))
+RETRY_MS = int(os.getenv("STREAM_RETRY_MS", 3000))
+
+pool = None
+cache_pool = None
+sync_cache_pool = None
+broker = None
+alert_broker = None
+stop_event = None
+
+# Initial totals being read, per user, so a reconnect storm costs one query per user.
+loading = {}
+slow_disconnects = 0
+
+
+@stream_service.before_serving
+async def init_clients():
+    global pool, cache_pool, sync_cache_pool, broker, alert_broker, stop_event
+    
+    # Only used briefly for each stream's initial totals.
+    pool = ConnectionPool(
+        maxconn=int(os.getenv("STREAM_DB_POOL_SIZE", 2)),
+        acquire_timeout=float(os.getenv("DB_POOL_TIMEOUT", 5)),
+        statement_timeout=int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 5000)),
+        health_check_interval=float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", 30)),
+        prepared={},
+        dbname=os.getenv("DB_NAME"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT")
+        )
+    
+    redis_options = {"host": os.getenv("REDIS_HOST"),
+                     "port": os.getenv("REDIS_PORT"),
+                     "db": int(os.getenv("LOG_STREAM_DB", 1))}
+    
+    cache_pool = aioredis.ConnectionPool(**redis_options)
+    sync_cache_pool = redis.ConnectionPool(**redis_options, max_connections=int(os.getenv("REDIS_POOL_SIZE", 10)))
+    
+    stop_event = asyncio.Event()
+    broker = AsyncBroker(cache_pool)
+    stream_service.add_background_task(broker.run, stop_event)
+    alert_broker = AsyncAlertBroker(cache_pool)
+    stream_service.add_background_task(alert_broker.run, stop_event)
+
+
+@stream_service.after_serving
+async def close_clients():
+    stop_event.set()
+    pool.closeall()
+    sync_cache_pool.disconnect()
+    await cache_pool.disconnect()
+
+
+def read_totals(user_id):
+    conn = pool.getconn()
+    
+    try:
+        return current_totals(conn.cursor(), redis.Redis(connection_pool=sync_cache_pool), [user_id])[user_id]
+    finally:
+        pool.putconn(conn)
+
+
+async def initial_totals(user_id):
+    if user_id not in loading:
+        loading[user_id] = asyncio.ensure_future(asyncio.to_thread(read_totals, user_id))
+        loading[user_id].add_done_callback(lambda _: loading.pop(user_id, None))
+        
+    return await asyncio.shield(loading[user_id])
+
+
+def event(totals):
+    # total_req only ever grows, so it doubles as the event id for Last-Event-ID.
+    return f"id: {totals['total_req']}\ndata: {json.dumps(totals)}\n\n"
+
+
+@stream_service.route("/stream/<user_id>")
+async def stream(user_id):
+    if broker.stats()["subscriptions"] + alert_broker.stats()["subscriptions"] >= MAX_STREAMS:
+        abort(503, "Too many open streams, please retry shortly")
+        
+    subscription = broker.subscribe(user_id)
+    
+    try:
+        totals = await initial_totals(user_id)
+    except (psycopg2.Error, redis.RedisError) as e:
+        subscription.close()
+        logging.error(f"Couldn't read initial totals for a stream. Error: {e}")
+        abort(503, "The server is busy, please retry shortly")
+    except BaseException:
+        subscription.close()
+        raise
+    
+    last_event_id = request.headers.get("Last-Event-ID")
+    
+    async def event_stream():
+        global slow_disconnects
+        
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            
+            # A resuming client that already has these totals isn't sent them again.
+            if last_event_id != str(totals["total_req"]):
+                yield event(totals)
+                
+            while True:
+                payload = await subscription.next(HEARTBEAT_INTERVAL)
+                started = time.monotonic()
+                
+                yield ": keep-alive\n\n" if payload is None else event(payload)
+                
+                # The generator is resumed once the server has handed the chunk to a
+                # drained socket, so this is how long the client took to accept it.
+                # Updates are coalesced meanwhile, so a slow client never queues more
+                # than one, but one that can't keep up is dropped.
+                if time.monotonic() - started > SEND_TIMEOUT:
+                    slow_disconnects += 1
+                    break
+        finally:
+            subscription.close()
+            
+    response = Response(event_stream(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    response.timeout = None
+    
+    return response
+
+
+@stream_service.route("/stream/<user_id>/alerts")
+async def stream_alerts(user_id):
+    # Anomaly alerts as they're raised; past ones are at /api/anomalies/<user_id>.
+    if broker.stats()["subscriptions"] + alert_broker.stats()["subscriptions"] >= MAX_STREAMS:
+        abort(503, "Too many open streams, please retry shortly")
+        
+    subscription = alert_broker.subscribe(user_id)
+    
+    async def event_stream():
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            
+            while True:
+                alert = await subscription.next(HEARTBEAT_INTERVAL)
+                
+                yield ": keep-alive\n\n" if alert is None else f"event: anomaly\ndata: {json.dumps(alert)}\n\n"
+        finally:
+            subscription.close()
+            
+    response = Response(event_stream(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    response.timeout = None
+    
+    return response
+
+
+@stream_service.route("/metrics", methods=["GET"])
+async def get_metrics():
+    stats = broker.stats()
+    pool_stats = pool.stats()
+    
+    body = metrics.render([
+        ("stream_users", "gauge", "Users with at least one stream connected to this process",
+         [({}, stats["users"])]),
+        ("stream_subscriptions", "gauge", "Streams connected to this process",
+         [({}, stats["subscriptions"])]),
+        ("stream_alert_subscriptions", "gauge", "Anomaly alert streams connected to this process",
+         [({}, alert_broker.stats()["subscriptions"])]),
+        ("stream_slow_disconnects_total", "counter", "Streams dropped for not keeping up",
+         [({}, slow_disconnects)]),
+        ("stream_initial_loads_in_progress", "gauge", "Initial totals reads in flight",
+         [({}, len(loading))]),
+        ("db_pool_connections_in_use", "gauge", "Pooled connections currently checked out",
+         [({}, pool_stats["in_use"])]),
+        ("db_pool_acquire_timeouts_total", "counter", "Requests that gave up waiting for a free connection",
+         [({}, pool_stats["timeouts"])]),
+    ])
+    
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+
+if __name__ == "__main__":
+    host, port = os.getenv("STREAM_BIND", "0.0.0.0:8003").rsplit(":", 1)
+    
+    uvicorn.run("stream_app:stream_service",
+                host=host,
+                port=int(port),
+                workers=int(os.getenv("STREAM_WORKERS", 1)),
+                backlog=int(os.getenv("WEB_BACKLOG", 4096)),
+                timeout_graceful_shutdown=int(os.getenv("WEB_GRACEFUL_TIMEOUT", 30)))
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta, timezone
+import anomaly
+import fakeredis
+import pytest
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def cache_conn():
+    return fakeredis.FakeRedis()
+
+
+def window(index, requests=100, errors=2, resp_time=0.1, user_id="u", endpoint="patient.get_patient"):
+    # One window's logs: `errors` of them failed, all took `resp_time`.
+    ts = START + timedelta(seconds=index * anomaly.WINDOW)
+
+    return [(user_id, "GET", endpoint, "/api/patients/1", 500 if i < errors else 200, ts, resp_time, "127.0.0.1")
+            for i in range(requests)]
+
+
+def observe_windows(cache_conn, windows):
+    # Alerts for a window come out when the next one is first observed.
+    alerts = []
+
+    for index, logs in enumerate(windows):
+        alerts.extend(anomaly.observe(cache_conn, logs))
+
+    return alerts
+
+
+def baseline(count=anomaly.WARMUP_WINDOWS):
+    return [window(index) for index in range(count)]
+
+
+def test_steady_traffic_raises_nothing(cache_conn):
+    assert observe_windows(cache_conn, baseline(30)) == []
+
+
+def test_error_rate_spike(cache_conn):
+    windows = baseline()
+    spike = len(windows)
+    windows += [window(spike, errors=50), window(spike + 1)]
+
+    alerts = observe_windows(cache_conn, windows)
+
+    assert [alert["metric"] for alert in alerts] == ["error_rate"]
+    assert alerts[0]["value"] == 0.5
+    assert alerts[0]["baseline"] == pytest.approx(0.02)
+    assert alerts[0]["window_start"] == (START + timedelta(seconds=spike * anomaly.WINDOW)).isoformat()
+    assert alerts[0]["user_id"] == "u"
+    assert alerts[0]["endpoint"] == "patient.get_patient"
+
+
+def test_latency_spike(cache_conn):
+    windows = baseline()
+    spike = len(windows)
+    windows += [window(spike, resp_time=0.4), window(spike + 1)]
+
+    alerts = observe_windows(cache_conn, windows)
+
+    assert [alert["metric"] for alert in alerts] == ["latency"]
+    assert alerts[0]["value"] == pytest.approx(0.4)
+    assert alerts[0]["baseline"] == pytest.approx(0.1)
+
+
+def test_a_sustained_spike_alerts_once_until_it_recovers(cache_conn):
+    windows = baseline()
+    spike = len(windows)
+    windows += [window(spike + offset, errors=50) for offset in range(3)]
+    # Long enough for the baseline to settle back after absorbing the spike.
+    recovered = spike + 3 + 30
+    windows += [window(index) for index in range(spike + 3, recovered)]
+    windows += [window(recovered, errors=50), window(recovered + 1)]
+
+    alerts = observe_windows(cache_conn, windows)
+
+    assert [alert["window_start"] for alert in alerts] == [
+        (START + timedelta(seconds=index * anomaly.WINDOW)).isoformat() for index in (spike, recovered)]
+
+
+def test_nothing_is_scored_during_warmup(cache_conn):
+    windows = baseline(anomaly.WARMUP_WINDOWS - 1)
+    windows += [window(len(windows), errors=50), window(len(windows) + 1)]
+
+    assert observe_windows(cache_conn, windows) == []
+
+
+def test_small_windows_are_not_scored(cache_conn):
+    windows = baseline()
+    spike = len(windows)
+    windows += [window(spike, requests=anomaly.MIN_REQUESTS - 1, errors=anomaly.MIN_REQUESTS - 1), window(spike + 1)]
+
+    assert observe_windows(cache_conn, windows) == []
+
+
+def test_detectors_are_per_user_and_endpoint(cache_conn):
+    spike = anomaly.WARMUP_WINDOWS
+    alerts = []
+
+    for index in range(spike + 2):
+        noisy = window(index, user_id="v", errors=50 if index == spike else 2)
+        alerts += anomaly.observe(cache_conn, window(index) + noisy + window(index, endpoint=None))
+
+    assert [(alert["user_id"], alert["metric"]) for alert in alerts] == [("v", "error_rate")]
+    assert cache_conn.smembers(anomaly.REGISTRY_KEY) == {anomaly.detector_key("u", "patient.get_patient").encode(),
+                                                          anomaly.detector_key("u", None).encode(),
+                                                          anomaly.detector_key("v", "patient.get_patient").encode()}
+
+
+def test_late_logs_count_towards_the_open_window(cache_conn):
+    anomaly.observe(cache_conn, window(0, requests=10))
+    anomaly.observe(cache_conn, window(0, requests=5, errors=5))
+    key = anomaly.detector_key("u", "patient.get_patient")
+
+    assert cache_conn.hmget(key, "c", "e") == [b"15", b"7"]
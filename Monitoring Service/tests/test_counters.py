@@ -0,0 +1,119 @@
+from datetime import datetime, timezone
+import counters
+import fakeredis
+import pytest
+
+TS = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeConnection:
+    # Stands in for Postgres: remembers applied flush ids and the upserted rows.
+    def __init__(self):
+        self.flush_ids = set()
+        self.upserts = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = 0
+
+    def execute(self, query, params):
+        flush_id = params[0]
+        self.rowcount = 0 if flush_id in self.connection.flush_ids else 1
+        self.connection.flush_ids.add(flush_id)
+
+
+@pytest.fixture
+def cache_conn():
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = FakeConnection()
+    monkeypatch.setattr(counters, "execute_values",
+                        lambda cursor, query, rows, page_size: cursor.connection.upserts.extend(rows))
+    return conn
+
+
+def log(user_id, status_code):
+    return (user_id, "GET", "patient.get_patient", "/api/patients/1", status_code, TS, 0.01, "127.0.0.1", 1)
+
+
+def test_record_and_live_counts(cache_conn):
+    counters.record(cache_conn, [log("a", 200), log("a", 500), log("b", 302)])
+
+    assert counters.live_counts(cache_conn, "a") == {"total_req": 2, "success_resp": 1, "error_resp": 1}
+    assert counters.live_counts(cache_conn, "b") == {"total_req": 1, "success_resp": 1, "error_resp": 0}
+    assert counters.live_counts(cache_conn, "c") == {"total_req": 0, "success_resp": 0, "error_resp": 0}
+
+
+def test_flush_applies_and_clears_the_deltas(cache_conn, conn):
+    counters.record(cache_conn, [log("a", 200), log("a", 404), log("b", 200)])
+
+    assert counters.flush(conn, cache_conn) == 2
+    assert conn.upserts == [("a", 2, 1, 1), ("b", 1, 1, 0)]
+    assert not cache_conn.exists(counters.PENDING_KEY, counters.FLUSHING_KEY)
+    assert counters.flush(conn, cache_conn) == 0
+
+
+def test_deltas_recorded_during_a_flush_wait_for_the_next(cache_conn, conn):
+    counters.record(cache_conn, [log("a", 200)])
+    snapshot = cache_conn.eval(counters.CLAIM_SCRIPT, 2, counters.PENDING_KEY, counters.FLUSHING_KEY, "f1")
+    counters.record(cache_conn, [log("a", 500)])
+
+    assert dict(zip(snapshot[::2], snapshot[1::2]))[b"flush_id"] == b"f1"
+    # Both the claimed snapshot and the new delta are visible until the flush lands.
+    assert counters.live_counts(cache_conn, "a") == {"total_req": 2, "success_resp": 1, "error_resp": 1}
+
+
+def test_a_dead_flushers_snapshot_is_flushed_first(cache_conn, conn):
+    counters.record(cache_conn, [log("a", 200)])
+    cache_conn.eval(counters.CLAIM_SCRIPT, 2, counters.PENDING_KEY, counters.FLUSHING_KEY, "dead")
+    counters.record(cache_conn, [log("a", 500)])
+
+    counters.flush(conn, cache_conn)
+
+    assert conn.upserts == [("a", 1, 1, 0)]
+    assert conn.flush_ids == {"dead"}
+
+    counters.flush(conn, cache_conn)
+
+    assert conn.upserts == [("a", 1, 1, 0), ("a", 1, 0, 1)]
+
+
+def test_a_snapshot_is_applied_once(cache_conn, conn):
+    counters.record(cache_conn, [log("a", 200)])
+    cache_conn.eval(counters.CLAIM_SCRIPT, 2, counters.PENDING_KEY, counters.FLUSHING_KEY, "f1")
+    # Committed by a flusher that died before releasing the snapshot.
+    conn.flush_ids.add("f1")
+
+    counters.flush(conn, cache_conn)
+
+    assert conn.upserts == []
+    assert not cache_conn.exists(counters.FLUSHING_KEY)
+
+
+def test_release_only_deletes_its_own_snapshot(cache_conn):
+    counters.record(cache_conn, [log("a", 200)])
+    cache_conn.eval(counters.CLAIM_SCRIPT, 2, counters.PENDING_KEY, counters.FLUSHING_KEY, "f1")
+
+    assert cache_conn.eval(counters.RELEASE_SCRIPT, 1, counters.FLUSHING_KEY, "f2") == 0
+    assert cache_conn.exists(counters.FLUSHING_KEY)
+    assert cache_conn.eval(counters.RELEASE_SCRIPT, 1, counters.FLUSHING_KEY, "f1") == 1
+
+
+def test_apply_upserts_in_the_callers_transaction(conn):
+    counters.apply(conn.cursor(), [log("b", 200), log("a", 500), log("a", 200)])
+
+    assert conn.upserts == [("a", 2, 1, 1), ("b", 1, 1, 0)]
@@ -0,0 +1,67 @@
+from sketch import LatencySketch, RELATIVE_ACCURACY
+import random
+import pytest
+
+
+def exact_quantile(values, q):
+    # The same rank LatencySketch.quantile targets.
+    return sorted(values)[int(q * (len(values) - 1))]
+
+
+@pytest.fixture
+def latencies():
+    rng = random.Random(42)
+
+    return [rng.lognormvariate(-3, 1) for _ in range(10000)]
+
+
+def sketch_of(values):
+    sketch = LatencySketch()
+
+    for value in values:
+        sketch.add(value)
+
+    return sketch
+
+
+@pytest.mark.parametrize("q", [0.0, 0.5, 0.9, 0.95, 0.99, 1.0])
+def test_quantiles_are_within_the_relative_accuracy(latencies, q):
+    expected = exact_quantile(latencies, q)
+
+    assert sketch_of(latencies).quantile(q) == pytest.approx(expected, rel=RELATIVE_ACCURACY)
+
+
+def test_merge_matches_a_single_sketch(latencies):
+    merged = LatencySketch()
+
+    for start in range(0, len(latencies), 1000):
+        merged.merge(sketch_of(latencies[start:start + 1000]))
+
+    whole = sketch_of(latencies)
+
+    assert merged.count == whole.count == len(latencies)
+    assert merged.bins == whole.bins
+    assert merged.quantile(0.99) == whole.quantile(0.99)
+
+
+def test_zero_and_empty():
+    sketch = LatencySketch()
+
+    assert sketch.quantile(0.5) is None
+
+    sketch.add(0, count=3)
+    sketch.add(0.2)
+
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1.0) == pytest.approx(0.2, rel=RELATIVE_ACCURACY)
+
+
+def test_bytes_round_trip(latencies):
+    sketch = sketch_of(latencies)
+    sketch.add(0)
+
+    restored = LatencySketch.from_bytes(memoryview(sketch.to_bytes()))
+
+    assert restored.bins == sketch.bins
+    assert restored.zero_count == 1
+    assert LatencySketch.from_bytes(None).count == 0
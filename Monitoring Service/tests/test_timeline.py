@@ -0,0 +1,57 @@
+from datetime import datetime, timezone
+import timeline
+import pytest
+
+TS = datetime(2026, 1, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+
+
+def test_cursor_round_trip():
+    assert timeline.decode_cursor(timeline.encode_cursor(TS, 42)) == (TS, 42)
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", "Zm9v", timeline.encode_cursor(TS, 1)[:-4] + "!!!!"])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        timeline.decode_cursor(cursor)
+
+
+@pytest.mark.parametrize("value, expected", [("404", (404, 404)), ("5xx", (500, 599)), ("2XX", (200, 299))])
+def test_parse_status(value, expected):
+    assert timeline.parse_status(value) == expected
+
+
+@pytest.mark.parametrize("value", ["abc", "xx5", ""])
+def test_malformed_statuses_are_rejected(value):
+    with pytest.raises(ValueError):
+        timeline.parse_status(value)
+
+
+def test_parse_time_defaults_to_utc():
+    assert timeline.parse_time("2026-01-01T12:00:00") == datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+    assert timeline.parse_time("2026-01-01T12:00:00+02:00").utcoffset().total_seconds() == 7200
+
+
+def test_query_params():
+    cursor = timeline.encode_cursor(TS, 7)
+
+    params, limit = timeline.query_params("u", {"limit": "10", "cursor": cursor, "status": "4xx",
+                                                "endpoint": "patient.get_patient"})
+
+    assert limit == 10
+    assert params == ("u", None, None, TS, 7, 400, 499, "patient.get_patient", 11)
+
+
+@pytest.mark.parametrize("limit", ["0", str(timeline.MAX_LIMIT + 1)])
+def test_limit_is_bounded(limit):
+    with pytest.raises(ValueError):
+        timeline.query_params("u", {"limit": limit})
+
+
+def test_paginate():
+    rows = [(log_id, "GET", "e", "/p", 200, TS.replace(second=log_id)) for log_id in (5, 4, 3)]
+
+    page, cursor = timeline.paginate(rows, 2)
+
+    assert page == rows[:2]
+    assert timeline.decode_cursor(cursor) == (TS.replace(second=4), 4)
+    assert timeline.paginate(rows, 3) == (rows, None)
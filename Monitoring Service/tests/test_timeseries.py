@@ -0,0 +1,52 @@
+from partitions import MINUTE_ROLLUP_DAYS
+from datetime import datetime, timedelta, timezone
+import timeseries
+import pytest
+
+NOW = datetime(2026, 1, 10, 12, 0, 30, tzinfo=timezone.utc)
+
+
+class EmptyCursor:
+    def execute(self, query, params):
+        pass
+
+    def fetchall(self):
+        return []
+
+
+@pytest.mark.parametrize("start", [NOW - timedelta(minutes=timeseries.MAX_POINTS),
+                                   NOW.replace(second=0) - timedelta(minutes=timeseries.MAX_POINTS),
+                                   NOW - timedelta(minutes=timeseries.MAX_POINTS - 1),
+                                   NOW - timedelta(hours=7)])
+def test_series_never_exceeds_max_points(start):
+    bucket = timeseries.choose_bucket(start, NOW, "1m", now=NOW)
+    points = timeseries.series(EmptyCursor(), "u", start, NOW, bucket, ["requests"])
+
+    assert len(points) == timeseries.point_count(start, NOW, timeseries.BUCKETS[bucket][0])
+    assert len(points) <= timeseries.MAX_POINTS
+
+
+def test_unaligned_range_moves_to_a_coarser_bucket():
+    aligned = NOW.replace(second=0)
+
+    assert timeseries.choose_bucket(aligned - timedelta(minutes=timeseries.MAX_POINTS), aligned, "1m", now=NOW) == "1m"
+    assert timeseries.choose_bucket(NOW - timedelta(minutes=timeseries.MAX_POINTS), NOW, "1m", now=NOW) == "5m"
+
+
+def test_minute_buckets_only_within_minute_rollup_retention():
+    start = NOW - timedelta(days=MINUTE_ROLLUP_DAYS, hours=1)
+
+    assert timeseries.choose_bucket(start, start + timedelta(hours=2), "1m", now=NOW) == "1h"
+
+
+def test_unknown_bucket():
+    with pytest.raises(ValueError):
+        timeseries.choose_bucket(NOW - timedelta(hours=1), NOW, "2m", now=NOW)
+
+
+def test_series_fills_empty_buckets():
+    points = timeseries.series(EmptyCursor(), "u", NOW - timedelta(hours=3), NOW, "1h", ["requests", "error_rate", "p95"])
+
+    assert [point["ts"] for point in points] == [(NOW.replace(minute=0, second=0) - timedelta(hours=hours)).isoformat()
+                                                 for hours in (3, 2, 1, 0)]
+    assert points[0] == {"ts": points[0]["ts"], "requests": 0, "error_rate": None, "p95": None}
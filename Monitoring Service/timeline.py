@@ -0,0 +1,72 @@
+from datetime import datetime, timezone
+import base64
+import os
+
+DEFAULT_LIMIT = 7
+MAX_LIMIT = int(os.getenv("TIMELINE_MAX_LIMIT", 500))
+
+# Every filter is optional (NULL), so one prepared statement serves every variant and a
+# page is always a range scan of api_logs_timeline_idx starting at the cursor.
+TIMELINE_QUERY = """
+    SELECT id, method, endpoint, path, status_code, ts, resp_time, client_ip FROM api_logs
+    WHERE user_id = $1
+      AND ts >= COALESCE($2::timestamptz, '-infinity')
+      AND ts < COALESCE($3::timestamptz, 'infinity')
+      AND (ts, id) < (COALESCE($4::timestamptz, 'infinity'), COALESCE($5::bigint, 0))
+      AND ($6::int IS NULL OR status_code BETWEEN $6::int AND $7::int)
+      AND ($8::text IS NULL OR endpoint = $8::text)
+    ORDER BY ts DESC, id DESC
+    LIMIT $9::int
+"""
+
+
+def encode_cursor(ts, log_id):
+    return base64.urlsafe_b64encode(f"{ts.isoformat()}|{log_id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        ts, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(ts), int(log_id)
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+
+
+def parse_time(value):
+    ts = datetime.fromisoformat(value)
+    
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def parse_status(value):
+    # Either an exact code (404) or a class (4xx).
+    if len(value) == 3 and value[0].isdigit() and value[1:].lower() == "xx":
+        return int(value[0]) * 100, int(value[0]) * 100 + 99
+    
+    return int(value), int(value)
+
+
+def query_params(user_id, args):
+    # Raises ValueError for malformed arguments.
+    limit = int(args.get("limit", DEFAULT_LIMIT))
+    
+    if limit < 1 or limit > MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+    
+    start = parse_time(args["from"]) if args.get("from") else None
+    end = parse_time(args["to"]) if args.get("to") else None
+    after_ts, after_id = decode_cursor(args["cursor"]) if args.get("cursor") else (None, None)
+    status_low, status_high = parse_status(args["status"]) if args.get("status") else (None, None)
+    endpoint = args.get("endpoint") or None
+    
+    # One row past the page tells whether there is a next one.
+    return (user_id, start, end, after_ts, after_id, status_low, status_high, endpoint, limit + 1), limit
+
+
+def paginate(rows, limit):
+    if len(rows) <= limit:
+        return rows, None
+    
+    rows = rows[:limit]
+    
+    return rows, encode_cursor(rows[-1][5], rows[-1][0])
@@ -0,0 +1,128 @@
+from sketch import LatencySketch
+from timeline import parse_time
+from partitions import MINUTE_ROLLUP_DAYS
+from datetime import datetime, timedelta, timezone
+import math
+import os
+
+# name: (seconds, rollup table, its time column), finest first.
+BUCKETS = {
+    "1m": (60, "api_log_rollups_minute", "minute"),
+    "5m": (300, "api_log_rollups_minute", "minute"),
+    "15m": (900, "api_log_rollups_minute", "minute"),
+    "1h": (3600, "api_log_rollups", "hour"),
+    "6h": (21600, "api_log_rollups", "hour"),
+    "1d": (86400, "api_log_rollups", "hour"),
+}
+
+MAX_POINTS = int(os.getenv("TIMESERIES_MAX_POINTS", 500))
+DEFAULT_RANGE = timedelta(hours=24)
+
+QUANTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+METRICS = ("requests", "errors", "error_rate", "avg_latency", *QUANTILES)
+DEFAULT_METRICS = ("requests", "error_rate", "p95")
+
+# Buckets are aligned to the Unix epoch, i.e. to UTC minutes, hours and days.
+SERIES_QUERY = """
+    SELECT to_timestamp(floor(extract(epoch FROM {column}) / %(seconds)s) * %(seconds)s) AS bucket,
+           SUM(requests)::bigint, SUM(errors)::bigint, SUM(resp_time_sum), SUM(resp_time_count)::bigint{sketches}
+    FROM {table}
+    WHERE user_id = %(user_id)s AND {column} >= %(start)s AND {column} < %(end)s
+    GROUP BY bucket
+    ORDER BY bucket
+"""
+
+
+def first_bucket(start, seconds):
+    return datetime.fromtimestamp(start.timestamp() // seconds * seconds, tz=timezone.utc)
+
+
+def point_count(start, end, seconds):
+    # What series() returns: buckets from the one holding `start` up to `end`, exclusive.
+    return math.ceil((end - first_bucket(start, seconds)).total_seconds() / seconds)
+
+
+def choose_bucket(start, end, requested=None, now=None):
+    # The requested bucket, or the next coarser one if it would give more than
+    # MAX_POINTS points. Per-minute rollups only go back MINUTE_ROLLUP_DAYS.
+    now = now or datetime.now(timezone.utc)
+    names = list(BUCKETS)
+    
+    if requested is not None and requested not in BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(names)}")
+    
+    minute_floor = now - timedelta(days=MINUTE_ROLLUP_DAYS)
+    
+    for name in names[names.index(requested) if requested else 0:]:
+        seconds, table, _ = BUCKETS[name]
+        
+        if table == "api_log_rollups_minute" and start < minute_floor:
+            continue
+        
+        if point_count(start, end, seconds) <= MAX_POINTS:
+            return name
+        
+    raise ValueError(f"The range is too large for {MAX_POINTS} daily points")
+
+
+def query_params(args, now=None):
+    # Raises ValueError for malformed arguments.
+    now = now or datetime.now(timezone.utc)
+    end = parse_time(args["to"]) if args.get("to") else now
+    start = parse_time(args["from"]) if args.get("from") else end - DEFAULT_RANGE
+    
+    if start >= end:
+        raise ValueError("from must be before to")
+    
+    metrics = args.get("metric", ",".join(DEFAULT_METRICS)).split(",")
+    
+    for metric in metrics:
+        if metric not in METRICS:
+            raise ValueError(f"metric must be among {', '.join(METRICS)}")
+        
+    return start, end, choose_bucket(start, end, args.get("bucket"), now), metrics
+
+
+def series(cursor, user_id, start, end, bucket, metrics):
+    seconds, table, column = BUCKETS[bucket]
+    with_sketches = any(metric in QUANTILES for metric in metrics)
+    
+    first = first_bucket(start, seconds)
+    
+    cursor.execute(SERIES_QUERY.format(table=table, column=column,
+                                       sketches=", array_agg(sketch)" if with_sketches else ""),
+                   {"seconds": seconds, "user_id": user_id, "start": first, "end": end})
+    
+    rows = {row[0]: row for row in cursor.fetchall()}
+    points = []
+    ts = first
+    
+    # Buckets without traffic are filled in so charts get an evenly spaced series.
+    while ts < end:
+        row = rows.get(ts)
+        requests, errors, resp_sum, resp_count = row[1:5] if row else (0, 0, 0.0, 0)
+        point = {"ts": ts.isoformat()}
+        
+        if with_sketches:
+            sketch = LatencySketch()
+            
+            for stored in (row[5] if row else ()):
+                sketch.merge(LatencySketch.from_bytes(stored))
+                
+        for metric in metrics:
+            if metric == "requests":
+                point[metric] = requests
+            elif metric == "errors":
+                point[metric] = errors
+            elif metric == "error_rate":
+                point[metric] = round(errors / requests, 4) if requests else None
+            elif metric == "avg_latency":
+                point[metric] = round(resp_sum / resp_count, 6) if resp_count else None
+            else:
+                value = sketch.quantile(QUANTILES[metric])
+                point[metric] = round(value, 6) if value is not None else None
+                
+        points.append(point)
+        ts += timedelta(seconds=seconds)
+        
+    return points
@@ -0,0 +1,50 @@
+from gunicorn.app.base import BaseApplication
+from dotenv import load_dotenv
+import multiprocessing
+import os
+
+load_dotenv()
+
+
+def post_fork(arbiter, worker):
+    import main
+    main.init_clients()
+
+
+def worker_exit(arbiter, worker):
+    import main
+    main.close_clients()
+
+
+class Application(BaseApplication):
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from main import service
+        return service
+
+
+options = {
+    "bind": os.getenv("WEB_BIND", "0.0.0.0:8000"),
+    "workers": int(os.getenv("WEB_WORKERS", multiprocessing.cpu_count() * 2 + 1)),
+    # /stream responses hold a thread for as long as the dashboard is open; dashboards
+    # at scale should use stream_app.py instead.
+    "threads": int(os.getenv("WEB_THREADS", 8)),
+    "worker_class": "gthread",
+    "timeout": int(os.getenv("WEB_TIMEOUT", 30)),
+    "graceful_timeout": int(os.getenv("WEB_GRACEFUL_TIMEOUT", 30)),
+    "keepalive": int(os.getenv("WEB_KEEPALIVE", 5)),
+    "preload_app": True,
+    "post_fork": post_fork,
+    "worker_exit": worker_exit,
+}
+
+
+if __name__ == "__main__":
+    Application(options).run()
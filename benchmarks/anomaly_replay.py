@@ -0,0 +1,148 @@
+from common import monitoring_path, pg_dsn, redis_url, user_ids, synthetic_log, percentiles
+from datetime import datetime, timedelta, timezone
+import argparse
+import random
+import time
+import redis
+import psycopg2
+
+monitoring_path()
+
+from ingest import parse_log
+import anomaly
+
+# Detector state for the replay is kept apart from the live detectors.
+PREFIX = "anomaly:bench:"
+
+REPLAY_QUERY = """
+    SELECT user_id, method, endpoint, path, status_code, ts, resp_time, client_ip FROM api_logs
+    WHERE ts >= %s ORDER BY ts
+"""
+
+
+def reset(cache_conn):
+    keys = list(cache_conn.scan_iter(f"{PREFIX}*", count=1000))
+    
+    for start in range(0, len(keys), 1000):
+        cache_conn.delete(*keys[start:start + 1000])
+
+
+def historical_batches(dsn, days, batch_size):
+    conn = psycopg2.connect(dsn)
+    cursor = conn.cursor(name="anomaly_replay")
+    cursor.itersize = batch_size
+    cursor.execute(REPLAY_QUERY, (datetime.now(timezone.utc) - timedelta(days=days),))
+    
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            
+            if not rows:
+                break
+            
+            yield rows
+    finally:
+        conn.close()
+        
+        
+def synthetic_batches(users, start, minutes, per_minute, spike_user, spike_at, spike_error_rate, batch_size):
+    # Steady 5% errors everywhere, except `spike_user` from minute `spike_at` on.
+    # The spiking user gets half of all traffic so its detectors are past warm-up.
+    weighted = [spike_user] * len(users) + users
+    batch = []
+    
+    for minute in range(minutes):
+        for index in range(per_minute):
+            when = start + timedelta(minutes=minute, seconds=60 * index / per_minute)
+            log = synthetic_log(weighted, when=when)
+            
+            if minute >= spike_at and log["user_id"] == spike_user and random.random() < spike_error_rate:
+                log["response"] = {"status_code": 500}
+                
+            batch.append(parse_log(log))
+            
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+                
+    if batch:
+        yield batch
+
+
+def replay(cache_conn, batches):
+    alerts = []
+    rows = 0
+    latencies = []
+    started = time.perf_counter()
+    
+    for batch in batches:
+        batch_started = time.perf_counter()
+        alerts.extend(anomaly.observe(cache_conn, batch, PREFIX))
+        latencies.append(time.perf_counter() - batch_started)
+        rows += len(batch)
+        
+    return rows, time.perf_counter() - started, latencies, alerts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay logs through the anomaly detectors")
+    parser.add_argument("--dsn", default=pg_dsn())
+    parser.add_argument("--redis", default=redis_url())
+    parser.add_argument("--days", type=int, default=7, help="How much of api_logs to replay")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--synthetic", action="store_true", help="Generate logs with an injected error spike instead")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--minutes", type=int, default=120)
+    parser.add_argument("--per-minute", type=int, default=2000)
+    parser.add_argument("--spike-at", type=int, default=90, help="Minute the synthetic error spike starts")
+    parser.add_argument("--spike-error-rate", type=float, default=0.5)
+    args = parser.parse_args()
+    
+    cache_conn = redis.Redis.from_url(args.redis)
+    reset(cache_conn)
+    
+    if args.synthetic:
+        users = user_ids(args.users)
+        start = datetime.now() - timedelta(minutes=args.minutes)
+        batches = synthetic_batches(users, start, args.minutes, args.per_minute, users[0], args.spike_at,
+                                    args.spike_error_rate, args.batch_size)
+    else:
+        batches = historical_batches(args.dsn, args.days, args.batch_size)
+        
+    rows, elapsed, latencies, alerts = replay(cache_conn, batches)
+    detectors = cache_conn.scard(f"{PREFIX}detectors")
+    batch_latency = percentiles(latencies) if latencies else {}
+    
+    print(f"rows={rows:,} detectors={detectors:,} elapsed={elapsed:.2f}s "
+          f"throughput={rows / elapsed if elapsed else 0:,.0f} rows/s batch={batch_latency}")
+    
+    by_metric = {}
+    
+    for alert in alerts:
+        by_metric[alert["metric"]] = by_metric.get(alert["metric"], 0) + 1
+        
+    print(f"alerts={len(alerts)} {by_metric}")
+    
+    if args.synthetic:
+        spike_start = (start + timedelta(minutes=args.spike_at)).astimezone(timezone.utc)
+        spike_window = spike_start.replace(second=0, microsecond=0)
+        spike_alerts = [alert for alert in alerts
+                        if alert["user_id"] == users[0] and alert["metric"] == "error_rate"
+                        and datetime.fromisoformat(alert["window_start"]) >= spike_window]
+        false_positives = [alert for alert in alerts if alert not in spike_alerts and alert["metric"] == "error_rate"]
+        
+        if spike_alerts:
+            # The spike's window is only scored once it closes, so the delay is counted to the window's end.
+            detected = min(datetime.fromisoformat(alert["window_start"]) for alert in spike_alerts)
+            delay = detected + timedelta(seconds=anomaly.WINDOW) - spike_start
+            print(f"spike detected on {len(spike_alerts)} endpoint(s), delay={delay.total_seconds():.0f}s")
+        else:
+            print("spike not detected")
+            
+        print(f"false positive error_rate alerts={len(false_positives)}")
+        
+    reset(cache_conn)
+    
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+from serving import start_server, stop_server, wait_until_ready
+import argparse
+import asyncio
+import statistics
+import time
+import os
+import httpx
+
+
+async def run_load(url, total, concurrency, headers):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        async def call():
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(url, headers=headers)
+                    if response.status_code >= 500:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(call() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def percentile(p):
+        return round(latencies[max(int(len(latencies) * p) - 1, 0)] * 1000, 2)
+
+    return {
+        "requests": total,
+        "errors": errors,
+        "throughput": round(total / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(latencies[-1] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Side-by-side load test of the Flask (gunicorn) "
+                                                 "and ASGI (uvicorn) Healthcare API")
+    parser.add_argument("--path", default="/api/patients")
+    parser.add_argument("--api-key", default=os.getenv("BENCH_API_KEY"))
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[64, 512, 2048])
+    parser.add_argument("--startup-timeout", type=int, default=60)
+    args = parser.parse_args()
+
+    url = f"http://127.0.0.1:8002{args.path}"
+    headers = {"Authorization": args.api_key} if args.api_key else {}
+
+    for mode in ("wsgi", "asgi"):
+        process = start_server("api", mode)
+        try:
+            wait_until_ready(url, args.startup_timeout)
+            for concurrency in args.concurrency:
+                result = asyncio.run(run_load(url, args.requests, concurrency, headers))
+                print(f"{mode:>5} c={concurrency:<5}: {result['throughput']} req/s | p50 {result['p50_ms']}ms | "
+                      f"p95 {result['p95_ms']}ms | p99 {result['p99_ms']}ms | max {result['max_ms']}ms | "
+                      f"{result['errors']} errors")
+        finally:
+            stop_server(process)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+import random
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+MONITORING_DIR = os.path.join(ROOT, "Monitoring Service")
+
+ENDPOINTS = [("patient.get_patient", "GET", "/api/patients/{}"),
+             ("patient.add_patient", "POST", "/api/patients"),
+             ("doctor.get_all_doctors", "GET", "/api/doctors"),
+             ("appointment.book_appointment", "POST", "/api/appointments"),
+             ("opd_record.get_all_opd_of_patient", "GET", "/api/opd/{}")]
+
+
+def monitoring_path():
+    if MONITORING_DIR not in sys.path:
+        sys.path.insert(0, MONITORING_DIR)
+
+
+def pg_dsn():
+    return os.getenv("BENCH_PG_DSN", "dbname=monitoring_bench user=postgres host=localhost")
+
+
+def redis_url():
+    # Same database the Monitoring Service uses for the log stream and counters.
+    return os.getenv("BENCH_REDIS_URL", "redis://localhost:6379/1")
+
+
+def user_ids(count):
+    return [f"{index:024x}" for index in range(1, count + 1)]
+
+
+def synthetic_log(users, when=None, error_rate=0.05):
+    when = when or datetime.now()
+    endpoint, method, path = random.choice(ENDPOINTS)
+    status_code = random.choice((400, 401, 404, 500)) if random.random() < error_rate else 200
+
+    response = {"status_code": status_code}
+    if status_code != 500:
+        response["response_time"] = str(random.lognormvariate(-3.5, 0.8))
+
+    return {
+        "user_id": random.choice(users),
+        "request": {
+            "endpoint": endpoint,
+            "method": method,
+            "path": path.format(random.randint(1, 10 ** 6)),
+            "client_ip": "127.0.0.1",
+            "date": when.date().isoformat(),
+            "time": when.timestamp()
+        },
+        "response": response
+    }
+
+
+def synthetic_logs(count, users, start=None, span=timedelta(days=30)):
+    start = start or datetime.now() - span
+    step = span / max(count, 1)
+
+    return [synthetic_log(users, when=start + step * index) for index in range(count)]
+
+
+def percentiles(samples, points=(0.5, 0.95, 0.99)):
+    samples = sorted(samples)
+    result = {}
+
+    for point in points:
+        index = min(int(round(point * (len(samples) - 1))), len(samples) - 1)
+        result[f"p{int(point * 100)}_ms"] = round(samples[index] * 1000, 3)
+
+    return result
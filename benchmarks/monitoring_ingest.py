@@ -0,0 +1,81 @@
+from common import monitoring_path, pg_dsn, user_ids, synthetic_logs
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import time
+import psycopg2
+
+monitoring_path()
+
+from ingest import parse_log, write_logs
+import rollups
+
+
+def ingest_single(conn, logs, defer_rollups=False):
+    cursor = conn.cursor()
+
+    for log in logs:
+        write_logs(cursor, [parse_log(log)], defer_rollups=defer_rollups)
+        conn.commit()
+
+
+def ingest_concurrent(dsn, logs, workers, defer_rollups):
+    # What /api/logs sees under load: one log per transaction from several connections.
+    conns = [psycopg2.connect(dsn) for _ in range(workers)]
+
+    try:
+        with ThreadPoolExecutor(workers) as executor:
+            list(executor.map(lambda index: ingest_single(conns[index], logs[index::workers], defer_rollups),
+                              range(workers)))
+
+        # Deferred rows still have to reach the rollups; timed as part of the run.
+        if defer_rollups:
+            rollups.fold_pending(conns[0])
+    finally:
+        for conn in conns:
+            conn.close()
+
+
+def ingest_batched(conn, logs, batch_size):
+    cursor = conn.cursor()
+
+    for start in range(0, len(logs), batch_size):
+        write_logs(cursor, [parse_log(log) for log in logs[start:start + batch_size]])
+        conn.commit()
+
+
+def reset(conn):
+    cursor = conn.cursor()
+    cursor.execute("TRUNCATE api_logs, api_log_rollups, api_log_rollups_minute, api_log_rollup_pending, request_count")
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rows/second of per-log vs batched ingest into a local Postgres")
+    parser.add_argument("--dsn", default=pg_dsn())
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--workers", type=int, default=8, help="Connections for the concurrent single-log runs")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(args.dsn)
+    logs = synthetic_logs(args.rows, user_ids(args.users))
+
+    runs = [("single", lambda: ingest_single(conn, logs)),
+            (f"single x{args.workers}", lambda: ingest_concurrent(args.dsn, logs, args.workers, False)),
+            (f"deferred x{args.workers}", lambda: ingest_concurrent(args.dsn, logs, args.workers, True))]
+    runs += [(f"batch={size}", lambda size=size: ingest_batched(conn, logs, size)) for size in args.batch_sizes]
+
+    for name, run in runs:
+        reset(conn)
+        started = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - started
+        print(f"{name:>14}: {args.rows / elapsed:,.0f} rows/s ({elapsed:.2f}s)")
+
+    reset(conn)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
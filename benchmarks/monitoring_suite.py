@@ -0,0 +1,275 @@
+from common import monitoring_path, pg_dsn, user_ids, synthetic_logs, percentiles, ENDPOINTS
+from monitoring_timeline import LOAD_QUERY
+from datetime import datetime, timedelta, timezone
+import subprocess
+import platform
+import argparse
+import time
+import json
+import psycopg2
+
+monitoring_path()
+
+from migrate import migrate
+from ingest import parse_log, write_logs
+import partitions
+import rollups
+import timeline
+
+# The same statements the routes run, so each timing is what a request would spend in Postgres.
+REQUEST_COUNT_QUERY = "SELECT total_req, success_resp, error_resp FROM request_count WHERE user_id = %s"
+
+# request_count is normally maintained by the counter flusher; here it's derived once per scale.
+REQUEST_COUNT_REFRESH = """
+    INSERT INTO request_count(user_id, total_req, success_resp, error_resp)
+    SELECT user_id, COUNT(*), COUNT(*) FILTER (WHERE status_code >= 200 AND status_code < 400),
+           COUNT(*) FILTER (WHERE status_code < 200 OR status_code >= 400)
+    FROM api_logs GROUP BY user_id
+    ON CONFLICT (user_id) DO UPDATE SET total_req = EXCLUDED.total_req,
+        success_resp = EXCLUDED.success_resp, error_resp = EXCLUDED.error_resp
+"""
+
+NEW_LOGS_QUERY = """
+    SELECT user_id, method, endpoint, path, status_code, ts, resp_time, client_ip, sample_weight
+    FROM api_logs WHERE id > %s
+"""
+
+TIMELINE_PARAMS = "(%s, %s, %s, %s, %s, %s, %s, %s, %s)"
+
+
+def reset(conn):
+    cursor = conn.cursor()
+    cursor.execute("TRUNCATE api_logs, api_log_rollups, api_log_rollups_minute, request_count")
+    conn.commit()
+
+
+def max_id(cursor):
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM api_logs")
+
+    return cursor.fetchone()[0]
+
+
+def grow(conn, rows, users, days):
+    # Appends `rows` generated logs spread over the last `days` days and folds just
+    # those into the rollups, so each scale builds on the previous one.
+    cursor = conn.cursor()
+    end = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=days)
+    existing = partitions.existing_partitions(cursor)
+
+    for offset in range(days + 2):
+        day = (start + timedelta(days=offset)).date()
+
+        if day not in existing:
+            partitions.create_partition(cursor, day)
+
+    conn.commit()
+
+    after_id = max_id(cursor)
+    per_day = rows // days
+    endpoints = [endpoint for endpoint, _, _ in ENDPOINTS]
+
+    for offset in range(days):
+        cursor.execute(LOAD_QUERY, {"users": users,
+                                    "endpoints": endpoints,
+                                    "endpoint_count": len(endpoints),
+                                    "rows": per_day,
+                                    "start": start + timedelta(days=offset),
+                                    "step": timedelta(days=1) / per_day})
+        conn.commit()
+
+    logs = conn.cursor(name="suite_new_logs")
+    logs.itersize = rollups.REBUILD_CHUNK_SIZE
+    logs.execute(NEW_LOGS_QUERY, (after_id,))
+
+    while batch := logs.fetchmany(rollups.REBUILD_CHUNK_SIZE):
+        rollups.apply(cursor, batch)
+
+    logs.close()
+    cursor.execute(REQUEST_COUNT_REFRESH)
+    conn.commit()
+
+    conn.autocommit = True
+    cursor.execute("VACUUM ANALYZE api_logs")
+    conn.autocommit = False
+
+
+def measure_ingest(conn, logs, batch_size):
+    cursor = conn.cursor()
+    calls = []
+    started = time.perf_counter()
+
+    for start in range(0, len(logs), batch_size):
+        call_started = time.perf_counter()
+        write_logs(cursor, [parse_log(log) for log in logs[start:start + batch_size]])
+        conn.commit()
+        calls.append(time.perf_counter() - call_started)
+
+    elapsed = time.perf_counter() - started
+
+    return dict({"rows": len(logs),
+                 "batch_size": batch_size,
+                 "rows_per_second": round(len(logs) / elapsed, 1)},
+                **percentiles(calls))
+
+
+def measure(samples, run):
+    latencies = []
+
+    for _ in range(samples):
+        started = time.perf_counter()
+        run()
+        latencies.append(time.perf_counter() - started)
+
+    return percentiles(latencies)
+
+
+def measure_queries(conn, users, limit, samples):
+    cursor = conn.cursor()
+    heavy, light = user_ids(users)[0], user_ids(users)[-1]
+    results = {}
+
+    def timeline_page(user_id, args):
+        params, _ = timeline.query_params(user_id, args)
+        cursor.execute(f"EXECUTE suite_timeline {TIMELINE_PARAMS}", params)
+        return cursor.fetchall()
+
+    # Ten pages deep on the busiest user, following the cursor as the portal does.
+    params, page_limit = timeline.query_params(heavy, {"limit": limit})
+    page_cursor = None
+
+    for _ in range(9):
+        cursor.execute(f"EXECUTE suite_timeline {TIMELINE_PARAMS}", params)
+        _, page_cursor = timeline.paginate(cursor.fetchall(), page_limit)
+
+        if page_cursor is None:
+            break
+
+        params, page_limit = timeline.query_params(heavy, {"limit": limit, "cursor": page_cursor})
+
+    deep_args = {"limit": limit, "cursor": page_cursor} if page_cursor else {"limit": limit}
+
+    results["get_api_logs"] = measure(samples, lambda: timeline_page(heavy, {"limit": limit}))
+    results["get_api_logs_light_user"] = measure(samples, lambda: timeline_page(light, {"limit": limit}))
+    results["get_api_logs_page_10"] = measure(samples, lambda: timeline_page(heavy, deep_args))
+    results["get_api_logs_5xx"] = measure(samples, lambda: timeline_page(heavy, {"limit": limit, "status": "5xx"}))
+    results["get_req_count"] = measure(samples, lambda: (cursor.execute(REQUEST_COUNT_QUERY, (heavy,)),
+                                                         cursor.fetchone()))
+    results["api_analysis"] = measure(samples, lambda: rollups.analysis(cursor))
+
+    conn.rollback()
+
+    return results
+
+
+def table_size(cursor):
+    cursor.execute("""SELECT COALESCE(SUM(pg_total_relation_size(inhrelid)), 0)
+                      FROM pg_inherits WHERE inhparent = 'api_logs'::regclass""")
+
+    return cursor.fetchone()[0]
+
+
+def environment(cursor):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    cursor.execute("SHOW server_version")
+
+    return {"commit": commit,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "postgres": cursor.fetchone()[0],
+            "host": platform.node()}
+
+
+def compare(previous, current):
+    # Ratio of current to previous p50 (latency) or rows/s (ingest) per scale; > 1 is
+    # slower for latency and faster for ingest.
+    previous = {scale["rows"]: scale for scale in previous["scales"]}
+
+    for scale in current["scales"]:
+        before = previous.get(scale["rows"])
+
+        if before is None:
+            continue
+
+        for name, result in scale["queries"].items():
+            if name in before["queries"]:
+                print(f"{scale['rows']:>12,} {name:>24}: p50 x{result['p50_ms'] / max(before['queries'][name]['p50_ms'], 1e-3):.2f}")
+
+        for name, result in scale["ingest"].items():
+            if name in before["ingest"]:
+                print(f"{scale['rows']:>12,} {'ingest ' + name:>24}: rows/s x{result['rows_per_second'] / before['ingest'][name]['rows_per_second']:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest throughput and query latency of the Monitoring Service "
+                                                 "at growing api_logs sizes, written as JSON")
+    parser.add_argument("--dsn", default=pg_dsn())
+    parser.add_argument("--scales", type=int, nargs="+", default=[1_000_000, 10_000_000, 100_000_000])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--ingest-rows", type=int, default=20000)
+    parser.add_argument("--single-rows", type=int, default=2000, help="Logs ingested one per commit, as POST /api/logs does")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--output", default="monitoring_suite.json")
+    parser.add_argument("--compare", help="A previous result file to print ratios against")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(args.dsn)
+    migrate(conn)
+    reset(conn)
+
+    cursor = conn.cursor()
+    cursor.execute(f"PREPARE suite_timeline AS {timeline.TIMELINE_QUERY}")
+    conn.commit()
+
+    report = {"environment": environment(cursor),
+              "parameters": {key: value for key, value in vars(args).items() if key not in ("dsn", "output", "compare")},
+              "scales": []}
+    conn.rollback()
+
+    loaded = 0
+
+    for scale in sorted(set(args.scales)):
+        started = time.perf_counter()
+        grow(conn, scale - loaded, args.users, args.days)
+        load_seconds = time.perf_counter() - started
+        loaded = scale
+
+        # Ingested at the current time on top of the loaded history; these rows stay,
+        # but are a rounding error next to the scale.
+        logs = synthetic_logs(args.ingest_rows, user_ids(args.users), start=datetime.now(), span=timedelta(minutes=1))
+        ingest = {"single": measure_ingest(conn, logs[:args.single_rows], 1)}
+        ingest.update({f"batch_{size}": measure_ingest(conn, logs, size) for size in args.batch_sizes})
+
+        result = {"rows": scale,
+                  "load_seconds": round(load_seconds, 1),
+                  "table_bytes": table_size(cursor),
+                  "ingest": ingest,
+                  "queries": measure_queries(conn, args.users, args.limit, args.samples)}
+        conn.rollback()
+        report["scales"].append(result)
+
+        print(f"{scale:>12,} rows: " + " | ".join(f"ingest {name} {value['rows_per_second']:,.0f} rows/s"
+                                                   for name, value in ingest.items()))
+        print(" " * 19 + " | ".join(f"{name} p50 {value['p50_ms']}ms p99 {value['p99_ms']}ms"
+                                    for name, value in result["queries"].items()))
+
+        # Rewritten after every scale so a long run that's interrupted still leaves results.
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+    conn.close()
+
+    if args.compare:
+        with open(args.compare) as previous:
+            compare(json.load(previous), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+from common import monitoring_path, pg_dsn, user_ids, percentiles, ENDPOINTS
+from datetime import datetime, timedelta, timezone
+import argparse
+import time
+import psycopg2
+
+monitoring_path()
+
+from migrate import migrate
+import partitions
+import timeline
+
+# Skewed so low user ids (the first one especially) have far more logs than the rest.
+LOAD_QUERY = """
+    INSERT INTO api_logs(user_id, method, endpoint, path, status_code, ts, resp_time, client_ip)
+    SELECT lpad(to_hex(1 + floor(random() * random() * %(users)s)::int), 24, '0'),
+           'GET',
+           (%(endpoints)s::text[])[1 + floor(random() * %(endpoint_count)s)::int],
+           '/api/patients/' || i,
+           CASE WHEN random() < 0.05 THEN 500 ELSE 200 END,
+           %(start)s::timestamptz + i * %(step)s::interval,
+           random() * 0.2,
+           '127.0.0.1'
+    FROM generate_series(0, %(rows)s - 1) AS i
+"""
+
+OFFSET_QUERY = """
+    SELECT id, method, endpoint, path, status_code, ts, resp_time, client_ip FROM api_logs
+    WHERE user_id = %s ORDER BY ts DESC, id DESC LIMIT %s OFFSET %s
+"""
+
+
+def load(conn, rows, users, days):
+    cursor = conn.cursor()
+    end = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=days)
+    existing = partitions.existing_partitions(cursor)
+    
+    cursor.execute("TRUNCATE api_logs")
+    
+    for offset in range(days):
+        day = (start + timedelta(days=offset)).date()
+        
+        if day not in existing:
+            partitions.create_partition(cursor, day)
+            
+    conn.commit()
+    
+    # One day per statement keeps transactions a manageable size.
+    per_day = rows // days
+    endpoints = [endpoint for endpoint, _, _ in ENDPOINTS]
+    
+    for offset in range(days):
+        cursor.execute(LOAD_QUERY, {"users": users,
+                                    "endpoints": endpoints,
+                                    "endpoint_count": len(endpoints),
+                                    "rows": per_day,
+                                    "start": start + timedelta(days=offset),
+                                    "step": timedelta(days=1) / per_day})
+        conn.commit()
+        print(f"loaded day {offset + 1}/{days}")
+        
+    # VACUUM sets the visibility map so pages can be served by index-only scans.
+    conn.autocommit = True
+    cursor.execute("VACUUM ANALYZE api_logs")
+    conn.autocommit = False
+
+
+def timed(cursor, query, params):
+    started = time.perf_counter()
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    
+    return time.perf_counter() - started, rows
+
+
+def walk_keyset(cursor, user_id, args, depths):
+    results = {}
+    page_cursor = None
+    
+    for page in range(1, max(depths) + 1):
+        query_args = {"limit": args.limit}
+        
+        if page_cursor:
+            query_args["cursor"] = page_cursor
+            
+        params, limit = timeline.query_params(user_id, query_args)
+        elapsed, rows = timed(cursor, "EXECUTE bench_timeline (%s, %s, %s, %s, %s, %s, %s, %s, %s)", params)
+        rows, page_cursor = timeline.paginate(rows, limit)
+        
+        if page in depths:
+            samples = [elapsed]
+            samples += [timed(cursor, "EXECUTE bench_timeline (%s, %s, %s, %s, %s, %s, %s, %s, %s)", params)[0]
+                        for _ in range(args.samples - 1)]
+            results[page] = percentiles(samples)
+            
+        if page_cursor is None:
+            break
+        
+    return results
+
+
+def walk_offset(cursor, user_id, args, depths):
+    return {page: percentiles([timed(cursor, OFFSET_QUERY, (user_id, args.limit, (page - 1) * args.limit))[0]
+                               for _ in range(args.samples)])
+            for page in depths}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Timeline page latency by depth, keyset cursor vs OFFSET")
+    parser.add_argument("--dsn", default=pg_dsn())
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--skip-load", action="store_true")
+    args = parser.parse_args()
+    
+    conn = psycopg2.connect(args.dsn)
+    migrate(conn)
+    
+    if not args.skip_load:
+        load(conn, args.rows, args.users, args.days)
+        
+    cursor = conn.cursor()
+    cursor.execute(f"PREPARE bench_timeline AS {timeline.TIMELINE_QUERY}")
+    
+    user_id = user_ids(1)[0]
+    cursor.execute("SELECT COUNT(*) FROM api_logs WHERE user_id = %s", (user_id,))
+    print(f"user {user_id} has {cursor.fetchone()[0]:,} logs")
+    
+    params, _ = timeline.query_params(user_id, {"limit": args.limit})
+    cursor.execute("EXPLAIN EXECUTE bench_timeline (%s, %s, %s, %s, %s, %s, %s, %s, %s)", params)
+    print("\n".join(row[0] for row in cursor.fetchall()[:6]))
+    
+    keyset = walk_keyset(cursor, user_id, args, set(args.depths))
+    offset = walk_offset(cursor, user_id, args, sorted(keyset))
+    
+    print(f"\n{'page':>6} {'keyset p50/p99 ms':>22} {'offset p50/p99 ms':>22}")
+    for page in sorted(keyset):
+        print(f"{page:>6} {keyset[page]['p50_ms']:>10} / {keyset[page]['p99_ms']:<9} "
+              f"{offset[page]['p50_ms']:>10} / {offset[page]['p99_ms']:<9}")
+        
+    for name, filters in (("status=5xx", {"status": "5xx"}),
+                          ("endpoint", {"endpoint": ENDPOINTS[0][0]}),
+                          ("last day", {"from": (datetime.now(timezone.utc) - timedelta(days=1)).isoformat()})):
+        params, _ = timeline.query_params(user_id, dict(filters, limit=args.limit))
+        samples = [timed(cursor, "EXECUTE bench_timeline (%s, %s, %s, %s, %s, %s, %s, %s, %s)", params)[0]
+                   for _ in range(args.samples)]
+        print(f"{name:>12}: {percentiles(samples)}")
+        
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
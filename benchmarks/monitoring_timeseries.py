@@ -0,0 +1,110 @@
+from common import monitoring_path, pg_dsn, user_ids, synthetic_logs, percentiles
+from datetime import datetime, timedelta, timezone
+import argparse
+import json
+import time
+import psycopg2
+
+monitoring_path()
+
+from migrate import migrate
+from ingest import parse_log, write_logs
+import partitions
+import timeseries
+
+RAW_QUERY = """
+    SELECT method, endpoint, path, status_code, ts, resp_time, client_ip FROM api_logs
+    WHERE user_id = %s AND ts >= %s AND ts < %s ORDER BY ts
+"""
+
+
+def load(conn, rows, users, days, batch_size):
+    cursor = conn.cursor()
+    cursor.execute("TRUNCATE api_logs, api_log_rollups, api_log_rollups_minute")
+    
+    existing = partitions.existing_partitions(cursor)
+    today = datetime.now(timezone.utc).date()
+    
+    for offset in range(-days, 2):
+        day = today + timedelta(days=offset)
+        
+        if day not in existing:
+            partitions.create_partition(cursor, day)
+            
+    conn.commit()
+    
+    # The first user gets half of all traffic so its charts are the expensive ones.
+    weighted = [users[0]] * len(users) + users
+    logs = synthetic_logs(rows, weighted, start=datetime.now() - timedelta(days=days), span=timedelta(days=days))
+    
+    for start in range(0, len(logs), batch_size):
+        write_logs(cursor, [parse_log(log) for log in logs[start:start + batch_size]])
+        conn.commit()
+
+
+def timed(samples, run):
+    latencies = []
+    
+    for _ in range(samples):
+        started = time.perf_counter()
+        body = run()
+        latencies.append(time.perf_counter() - started)
+        
+    return percentiles(latencies), len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and response size of /api/timeseries vs pulling raw rows")
+    parser.add_argument("--dsn", default=pg_dsn())
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--skip-load", action="store_true")
+    args = parser.parse_args()
+    
+    conn = psycopg2.connect(args.dsn)
+    migrate(conn)
+    
+    if not args.skip_load:
+        load(conn, args.rows, user_ids(args.users), args.days, args.batch_size)
+        
+    cursor = conn.cursor()
+    user_id = user_ids(args.users)[0]
+    end = datetime.now(timezone.utc)
+    
+    print(f"{'range':>6} {'bucket':>6} {'points':>6} {'series p50/p99 ms':>20} {'bytes':>8}"
+          f" {'raw rows':>9} {'raw p50/p99 ms':>18} {'raw bytes':>11}")
+    
+    for hours in (1, 24, 24 * 7, 24 * 30):
+        if hours > args.days * 24:
+            break
+        
+        start = end - timedelta(hours=hours)
+        bucket = timeseries.choose_bucket(start, end)
+        
+        def run_series():
+            points = timeseries.series(cursor, user_id, start, end, bucket, list(timeseries.METRICS))
+            return json.dumps({"bucket": bucket, "points": points})
+        
+        def run_raw():
+            cursor.execute(RAW_QUERY, (user_id, start, end))
+            return json.dumps(cursor.fetchall(), default=str)
+        
+        series_latency, series_bytes = timed(args.samples, run_series)
+        raw_latency, raw_bytes = timed(max(args.samples // 4, 1), run_raw)
+        cursor.execute("SELECT COUNT(*) FROM api_logs WHERE user_id = %s AND ts >= %s AND ts < %s",
+                       (user_id, start, end))
+        raw_rows = cursor.fetchone()[0]
+        points = json.loads(run_series())["points"]
+        
+        print(f"{hours:>5}h {bucket:>6} {len(points):>6} "
+              f"{series_latency['p50_ms']:>9} / {series_latency['p99_ms']:<8} {series_bytes:>8,}"
+              f" {raw_rows:>9,} {raw_latency['p50_ms']:>8} / {raw_latency['p99_ms']:<7} {raw_bytes:>11,}")
+        
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+from common import ROOT, percentiles
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import threading
+import time
+import json
+import sys
+import os
+import requests
+
+# Canned bodies for --simulate, shaped like the Monitoring Service's responses.
+SIMULATED = {
+    "logs": [{"method": "GET", "endpoint": "patient.get_patient", "path": "/api/patients/1", "status_code": 200,
+              "date": "Mon, 01 Jan 2024 00:00:00 GMT", "time": "12:00:00.000000", "resp_time": 0.01,
+              "client_ip": "127.0.0.1"}] * 50,
+    "requestCount": {"total_req": 100, "success_resp": 95, "error_resp": 5},
+    "analysis": {"peak_hour": 12, "requests_in_peak_hour": 10, "top_endpoint": "patient.get_patient",
+                 "requests_to_top_endpoint": 50, "average_response_time": 0.01},
+}
+SIMULATED["dashboard"] = {"user_id": "6651862de66ba56c4dd11a9d", "api_logs": SIMULATED["logs"],
+                          "request_count": SIMULATED["requestCount"], "api_analysis": SIMULATED["analysis"]}
+
+
+def simulated_upstream(port, delays):
+    # Stands in for the Monitoring Service with a fixed delay per endpoint, so the
+    # effect of overlapping the calls is visible without the full stack.
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out as separate writes; without this, delayed ACKs add ~40ms.
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            name = self.path.split("/")[2]
+            time.sleep(delays[name] / 1000)
+            body = json.dumps(SIMULATED[name]).encode()
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def timed(samples, run):
+    latencies = []
+
+    for _ in range(samples):
+        started = time.perf_counter()
+        run()
+        latencies.append(time.perf_counter() - started)
+
+    return percentiles(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the portal dashboard's Monitoring Service fetches, "
+                                                 "sequential vs concurrent over a shared session")
+    parser.add_argument("--url", default=os.getenv("MONITORING_SERVICE_URL", "http://localhost:8000"))
+    parser.add_argument("--user-id", default="6651862de66ba56c4dd11a9d")
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--simulate", action="store_true", help="Serve canned responses locally instead")
+    parser.add_argument("--delays", type=int, nargs=3, default=[40, 10, 25], metavar=("LOGS", "COUNT", "ANALYSIS"),
+                        help="Per-endpoint delay in ms for --simulate")
+    parser.add_argument("--dashboard-delay", type=int, default=5,
+                        help="Delay in ms of /api/dashboard for --simulate (usually a cache hit)")
+    args = parser.parse_args()
+
+    if args.simulate:
+        delays = dict(zip(("logs", "requestCount", "analysis", "dashboard"), args.delays + [args.dashboard_delay]))
+        server = simulated_upstream(0, delays)
+        args.url = f"http://127.0.0.1:{server.server_port}"
+
+    os.environ["MONITORING_SERVICE_URL"] = args.url
+    sys.path.insert(0, os.path.join(ROOT, "portal"))
+
+    from src import monitoring
+
+    monitoring.init_client()
+
+    calls = {"api_logs": (f"/api/logs/{args.user_id}", []),
+             "request_count": (f"/api/requestCount/{args.user_id}", None),
+             "api_analysis": ("/api/analysis", None)}
+
+    # What home() used to do: one new connection per call, one after the other.
+    def sequential():
+        for path, _ in calls.values():
+            requests.get(f"{args.url}{path}")
+
+    results = {f"single {name}": timed(args.samples, lambda path=path: monitoring.get(path))
+               for name, (path, _) in calls.items()}
+    results["sequential, new connections"] = timed(args.samples, sequential)
+    # The three calls overlapped over the shared session, as before /api/dashboard existed.
+    executor = ThreadPoolExecutor(max_workers=len(calls))
+
+    def concurrent():
+        for future in [executor.submit(monitoring.get, path, default) for path, default in calls.values()]:
+            future.result()
+
+    results["concurrent, shared session"] = timed(args.samples, concurrent)
+    # What the portal does now: one call for the whole dashboard.
+    results["dashboard endpoint"] = timed(args.samples, lambda: monitoring.get(f"/api/dashboard/{args.user_id}"))
+
+    for name, result in results.items():
+        print(f"{name:>28}: p50 {result['p50_ms']}ms | p95 {result['p95_ms']}ms | p99 {result['p99_ms']}ms")
+
+    slowest = max(results[f"single {name}"]["p50_ms"] for name in calls)
+    print(f"\nslowest single call p50 {slowest}ms, concurrent page fetch p50 "
+          f"{results['concurrent, shared session']['p50_ms']}ms")
+
+    executor.shutdown()
+    monitoring.close_client()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import statistics
+import subprocess
+import signal
+import threading
+import time
+import os
+import sys
+import requests
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+SERVICES = {
+    "api": {"cwd": os.path.join(ROOT, "Healthcare API"), "dev": "run.py", "port": 8002},
+    "monitoring": {"cwd": os.path.join(ROOT, "Monitoring Service"), "dev": "main.py", "port": 8000},
+    "stream": {"cwd": os.path.join(ROOT, "Monitoring Service"), "dev": "stream_app.py", "port": 8003},
+    "portal": {"cwd": os.path.join(ROOT, "portal"), "dev": "run.py", "port": 8001},
+}
+
+
+def start_server(service, mode):
+    config = SERVICES[service]
+    script = {"dev": config["dev"], "wsgi": "wsgi.py", "asgi": "asgi.py"}[mode]
+
+    return subprocess.Popen([sys.executable, script], cwd=config["cwd"], start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def stop_server(process):
+    # The dev server's reloader and gunicorn's workers are children of the process
+    # we started, so the whole group is signalled.
+    os.killpg(process.pid, signal.SIGTERM)
+    
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+def wait_until_ready(url, timeout):
+    started = time.perf_counter()
+
+    while time.perf_counter() - started < timeout:
+        try:
+            requests.get(url, timeout=1)
+            return time.perf_counter() - started
+        except requests.ConnectionError:
+            time.sleep(0.05)
+
+    raise TimeoutError(f"Server at {url} didn't start within {timeout} seconds")
+
+
+def run_load(url, total, concurrency, headers):
+    local = threading.local()
+
+    def call(_):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+
+        started = time.perf_counter()
+        response = local.session.get(url, headers=headers, timeout=30)
+        return time.perf_counter() - started, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(call, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(r[0] for r in results)
+    errors = sum(1 for r in results if r[1] >= 500)
+
+    return {
+        "requests": total,
+        "errors": errors,
+        "throughput": round(total / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare startup time and throughput of the dev server "
+                                                 "against the production (gunicorn) entrypoint")
+    parser.add_argument("--service", choices=SERVICES.keys(), default="api")
+    parser.add_argument("--path", default="/api/patients")
+    parser.add_argument("--api-key", default=os.getenv("BENCH_API_KEY"))
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--startup-timeout", type=int, default=60)
+    args = parser.parse_args()
+
+    url = f"http://127.0.0.1:{SERVICES[args.service]['port']}{args.path}"
+    headers = {"Authorization": args.api_key} if args.api_key else {}
+
+    for mode in ("dev", "wsgi"):
+        process = start_server(args.service, mode)
+        try:
+            startup = wait_until_ready(url, args.startup_timeout)
+            result = run_load(url, args.requests, args.concurrency, headers)
+        finally:
+            stop_server(process)
+
+        print(f"{mode:>5}: startup {startup:.2f}s | {result['throughput']} req/s | "
+              f"p50 {result['p50_ms']}ms | p99 {result['p99_ms']}ms | {result['errors']} errors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+from common import redis_url, user_ids, percentiles
+from serving import SERVICES, start_server, stop_server, wait_until_ready
+import argparse
+import asyncio
+import resource
+import json
+import time
+import redis
+import httpx
+
+CHANNEL_PREFIX = "request_count:updates:"
+
+
+class Stream:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.connected_in = None
+        self.received = {}
+        self.error = None
+
+
+async def open_stream(client, url, stream, opened):
+    started = time.perf_counter()
+    
+    try:
+        async with client.stream("GET", f"{url}/stream/{stream.user_id}") as response:
+            if response.status_code != 200:
+                stream.error = response.status_code
+                return
+            
+            async for line in response.aiter_lines():
+                if line.startswith("data: "):
+                    payload = json.loads(line[6:])
+                    
+                    if stream.connected_in is None:
+                        stream.connected_in = time.perf_counter() - started
+                        opened.release()
+                    else:
+                        stream.received[payload["total_req"]] = time.perf_counter()
+    except httpx.HTTPError as e:
+        stream.error = type(e).__name__
+    finally:
+        if stream.connected_in is None:
+            opened.release()
+
+
+def server_rss(pid):
+    try:
+        with open(f"/proc/{pid}/status") as file:
+            for line in file:
+                if line.startswith("VmRSS"):
+                    return line.split(":")[1].strip()
+    except OSError:
+        return None
+
+
+async def run(args, url):
+    users = user_ids(args.users)
+    streams = [Stream(users[index % len(users)]) for index in range(args.streams)]
+    
+    # Bounds how many connections are being set up at once, not how many stay open.
+    opened = asyncio.Semaphore(args.connect_concurrency)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=0)
+    
+    async with httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(30, read=None)) as client:
+        async def connect(stream):
+            await opened.acquire()
+            await open_stream(client, url, stream, opened)
+            
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(connect(stream)) for stream in streams]
+        
+        while sum(1 for stream in streams if stream.connected_in is not None or stream.error) < len(streams):
+            await asyncio.sleep(0.1)
+            
+        connect_elapsed = time.perf_counter() - started
+        connected = [stream for stream in streams if stream.connected_in is not None and not stream.error]
+        
+        # Every round publishes one update per user, spaced beyond the per-client rate limit.
+        publisher = redis.Redis.from_url(redis_url())
+        published = {}
+        
+        for round_ in range(args.updates):
+            total_req = 10 ** 9 + round_
+            published[total_req] = time.perf_counter()
+            
+            pipe = publisher.pipeline(transaction=False)
+            for user_id in users:
+                pipe.publish(f"{CHANNEL_PREFIX}{user_id}",
+                             json.dumps({"total_req": total_req, "success_resp": total_req, "error_resp": 0}))
+            pipe.execute()
+            
+            await asyncio.sleep(args.interval)
+            
+        metrics = (await client.get(f"{url}/metrics")).text
+        
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        
+    delivery = [received_at - published[total_req]
+                for stream in connected for total_req, received_at in stream.received.items()]
+    expected = len(connected) * args.updates
+    
+    return {"streams": args.streams,
+            "connected": len(connected),
+            "errors": len(streams) - len(connected),
+            "connect_seconds": round(connect_elapsed, 2),
+            "connect": percentiles([stream.connected_in for stream in connected]) if connected else {},
+            "delivered": f"{len(delivery)}/{expected}",
+            "delivery": percentiles(delivery) if delivery else {},
+            "server_subscriptions": next((line.split()[-1] for line in metrics.splitlines()
+                                          if line.startswith("stream_subscriptions ")), None)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent SSE streams held open by one stream_app.py process")
+    parser.add_argument("--streams", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--updates", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=1.5)
+    parser.add_argument("--connect-concurrency", type=int, default=500)
+    parser.add_argument("--url", help="Use an already running server instead of starting one")
+    parser.add_argument("--startup-timeout", type=int, default=30)
+    args = parser.parse_args()
+    
+    # Client and server sockets both count against the open file limit.
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    
+    process = None
+    url = args.url
+    
+    if url is None:
+        url = f"http://127.0.0.1:{SERVICES['stream']['port']}"
+        process = start_server("stream", "dev")
+        wait_until_ready(f"{url}/metrics", args.startup_timeout)
+        
+    try:
+        result = asyncio.run(run(args, url))
+        
+        if process is not None:
+            result["server_rss"] = server_rss(process.pid)
+    finally:
+        if process is not None:
+            stop_server(process)
+            
+    for key, value in result.items():
+        print(f"{key:>22}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
-from src import server
+from src import server, init_clients
 
 if __name__ == "__main__":
-    server.run(debug=True, port=8001)
\ No newline at end of file
+    init_clients()
+    server.run(debug=True, port=8001)
@@ -4,9 +4,12 @@ from pymongo import MongoClient
 from dotenv import load_dotenv
 from datetime import timedelta
 from flask_swagger_ui import get_swaggerui_blueprint
+from jinja2 import FileSystemBytecodeCache
 from .auth import auth
 from .portal import portal
+from . import monitoring
 import redis
+import tempfile
 import logging
 import os
 
@@ -19,30 +22,59 @@ server.permanent_session_lifetime = timedelta(days=1)
 SWAGGER_URL = '/api/docs'
 API_URL = '/static/openapi.yml'
 
+# Compiled templates are kept on disk, so a fresh worker (or a restart) loads them
+# instead of parsing and compiling every template again.
+JINJA_CACHE_DIR = os.getenv("JINJA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "portal-jinja-cache"))
+os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+server.jinja_env.bytecode_cache = FileSystemBytecodeCache(JINJA_CACHE_DIR)
+
 logging.getLogger('werkzeug').disabled = True
 logging.basicConfig(filename="auth.log", level=logging.ERROR,
                     filemode="a", format="%(asctime)s : %(levelname)s : %(message)s")
 
-mongo_client = MongoClient(f'mongodb://{os.getenv("DB_HOST")}:{os.getenv("DB_PORT")}/', maxPoolSize=10)
-db = mongo_client[os.getenv("DB_NAME")]
-users = db.users
-users.create_index("email", unique=True)
-
-cache_pool = redis.ConnectionPool(
-            host=os.getenv("REDIS_HOST"),
-            port=os.getenv("REDIS_PORT"),
-            db=0,
-            max_connections=5
-        )
-
-if db == None:
-    logging.critical("Couldn't Connect to Database!")
-    abort(500, "The server encountered an Internal Error and was unable to complete your request")
-
-if not cache_pool:
-    logging.critical("Couldn't Connect to Redis!")
-    abort(500, "The server encountered an Internal Error and was unable to complete your request")
-    
+# Clients are created by init_clients() once per process (after fork when running
+# under a prefork server) since neither MongoClient nor redis pools are fork-safe.
+mongo_client = None
+db = None
+cache_pool = None
+
+
+def init_clients():
+    global mongo_client, db, cache_pool
+
+    mongo_client = MongoClient(f'mongodb://{os.getenv("DB_HOST")}:{os.getenv("DB_PORT")}/',
+                               maxPoolSize=int(os.getenv("DB_POOL_SIZE", 10)))
+    db = mongo_client[os.getenv("DB_NAME")]
+    db.users.create_index("email", unique=True)
+
+    cache_pool = redis.ConnectionPool(
+                host=os.getenv("REDIS_HOST"),
+                port=os.getenv("REDIS_PORT"),
+                db=0,
+                max_connections=int(os.getenv("REDIS_POOL_SIZE", 5))
+            )
+
+    monitoring.init_client()
+
+    if db == None:
+        logging.critical("Couldn't Connect to Database!")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+
+    if not cache_pool:
+        logging.critical("Couldn't Connect to Redis!")
+        abort(500, "The server encountered an Internal Error and was unable to complete your request")
+
+
+def close_clients():
+    if mongo_client is not None:
+        mongo_client.close()
+
+    if cache_pool is not None:
+        cache_pool.disconnect()
+
+    monitoring.close_client()
+
+
 swaggerui_blueprint = get_swaggerui_blueprint(
     SWAGGER_URL,
     API_URL,
@@ -54,3 +86,7 @@ swaggerui_blueprint = get_swaggerui_blueprint(
 server.register_blueprint(auth)
 server.register_blueprint(portal)
 server.register_blueprint(swaggerui_blueprint)
+
+# Loaded once at import so, with preload_app, every worker forks with them compiled.
+for template in server.jinja_env.list_templates():
+    server.jinja_env.get_template(template)
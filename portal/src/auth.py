@@ -8,7 +8,7 @@ import pymongo.errors
 import redis
 import logging
 from .schema import User
-from . import utils
+from . import utils, fragments
 
 auth = Blueprint("auth", __name__, url_prefix="/auth")
 
@@ -97,6 +97,7 @@ def verify_email():
             abort(500, "The server encountered an Internal Error and was unable to complete your request")
 
         g.cache_conn.delete(email)
+        fragments.invalidate(g.cache_conn, email)
 
         return jsonify({"message": "The account has been registered Successfully!"}), 201
 
@@ -0,0 +1,45 @@
+import logging
+import redis
+import os
+
+# Rendered partials cached per user in Redis. Every key embeds the user's data version,
+# so invalidate() retires all of a user's fragments at once by bumping it, and the
+# old entries simply expire.
+PREFIX = "fragment:"
+VERSION_PREFIX = "fragment:version:"
+
+DASHBOARD_TTL = int(os.getenv("FRAGMENT_DASHBOARD_TTL", 5))
+PROFILE_TTL = int(os.getenv("FRAGMENT_PROFILE_TTL", 300))
+
+
+def lookup(cache_conn, name, email, *parts):
+    # Returns (key, html); html is None on a miss. The key is passed back to store(),
+    # so a fragment rendered from data read before an invalidation can't be cached
+    # under the newer version. Both are None if Redis is unavailable.
+    try:
+        version = int(cache_conn.get(f"{VERSION_PREFIX}{email}") or 0)
+        key = ":".join([f"{PREFIX}{name}", email, str(version), *parts])
+        html = cache_conn.get(key)
+    except redis.RedisError as e:
+        logging.error(f"Couldn't read a cached {name} fragment. Error: {e}")
+        return None, None
+
+    return key, html.decode() if html is not None else None
+
+
+def store(cache_conn, key, html, ttl):
+    if key is None:
+        return
+
+    try:
+        cache_conn.set(key, html, ex=ttl)
+    except redis.RedisError as e:
+        logging.error(f"Couldn't cache a fragment. Error: {e}")
+
+
+def invalidate(cache_conn, email):
+    # Called whenever a user's account data changes.
+    try:
+        cache_conn.incr(f"{VERSION_PREFIX}{email}")
+    except redis.RedisError as e:
+        logging.error(f"Couldn't invalidate User({email}) fragments. Error: {e}")
@@ -0,0 +1,45 @@
+from requests.adapters import HTTPAdapter
+import requests
+import logging
+import os
+
+MONITORING_SERVICE_URL = os.getenv("MONITORING_SERVICE_URL", "http://localhost:8000")
+CONNECT_TIMEOUT = float(os.getenv("MONITORING_CONNECT_TIMEOUT", 1))
+READ_TIMEOUT = float(os.getenv("MONITORING_READ_TIMEOUT", 3))
+POOL_SIZE = int(os.getenv("MONITORING_POOL_SIZE", 20))
+
+# Created by init_client() once per process, after fork, like the other clients.
+http_session = None
+
+
+def init_client():
+    global http_session
+
+    # One keep-alive session for every call to the Monitoring Service; its
+    # connection pool is shared by the request threads.
+    http_session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+    http_session.mount("http://", adapter)
+    http_session.mount("https://", adapter)
+
+
+def close_client():
+    if http_session is not None:
+        http_session.close()
+
+
+def get(path, default=None):
+    # The decoded JSON body, `default` for a 404, or None if the call failed.
+    try:
+        response = http_session.get(f"{MONITORING_SERVICE_URL}{path}", timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+
+        if response.status_code == 404:
+            return default
+
+        response.raise_for_status()
+
+        return response.json()
+    except (requests.RequestException, ValueError) as e:
+        logging.error(f"Couldn't fetch {path} from the Monitoring Service. Error: {e}")
+        return None
+
@@ -1,8 +1,9 @@
 from flask import Blueprint, render_template, abort, session, jsonify, g
-from datetime import datetime, date
-from . import utils
+from datetime import date
+from . import utils, monitoring, fragments
 import pymongo
 import logging
+import redis
 import secrets
 import os
 import json
@@ -10,51 +11,51 @@ import requests
 
 portal = Blueprint("portal", __name__)
 
+USER_ID = "6651862de66ba56c4dd11a9d"
+
 
 @portal.before_request
 def before_request():
-    from . import db
+    from . import cache_pool, db
     g.db = db
+    g.cache_conn = redis.Redis(connection_pool=cache_pool)
+
+
+@portal.teardown_request
+def teardown_request(exception=None):
+    if hasattr(g, "cache_conn"):
+        g.cache_conn.close()
 
 
 @portal.route("/portal", methods=["GET"])
 @utils.login_required
 def home():
-    url_1 = "http://localhost:8000/api/logs/6651862de66ba56c4dd11a9d"
-    url_2 = "http://localhost:8000/api/requestCount/6651862de66ba56c4dd11a9d"
-    url_3 = "http://localhost:8000/api/analysis"
-    
-    api_logs = requests.get(url=url_1)
-    request_count = requests.get(url=url_2).json()
-    api_logs_json = api_logs.json()
-    api_analysis = requests.get(url=url_3)
-    api_analysis_json = api_analysis.json()
-    
-    
-    for record in api_logs_json:
-        record['date'] = datetime.strptime(record['date'], '%a, %d %b %Y %H:%M:%S %Z').date().isoformat()
-        record['resp_time'] = round(record['resp_time'], 4)
-        record['time'] = record['time'].split('.')[0]
+    # Logs, counts and the analysis come pre-formatted from one cached call; if it
+    # fails the page still renders, with those sections marked unavailable.
+    summary = monitoring.get(f"/api/dashboard/{USER_ID}") or {}
     
-    return render_template("index.html", api_logs=api_logs_json, request_count=request_count, api_analysis=api_analysis_json)
+    return render_template("index.html", api_logs=summary.get("api_logs"), request_count=summary.get("request_count"),
+                           api_analysis=summary.get("api_analysis"))
 
 
 @portal.route("/dashboard", methods=["GET"])
 @utils.login_required
 def dashboard():
-    url_1 = "http://localhost:8000/api/logs/6651862de66ba56c4dd11a9d"
-    url_2 = "http://localhost:8000/api/requestCount/6651862de66ba56c4dd11a9d"
+    key, html = fragments.lookup(g.cache_conn, "dashboard", session.get("email"))
     
-    api_logs = requests.get(url=url_1)
-    request_count = requests.get(url=url_2).json()
-    api_logs_json = api_logs.json()
+    if html is not None:
+        return html
     
-    for record in api_logs_json:
-        record['date'] = datetime.strptime(record['date'], '%a, %d %b %Y %H:%M:%S %Z').date().isoformat()
-        record['resp_time'] = round(record['resp_time'], 4)
-        record['time'] = record['time'].split('.')[0]
+    summary = monitoring.get(f"/api/dashboard/{USER_ID}")
     
-    return render_template("partials/dashboard.html", api_logs=api_logs_json, request_count=request_count)
+    html = render_template("partials/dashboard.html", api_logs=(summary or {}).get("api_logs"),
+                           request_count=(summary or {}).get("request_count"))
+    
+    # A render with the monitoring data missing isn't cached, so the next swap retries.
+    if summary is not None:
+        fragments.store(g.cache_conn, key, html, fragments.DASHBOARD_TTL)
+        
+    return html
 
 
 @portal.route("/profile", methods=["GET"])
@@ -62,6 +63,12 @@ def dashboard():
 def profile():
     email = session.get("email")
     
+    # Keyed by the day too, since the age shown depends on it.
+    key, html = fragments.lookup(g.cache_conn, "profile", email, date.today().isoformat())
+    
+    if html is not None:
+        return html
+    
     query = {"email": email}
     
     try:
@@ -86,7 +93,10 @@ def profile():
         "gender": record['gender']
     }
     
-    return render_template("partials/profile.html", user=user)
+    html = render_template("partials/profile.html", user=user)
+    fragments.store(g.cache_conn, key, html, fragments.PROFILE_TTL)
+    
+    return html
 
 
 @portal.route("/key", methods=["GET"])
@@ -132,6 +142,7 @@ def delete_account():
         logging.error(f"Couldn't delete user({email}) data. Error: {e}")
         abort(500, "The server encountered an Internal Error and was unable to complete your request")
     
+    fragments.invalidate(g.cache_conn, email)
     session.clear()
 
     return jsonify({"message": "Account Deleted Successfully!"}), 200
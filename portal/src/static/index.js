@@ -59,7 +59,7 @@ function updateCards() {
   const error_resp = document.getElementById("error-resp");
 
   if (!eventSourceInitialized) {
-    eventSource = new EventSource("http://localhost:8000/stream/6651862de66ba56c4dd11a9d");
+    eventSource = new EventSource("http://localhost:8003/stream/6651862de66ba56c4dd11a9d");
   }
 
   eventSource.onmessage = function(e) {